@@ -0,0 +1,26 @@
+"""Text extraction for uploaded documents.
+
+These functions are CPU-bound and run in a separate process pool, so they
+take the path of the uploaded file and raise plain exceptions that can be
+sent back to the server process.
+"""
+import docx
+from PyPDF2 import PdfReader
+
+
+def extract_text_from_docx(path: str) -> str:
+    """Extract text from a DOCX file."""
+    doc = docx.Document(path)
+    return "\n".join([paragraph.text for paragraph in doc.paragraphs])
+
+
+def extract_text_from_pdf(path: str) -> str:
+    """Extract text from a PDF file."""
+    pdf = PdfReader(path)
+    return "\n".join([page.extract_text() for page in pdf.pages]) + "\n"
+
+
+def extract_text_from_txt(path: str) -> str:
+    """Extract text from a TXT file."""
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
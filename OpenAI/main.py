@@ -1,31 +1,60 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File
-from fastapi.responses import StreamingResponse, HTMLResponse
+import asyncio
+import logging
+import multiprocessing
+import os
+import tempfile
+import time
+from collections.abc import AsyncIterator
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import AsyncExitStack, asynccontextmanager
+from pathlib import Path
+
+import httpx
+import magic
+from dotenv import load_dotenv
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.requests import Request
+from fastapi.responses import (
+    FileResponse,
+    HTMLResponse,
+    JSONResponse,
+    Response,
+    StreamingResponse,
+)
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from fastapi.requests import Request
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
 from pydantic import BaseModel
-from openai import OpenAI
-import os
-import logging
-from typing import Optional
-from dotenv import load_dotenv
-import docx
-from PyPDF2 import PdfReader
-import magic
-import io
+from python_multipart.multipart import MultipartParser, parse_options_header
+from tts_common import CONTENT_TYPE, TTSMetrics, configure_logging
+from tts_common.audio import estimate_mp3_seconds
 
-# Configure logging
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+from document_extraction import (
+    extract_text_from_docx,
+    extract_text_from_pdf,
+    extract_text_from_txt,
 )
+from speech_cache import SpeechCache, cache_key
+from text_chunking import split_text
+from upstream_scheduler import ClosingStream, UpstreamScheduler, UpstreamUnavailable
+
+# Log through a background thread so handlers never block on output.
+# The level is set with LOG_LEVEL (default INFO).
+configure_logging(capture=("uvicorn", "uvicorn.access"))
 logger = logging.getLogger(__name__)
 
 # Load environment variables from .env file
 load_dotenv()
 
-app = FastAPI(title="Text to Speech API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Close pooled upstream connections and extraction workers on shutdown
+    await client.close()
+    extraction_pool.shutdown(cancel_futures=True)
+
+app = FastAPI(title="Text to Speech API", lifespan=lifespan)
 
 # Mount static files
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -48,20 +77,117 @@ if not OPENAI_API_KEY:
     logger.error("OPENAI_API_KEY environment variable is not set")
     raise ValueError("OPENAI_API_KEY environment variable is not set")
 
-OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
-logger.info(f"Using OpenAI base URL: {OPENAI_BASE_URL}")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or "https://api.openai.com/v1"
+logger.info("Using OpenAI base URL: %s", OPENAI_BASE_URL)
+
+# Upstream connection pool settings
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "100"))
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "20"))
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "30"))
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5"))
+OPENAI_READ_TIMEOUT = float(os.getenv("OPENAI_READ_TIMEOUT", "60"))
+
+# Long documents are split into chunks synthesized concurrently
+DOCUMENT_CHUNK_CHARS = int(os.getenv("DOCUMENT_CHUNK_CHARS", "4000"))
+DOCUMENT_CHUNK_CONCURRENCY = int(os.getenv("DOCUMENT_CHUNK_CONCURRENCY", "4"))
+
+# Cache of synthesized speech keyed on (text, voice, model, format)
+AUDIO_FORMAT = "mp3"
+SPEECH_CACHE_MEMORY_MB = int(os.getenv("SPEECH_CACHE_MEMORY_MB", "64"))
+SPEECH_CACHE_DIR = os.getenv("SPEECH_CACHE_DIR", "speech_cache")
+SPEECH_CACHE_DISK_MB = int(os.getenv("SPEECH_CACHE_DISK_MB", "1024"))
+
+speech_cache = SpeechCache(
+    max_memory_bytes=SPEECH_CACHE_MEMORY_MB * 1024 * 1024,
+    cache_dir=SPEECH_CACHE_DIR or None,
+    max_disk_bytes=SPEECH_CACHE_DISK_MB * 1024 * 1024
+)
+
+# Outbound scheduling of speech requests: rate limits, adaptive concurrency and retries
+upstream = UpstreamScheduler(
+    requests_per_minute=float(os.getenv("UPSTREAM_REQUESTS_PER_MINUTE", "0")),
+    characters_per_minute=float(os.getenv("UPSTREAM_CHARACTERS_PER_MINUTE", "0")),
+    initial_concurrency=int(os.getenv("UPSTREAM_INITIAL_CONCURRENCY", "8")),
+    min_concurrency=int(os.getenv("UPSTREAM_MIN_CONCURRENCY", "1")),
+    max_concurrency=int(os.getenv("UPSTREAM_MAX_CONCURRENCY", "64")),
+    max_retries=int(os.getenv("UPSTREAM_MAX_RETRIES", "4")),
+    deadline=float(os.getenv("UPSTREAM_DEADLINE_SECONDS", "30"))
+)
+
+# Request latency, upstream latency, time to first byte and real-time factor, served on /metrics
+metrics = TTSMetrics()
+metrics.registry.gauge(
+    "tts_upstream_concurrency_limit", "Current adaptive limit on concurrent upstream requests"
+).set_function(lambda: int(upstream.limiter.limit))
+metrics.registry.gauge(
+    "tts_upstream_inflight_requests", "Upstream requests currently in flight"
+).set_function(lambda: upstream.limiter.inflight)
+
+# Uploads are streamed to disk in chunks and parsed in worker processes
+MAX_UPLOAD_MB = int(os.getenv("MAX_UPLOAD_MB", "50"))
+MAX_UPLOAD_BYTES = MAX_UPLOAD_MB * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+MIME_SNIFF_BYTES = 64 * 1024
+# Room in the request body for the multipart headers and the other form fields
+UPLOAD_OVERHEAD_BYTES = 64 * 1024
+MAX_FIELD_BYTES = 1024
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", "2"))
+
+# libmagic loads its database on creation, so build the detector once
+mime_detector = magic.Magic(mime=True)
+extraction_pool = ProcessPoolExecutor(
+    max_workers=EXTRACTION_WORKERS,
+    mp_context=multiprocessing.get_context("spawn")
+)
 
 # Initialize OpenAI client
 try:
-    client = OpenAI(
+    client = AsyncOpenAI(
         api_key=OPENAI_API_KEY,
-        base_url=OPENAI_BASE_URL
+        base_url=OPENAI_BASE_URL,
+        http_client=DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY
+            ),
+            timeout=httpx.Timeout(OPENAI_READ_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT)
+        ),
+        # Retries are handled by the upstream scheduler
+        max_retries=0
     )
     logger.info("OpenAI client initialized successfully")
 except Exception as e:
-    logger.error(f"Failed to initialize OpenAI client: {str(e)}")
+    logger.error("Failed to initialize OpenAI client: %s", e)
     raise
 
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    # Reject uploads that announce an oversized body before it is received;
+    # receive_upload() enforces the limit on the bytes actually sent
+    content_length = request.headers.get("content-length")
+    if request.url.path == "/document-to-speech" and content_length:
+        try:
+            length = int(content_length)
+        except ValueError:
+            return JSONResponse(status_code=400, content={"detail": "Invalid Content-Length header"})
+        if length > MAX_UPLOAD_BYTES + UPLOAD_OVERHEAD_BYTES:
+            return JSONResponse(status_code=413, content={"detail": f"File is larger than the {MAX_UPLOAD_MB} MB limit"})
+    return await call_next(request)
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    metrics.observe_request(
+        route.path if route is not None else "unmatched",
+        request.method,
+        response.status_code,
+        time.perf_counter() - started
+    )
+    return response
+
 class TextToSpeechRequest(BaseModel):
     text: str
     voice: str = "alloy"  # Default voice
@@ -71,34 +197,200 @@ class DocumentToSpeechRequest(BaseModel):
     voice: str = "alloy"  # Default voice
     model: str = "tts-1"  # Default model
 
-async def extract_text_from_docx(file_content: bytes) -> str:
-    """Extract text from a DOCX file."""
+async def stream_speech(model: str, voice: str, text: str) -> AsyncIterator[bytes]:
+    """Start a speech request and return an iterator over the audio as it arrives.
+
+    The upstream request is made (and retried if throttled) before returning,
+    so errors are raised here rather than after the response to the caller
+    has started.
+    """
+    return await upstream.stream(lambda: open_speech_stream(model, voice, text), characters=len(text))
+
+async def open_speech_stream(model: str, voice: str, text: str) -> AsyncIterator[bytes]:
+    stack = AsyncExitStack()
+    # Upstream latency is the time until the response headers arrive
+    with metrics.time_model("openai"):
+        response = await stack.enter_async_context(
+            client.audio.speech.with_streaming_response.create(
+                model=model,
+                voice=voice,
+                input=text
+            )
+        )
+
+    async def close(completed: bool) -> None:
+        await stack.aclose()
+
+    # Closing the stream releases the connection even if the body is never read
+    return ClosingStream(response.iter_bytes(), close)
+
+async def synthesize_chunks(chunks: list[str], model: str, voice: str) -> AsyncIterator[bytes]:
+    """Synthesize text chunks concurrently and yield their audio in order.
+
+    At most DOCUMENT_CHUNK_CONCURRENCY chunks are synthesized at once. Chunks
+    are only started a limited distance ahead of the one being sent, so
+    memory stays bounded when an early chunk is slow.
+    """
+    semaphore = asyncio.Semaphore(DOCUMENT_CHUNK_CONCURRENCY)
+    lookahead = 2 * DOCUMENT_CHUNK_CONCURRENCY
+
+    async def synthesize(chunk: str) -> bytes:
+        key = cache_key(chunk, voice, model, AUDIO_FORMAT)
+        cached = speech_cache.get(key)
+        if isinstance(cached, Path):
+            return await asyncio.to_thread(cached.read_bytes)
+        if cached is not None:
+            return cached
+
+        async with semaphore:
+            audio = await speech_cache.single_flight(key, lambda: stream_speech(model, voice, chunk))
+            return b"".join([part async for part in audio])
+
+    pending = []
+    next_chunk = 0
     try:
-        doc = docx.Document(io.BytesIO(file_content))
-        return "\n".join([paragraph.text for paragraph in doc.paragraphs])
-    except Exception as e:
-        logger.error(f"Error extracting text from DOCX: {str(e)}")
-        raise HTTPException(status_code=400, detail=f"Failed to extract text from DOCX file: {str(e)}")
+        while next_chunk < len(chunks) or pending:
+            while next_chunk < len(chunks) and len(pending) < lookahead:
+                pending.append(asyncio.create_task(synthesize(chunks[next_chunk])))
+                next_chunk += 1
+            yield await pending.pop(0)
+    finally:
+        for task in pending:
+            task.cancel()
+
+# Extractors by detected MIME type, with the name used in error messages
+EXTRACTORS = {
+    "application/pdf": (extract_text_from_pdf, "PDF"),
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document": (extract_text_from_docx, "DOCX"),
+    "text/plain": (extract_text_from_txt, "TXT"),
+}
+
+def upload_too_large() -> HTTPException:
+    return HTTPException(status_code=413, detail=f"File is larger than the {MAX_UPLOAD_MB} MB limit")
+
+async def receive_upload(request: Request) -> tuple[str, str, dict[str, str]]:
+    """
+    Stream the "file" part of a multipart upload to a temporary file, enforcing MAX_UPLOAD_BYTES.
+
+    The body is parsed as it arrives with a running count of the bytes
+    received, so an upload is stopped as soon as it passes the limit, with
+    or without a Content-Length, and the file is written to disk only once.
+
+    Returns:
+        The temporary file's path, the uploaded file's name and the other form fields
+    """
+    _, options = parse_options_header(request.headers.get("content-type"))
+    boundary = options.get(b"boundary")
+    if not boundary:
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data upload")
+
+    fields: dict[str, str] = {}
+    part: dict = {}
+    file_data: list[bytes] = []
+    upload = {"filename": None}
+
+    def on_part_begin():
+        part.clear()
+        part.update(headers={}, field=b"", value=b"", data=b"")
 
-async def extract_text_from_pdf(file_content: bytes) -> str:
-    """Extract text from a PDF file."""
+    def on_header_field(data, start, end):
+        part["field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        part["value"] += data[start:end]
+
+    def on_header_end():
+        part["headers"][part["field"].lower()] = part["value"]
+        part["field"], part["value"] = b"", b""
+
+    def on_headers_finished():
+        _, disposition = parse_options_header(part["headers"].get(b"content-disposition"))
+        part["name"] = disposition.get(b"name", b"").decode("utf-8", "replace")
+        part["is_file"] = part["name"] == "file" and b"filename" in disposition
+        if part["is_file"]:
+            upload["filename"] = disposition[b"filename"].decode("utf-8", "replace")
+
+    def on_part_data(data, start, end):
+        if part["is_file"]:
+            file_data.append(data[start:end])
+            return
+        part["data"] += data[start:end]
+        if len(part["data"]) > MAX_FIELD_BYTES:
+            raise HTTPException(status_code=400, detail=f"Form field {part['name']} is too long")
+
+    def on_part_end():
+        if not part["is_file"]:
+            fields[part["name"]] = part["data"].decode("utf-8", "replace")
+
+    parser = MultipartParser(boundary, {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+
+    temp_file = await asyncio.to_thread(tempfile.NamedTemporaryFile, delete=False, suffix=".upload")
+    received = 0
+    size = 0
     try:
-        pdf = PdfReader(io.BytesIO(file_content))
-        text = ""
-        for page in pdf.pages:
-            text += page.extract_text() + "\n"
-        return text
-    except Exception as e:
-        logger.error(f"Error extracting text from PDF: {str(e)}")
-        raise HTTPException(status_code=400, detail=f"Failed to extract text from PDF file: {str(e)}")
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > MAX_UPLOAD_BYTES + UPLOAD_OVERHEAD_BYTES:
+                raise upload_too_large()
+            try:
+                parser.write(chunk)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=f"Malformed multipart upload: {e}")
+
+            # Write to disk in fixed-size chunks rather than per network read
+            buffered = sum(len(data) for data in file_data)
+            if buffered >= UPLOAD_CHUNK_SIZE:
+                size += buffered
+                if size > MAX_UPLOAD_BYTES:
+                    raise upload_too_large()
+                await asyncio.to_thread(temp_file.write, b"".join(file_data))
+                file_data.clear()
+        parser.finalize()
 
-async def extract_text_from_txt(file_content: bytes) -> str:
-    """Extract text from a TXT file."""
+        size += sum(len(data) for data in file_data)
+        if size > MAX_UPLOAD_BYTES:
+            raise upload_too_large()
+        await asyncio.to_thread(temp_file.write, b"".join(file_data))
+        if upload["filename"] is None:
+            raise HTTPException(status_code=400, detail="No file provided")
+    except BaseException:
+        temp_file.close()
+        os.unlink(temp_file.name)
+        raise
+    temp_file.close()
+    return temp_file.name, upload["filename"], fields
+
+def sniff_file_type(path: str) -> str:
+    """Detect a saved upload's MIME type from its first bytes."""
+    with open(path, "rb") as f:
+        return mime_detector.from_buffer(f.read(MIME_SNIFF_BYTES))
+
+async def extract_text(path: str, file_type: str) -> str:
+    """Extract text from a saved upload in the extraction process pool."""
+    extractor, name = EXTRACTORS[file_type]
     try:
-        return file_content.decode('utf-8')
+        loop = asyncio.get_running_loop()
+        with metrics.time_extraction(name.lower()):
+            return await loop.run_in_executor(extraction_pool, extractor, path)
     except Exception as e:
-        logger.error(f"Error extracting text from TXT: {str(e)}")
-        raise HTTPException(status_code=400, detail=f"Failed to extract text from TXT file: {str(e)}")
+        logger.error("Error extracting text from %s: %s", name, e)
+        raise HTTPException(status_code=400, detail=f"Failed to extract text from {name} file: {e!s}") from e
+
+def upstream_error(error: UpstreamUnavailable) -> HTTPException:
+    """Map a scheduling failure to a response telling the caller when to retry."""
+    logger.warning("Upstream unavailable: %s", error)
+    headers = None
+    if error.retry_after is not None:
+        headers = {"Retry-After": str(max(1, round(error.retry_after)))}
+    return HTTPException(status_code=error.status_code, detail=str(error), headers=headers)
 
 @app.get("/", response_class=HTMLResponse)
 async def root(request: Request):
@@ -106,86 +398,125 @@ async def root(request: Request):
 
 @app.post("/text-to-speech")
 async def text_to_speech(request: TextToSpeechRequest):
-    logger.info(f"Received text-to-speech request with voice: {request.voice}, model: {request.model}")
-    logger.debug(f"Text content: {request.text[:100]}...")  # Log first 100 chars of text
+    started = time.perf_counter()
+    logger.info("Received text-to-speech request with voice: %s, model: %s", request.voice, request.model)
+    logger.debug("Text content: %.100s...", request.text)  # Log first 100 chars of text
     
+    headers = {"Content-Disposition": 'attachment; filename="speech.mp3"'}
+    key = cache_key(request.text, request.voice, request.model, AUDIO_FORMAT)
+    cached = speech_cache.get(key)
+    if isinstance(cached, Path):
+        return FileResponse(cached, media_type="audio/mpeg", headers=headers)
+    if cached is not None:
+        return Response(cached, media_type="audio/mpeg", headers=headers)
+
     try:
         logger.debug("Attempting to create speech with OpenAI API")
-        response = client.audio.speech.create(
-            model=request.model,
-            voice=request.voice,
-            input=request.text
+        audio = await speech_cache.single_flight(
+            key,
+            lambda: stream_speech(request.model, request.voice, request.text)
         )
-        logger.info("Successfully generated speech")
+        logger.info("Streaming speech from OpenAI API")
         
         return StreamingResponse(
-            response.iter_bytes(),
+            metrics.instrument_async_stream("/text-to-speech", audio, started, estimate_mp3_seconds),
             media_type="audio/mpeg",
-            headers={
-                "Content-Disposition": f'attachment; filename="speech.mp3"'
-            }
+            headers=headers
         )
+    except UpstreamUnavailable as e:
+        raise upstream_error(e)
     except Exception as e:
-        logger.error(f"Error in text-to-speech endpoint: {str(e)}", exc_info=True)
-        error_detail = f"Failed to generate speech: {str(e)}"
+        logger.exception("Error in text-to-speech endpoint")
+        error_detail = f"Failed to generate speech: {e!s}"
         logger.error(error_detail)
         raise HTTPException(status_code=500, detail=error_detail)
 
-@app.post("/document-to-speech")
+@app.get("/metrics")
+async def prometheus_metrics():
+    return Response(metrics.render(), media_type=CONTENT_TYPE)
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return {**speech_cache.info(), "upstream": upstream.info()}
+
+# The body is parsed by receive_upload() rather than by FastAPI, so the form is described here for the docs
+UPLOAD_FORM = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "required": ["file"],
+            "properties": {
+                "file": {"type": "string", "format": "binary"},
+                "voice": {"type": "string"},
+                "model": {"type": "string"},
+            },
+        }}},
+    }
+}
+
+@app.post("/document-to-speech", openapi_extra=UPLOAD_FORM)
 async def document_to_speech(
-    file: UploadFile = File(...),
+    request: Request,
     voice: str = "alloy",
     model: str = "tts-1"
 ):
-    logger.info(f"Received document-to-speech request for file: {file.filename}")
+    started = time.perf_counter()
     
     try:
-        # Read file content
-        file_content = await file.read()
-        
-        # Detect file type
-        mime = magic.Magic(mime=True)
-        file_type = mime.from_buffer(file_content)
-        logger.info(f"Detected file type: {file_type}")
-        
-        # Extract text based on file type
-        if file_type == "application/pdf":
-            text = await extract_text_from_pdf(file_content)
-        elif file_type == "application/vnd.openxmlformats-officedocument.wordprocessingml.document":
-            text = await extract_text_from_docx(file_content)
-        elif file_type == "text/plain":
-            text = await extract_text_from_txt(file_content)
-        else:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Unsupported file type: {file_type}. Supported types are: PDF, DOCX, and TXT"
-            )
+        # Stream the upload to disk, then detect its type and extract text off the event loop
+        upload_path, filename, fields = await receive_upload(request)
+        logger.info("Received document-to-speech request for file: %s", filename)
+        voice = fields.get("voice") or voice
+        model = fields.get("model") or model
+        try:
+            file_type = await asyncio.to_thread(sniff_file_type, upload_path)
+            logger.info("Detected file type: %s", file_type)
+
+            if file_type not in EXTRACTORS:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Unsupported file type: {file_type}. Supported types are: PDF, DOCX, and TXT"
+                )
+            text = await extract_text(upload_path, file_type)
+        finally:
+            os.unlink(upload_path)
         
         if not text.strip():
             raise HTTPException(status_code=400, detail="No text content found in the document")
         
-        logger.info(f"Successfully extracted text from document. Length: {len(text)} characters")
-        
-        # Generate speech from extracted text
-        response = client.audio.speech.create(
-            model=model,
-            voice=voice,
-            input=text
-        )
-        logger.info("Successfully generated speech from document")
+        logger.info("Successfully extracted text from document. Length: %d characters", len(text))
         
+        # Generate speech from extracted text, chunked to stay under the input limit
+        chunks = split_text(text, DOCUMENT_CHUNK_CHARS)
+        logger.info("Synthesizing document in %d chunks", len(chunks))
+        audio = synthesize_chunks(chunks, model, voice)
+
+        # Wait for the first chunk so upstream errors are still reported with a status code
+        first_chunk = await audio.__anext__()
+
+        async def document_audio() -> AsyncIterator[bytes]:
+            yield first_chunk
+            async for chunk in audio:
+                yield chunk
+
         return StreamingResponse(
-            response.iter_bytes(),
+            metrics.instrument_async_stream("/document-to-speech", document_audio(), started, estimate_mp3_seconds),
             media_type="audio/mpeg",
             headers={
-                "Content-Disposition": f'attachment; filename="document_speech.mp3"'
+                "Content-Disposition": 'attachment; filename="document_speech.mp3"'
             }
         )
+    except HTTPException:
+        raise
+    except UpstreamUnavailable as e:
+        raise upstream_error(e)
     except Exception as e:
-        logger.error(f"Error in document-to-speech endpoint: {str(e)}", exc_info=True)
-        raise HTTPException(status_code=500, detail=f"Failed to process document: {str(e)}")
+        logger.exception("Error in document-to-speech endpoint")
+        raise HTTPException(status_code=500, detail=f"Failed to process document: {e!s}")
 
 if __name__ == "__main__":
     import uvicorn
     logger.info("Starting server...")
-    uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
+    # Keep uvicorn's loggers on the queue handler set up above
+    uvicorn.run(app, host="0.0.0.0", port=8000, log_config=None) 
\ No newline at end of file
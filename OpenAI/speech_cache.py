@@ -0,0 +1,229 @@
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Awaitable, Callable
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(text: str, voice: str, model: str, audio_format: str) -> str:
+    """Return the cache key for a speech request."""
+    digest = hashlib.sha256()
+    for part in (model, voice, audio_format, text):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class SpeechCache:
+    """Two-tier cache of synthesized speech with in-flight request coalescing.
+
+    Hot entries are kept in a bounded in-memory LRU. Every entry is also
+    written to an on-disk tier that evicts the least recently used files once
+    it grows past its size limit. Concurrent misses for the same key share a
+    single upstream request.
+    """
+
+    def __init__(
+        self,
+        max_memory_bytes: int = 64 * 1024 * 1024,
+        cache_dir: str | None = None,
+        max_disk_bytes: int = 1024 * 1024 * 1024,
+        max_entry_bytes: int = 8 * 1024 * 1024,
+    ):
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+
+        self._memory: OrderedDict[str, bytes] = OrderedDict()
+        self._memory_bytes = 0
+        self._disk: OrderedDict[str, int] = OrderedDict()
+        self._disk_bytes = 0
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "coalesced": 0}
+
+        if self.cache_dir:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            self._load_disk_index()
+
+    def _load_disk_index(self) -> None:
+        """Rebuild the disk LRU from the files already in the cache directory."""
+        files = sorted(self.cache_dir.glob("*/*.audio"), key=lambda path: path.stat().st_mtime)
+        for path in files:
+            size = path.stat().st_size
+            self._disk[path.stem] = size
+            self._disk_bytes += size
+        logger.info("Loaded %d cached audio files (%d bytes)", len(self._disk), self._disk_bytes)
+
+    def _disk_path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.audio"
+
+    def get(self, key: str) -> bytes | Path | None:
+        """Look up a key, returning the audio bytes, the path of a cached file, or None."""
+        data = self._memory.get(key)
+        if data is not None:
+            self._memory.move_to_end(key)
+            self.stats["memory_hits"] += 1
+            return data
+
+        if key in self._disk:
+            path = self._disk_path(key)
+            if path.exists():
+                self._disk.move_to_end(key)
+                self.stats["disk_hits"] += 1
+                return path
+            self._disk_bytes -= self._disk.pop(key)
+
+        return None
+
+    async def put(self, key: str, data: bytes) -> None:
+        """Store audio in the memory tier (if small enough) and on disk."""
+        if len(data) <= self.max_entry_bytes:
+            if key in self._memory:
+                self._memory_bytes -= len(self._memory.pop(key))
+            self._memory[key] = data
+            self._memory_bytes += len(data)
+            while self._memory_bytes > self.max_memory_bytes and self._memory:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted)
+
+        if self.cache_dir and key not in self._disk:
+            await asyncio.to_thread(self._write_file, self._disk_path(key), data)
+            self._disk[key] = len(data)
+            self._disk_bytes += len(data)
+            evicted = []
+            while self._disk_bytes > self.max_disk_bytes and len(self._disk) > 1:
+                old_key, size = self._disk.popitem(last=False)
+                self._disk_bytes -= size
+                evicted.append(self._disk_path(old_key))
+            if evicted:
+                await asyncio.to_thread(self._remove_files, evicted)
+
+    @staticmethod
+    def _write_file(path: Path, data: bytes) -> None:
+        path.parent.mkdir(exist_ok=True)
+        # A temporary file of its own, so concurrent writers of a key never share one
+        fd, temp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    @staticmethod
+    def _remove_files(paths: list[Path]) -> None:
+        for path in paths:
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+    async def single_flight(
+        self, key: str, start: Callable[[], Awaitable[AsyncIterator[bytes]]]
+    ) -> AsyncIterator[bytes]:
+        """Fetch audio for a missed key, sharing one upstream request between concurrent callers.
+
+        The upstream response is read by a background task that stores it in
+        the cache once complete, whether or not the caller reads the returned
+        iterator, so an abandoned response never leaves the key in flight.
+        The first caller streams the audio as it arrives. Callers arriving
+        while that request is in flight wait for it and receive the complete
+        audio. If the first request fails, they each fall back to their own
+        request.
+        """
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.stats["coalesced"] += 1
+            data = await asyncio.shield(inflight)
+            if data is not None:
+                return self._iter_bytes(data)
+            return self._relay(key, None, await start())
+
+        self.stats["misses"] += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            audio = await start()
+        except BaseException:
+            self._finish(key, future, None)
+            raise
+        return self._relay(key, future, audio)
+
+    def _relay(
+        self, key: str, future: asyncio.Future | None, audio: AsyncIterator[bytes]
+    ) -> AsyncIterator[bytes]:
+        """Read `audio` into the cache in a task and return an iterator that follows it."""
+        parts: asyncio.Queue = asyncio.Queue()
+        task = asyncio.create_task(self._fill(key, future, audio, parts))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return self._follow(parts)
+
+    async def _fill(
+        self,
+        key: str,
+        future: asyncio.Future | None,
+        audio: AsyncIterator[bytes],
+        parts: asyncio.Queue,
+    ) -> None:
+        received = []
+        data = None
+        error: Exception = ConnectionError("Upstream audio was interrupted")
+        try:
+            async for part in audio:
+                received.append(part)
+                parts.put_nowait(part)
+            data = b"".join(received)
+        except Exception as e:  # noqa: BLE001 - handed to the reader below
+            logger.warning("Upstream audio for %s failed: %s", key[:12], e)
+            error = e
+        finally:
+            parts.put_nowait(None if data is not None else error)
+            try:
+                aclose = getattr(audio, "aclose", None)
+                if aclose is not None:
+                    await aclose()
+                if data is not None:
+                    await self.put(key, data)
+            except OSError as e:
+                logger.warning("Failed to cache audio for %s: %s", key[:12], e)
+            finally:
+                if future is not None:
+                    self._finish(key, future, data)
+
+    @staticmethod
+    async def _follow(parts: asyncio.Queue) -> AsyncIterator[bytes]:
+        while (part := await parts.get()) is not None:
+            if isinstance(part, Exception):
+                raise part
+            yield part
+
+    def _finish(self, key: str, future: asyncio.Future, data: bytes | None) -> None:
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+        if not future.done():
+            future.set_result(data)
+
+    @staticmethod
+    async def _iter_bytes(data: bytes) -> AsyncIterator[bytes]:
+        yield data
+
+    def info(self) -> dict:
+        """Return hit/miss counters and the size of each tier."""
+        return {
+            **self.stats,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+            "disk_entries": len(self._disk),
+            "disk_bytes": self._disk_bytes,
+            "inflight": len(self._inflight),
+        }
@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+from speech_cache import SpeechCache
+
+
+def fake_upstream(parts, calls):
+    async def start():
+        calls.append(1)
+
+        async def audio():
+            for part in parts:
+                await asyncio.sleep(0)
+                yield part
+
+        return audio()
+
+    return start
+
+
+async def read(audio):
+    return b"".join([part async for part in audio])
+
+
+def test_concurrent_misses_share_one_request(tmp_path):
+    async def main():
+        cache = SpeechCache(cache_dir=str(tmp_path))
+        calls = []
+        start = fake_upstream([b"a", b"b"], calls)
+        first, second = await asyncio.gather(
+            cache.single_flight("key", start), cache.single_flight("key", start)
+        )
+        assert await read(first) == await read(second) == b"ab"
+        assert len(calls) == 1
+
+    asyncio.run(main())
+
+
+def test_dropped_response_still_fills_cache(tmp_path):
+    async def main():
+        cache = SpeechCache(cache_dir=str(tmp_path))
+        calls = []
+        start = fake_upstream([b"a", b"b"], calls)
+
+        audio = await cache.single_flight("key", start)
+        del audio  # The client went away before the body was read
+
+        again = await asyncio.wait_for(cache.single_flight("key", start), 1)
+        assert await read(again) == b"ab"
+        assert len(calls) == 1
+        assert cache.info()["inflight"] == 0
+        assert cache.get("key") == b"ab"
+
+    asyncio.run(main())
+
+
+def test_failed_request_is_not_cached(tmp_path):
+    async def main():
+        cache = SpeechCache(cache_dir=str(tmp_path))
+
+        async def start():
+            async def audio():
+                yield b"a"
+                raise ConnectionError("reset")
+
+            return audio()
+
+        audio = await cache.single_flight("key", start)
+        with pytest.raises(ConnectionError):
+            await read(audio)
+        await asyncio.sleep(0)
+        assert cache.get("key") is None
+        assert cache.info()["inflight"] == 0
+
+    asyncio.run(main())
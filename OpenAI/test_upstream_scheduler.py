@@ -0,0 +1,204 @@
+import asyncio
+import time
+from datetime import UTC, datetime, timedelta
+from email.utils import format_datetime
+
+import httpx
+import openai
+import pytest
+
+from upstream_scheduler import (
+    AdaptiveLimiter,
+    ClosingStream,
+    TokenBucket,
+    UpstreamScheduler,
+    UpstreamUnavailable,
+    _retry_after,
+)
+
+
+def status_error(status, headers=None):
+    request = httpx.Request("POST", "https://api.example.com/v1/audio/speech")
+    response = httpx.Response(status, headers=headers, request=request)
+    return openai.APIStatusError("error", response=response, body=None)
+
+
+def test_token_bucket_waits_for_refill():
+    async def main():
+        bucket = TokenBucket(rate_per_minute=600, capacity=2)
+        deadline = time.monotonic() + 5
+        await bucket.acquire(2, deadline)
+        started = time.monotonic()
+        await bucket.acquire(1, deadline)
+        # 600 per minute is one token every 0.1s
+        assert 0.08 <= time.monotonic() - started < 0.5
+
+    asyncio.run(main())
+
+
+def test_token_bucket_gives_up_past_deadline():
+    async def main():
+        bucket = TokenBucket(rate_per_minute=60, capacity=1)
+        await bucket.acquire(1, time.monotonic() + 5)
+        with pytest.raises(UpstreamUnavailable):
+            await bucket.acquire(1, time.monotonic() + 0.1)
+
+    asyncio.run(main())
+
+
+def test_token_bucket_admits_oversized_request_when_full():
+    async def main():
+        bucket = TokenBucket(rate_per_minute=60, capacity=10)
+        await asyncio.wait_for(bucket.acquire(50, time.monotonic() + 5), 1)
+
+    asyncio.run(main())
+
+
+def test_retry_after_ms_takes_precedence():
+    error = status_error(429, {"retry-after-ms": "1500", "retry-after": "7"})
+    assert _retry_after(error) == 1.5
+
+
+def test_retry_after_seconds():
+    assert _retry_after(status_error(503, {"retry-after": "7"})) == 7.0
+
+
+def test_retry_after_http_date():
+    when = datetime.now(UTC) + timedelta(seconds=30)
+    delay = _retry_after(status_error(429, {"retry-after": format_datetime(when, usegmt=True)}))
+    assert 28 <= delay <= 31
+
+
+def test_retry_after_missing_or_invalid():
+    assert _retry_after(status_error(429)) is None
+    assert _retry_after(status_error(429, {"retry-after": "soon"})) is None
+    assert _retry_after(ValueError("not an API error")) is None
+
+
+def test_limiter_grows_additively_on_success():
+    async def main():
+        limiter = AdaptiveLimiter(initial=4, minimum=1, maximum=64)
+        for _ in range(4):
+            await limiter.acquire(time.monotonic() + 1)
+            await limiter.release("success")
+        # Each success adds 1/limit, so a round of four adds about one slot
+        assert 4.9 < limiter.limit < 5.0
+        assert limiter.inflight == 0
+
+    asyncio.run(main())
+
+
+def test_limiter_halves_once_per_cooldown_on_throttling():
+    async def main():
+        limiter = AdaptiveLimiter(initial=16, minimum=1, maximum=64, cooldown=0.2)
+        for _ in range(3):
+            await limiter.acquire(time.monotonic() + 1)
+            await limiter.release("throttled")
+        assert limiter.limit == 8
+
+        await asyncio.sleep(0.25)
+        await limiter.acquire(time.monotonic() + 1)
+        await limiter.release("throttled")
+        assert limiter.limit == 4
+
+    asyncio.run(main())
+
+
+def test_limiter_stays_within_bounds():
+    async def main():
+        limiter = AdaptiveLimiter(initial=2, minimum=2, maximum=2, cooldown=0)
+        for outcome in ("throttled", "success"):
+            await limiter.acquire(time.monotonic() + 1)
+            await limiter.release(outcome)
+            assert limiter.limit == 2
+
+    asyncio.run(main())
+
+
+def test_limiter_times_out_when_full():
+    async def main():
+        limiter = AdaptiveLimiter(initial=1, minimum=1, maximum=1)
+        await limiter.acquire(time.monotonic() + 1)
+        with pytest.raises(UpstreamUnavailable):
+            await limiter.acquire(time.monotonic() + 0.05)
+
+    asyncio.run(main())
+
+
+def upstream_body(closed):
+    async def start():
+        async def audio():
+            yield b"a"
+            yield b"b"
+
+        async def close(completed):
+            closed.append(completed)
+
+        return ClosingStream(audio(), close)
+
+    return start
+
+
+def test_slot_released_when_stream_is_read():
+    async def main():
+        scheduler = UpstreamScheduler(initial_concurrency=1)
+        closed = []
+        audio = await scheduler.stream(upstream_body(closed), characters=10)
+        assert scheduler.limiter.inflight == 1
+        assert b"".join([chunk async for chunk in audio]) == b"ab"
+        assert scheduler.limiter.inflight == 0
+        assert closed == [True]
+        assert scheduler.limiter.limit > 1
+
+    asyncio.run(main())
+
+
+def test_slot_released_when_stream_is_closed_unread():
+    async def main():
+        scheduler = UpstreamScheduler(initial_concurrency=1, deadline=0.5)
+        closed = []
+        audio = await scheduler.stream(upstream_body(closed), characters=10)
+        await audio.aclose()
+        assert scheduler.limiter.inflight == 0
+        assert closed == [False]
+
+        # The slot is free for the next request
+        audio = await scheduler.stream(upstream_body(closed), characters=10)
+        await audio.aclose()
+
+    asyncio.run(main())
+
+
+def test_throttled_request_is_retried():
+    async def main():
+        scheduler = UpstreamScheduler(initial_concurrency=4, backoff_base=0.01, deadline=5)
+        closed = []
+        attempts = []
+        succeed = upstream_body(closed)
+
+        async def start():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise status_error(429, {"retry-after-ms": "10"})
+            return await succeed()
+
+        audio = await scheduler.stream(start, characters=10)
+        assert b"".join([chunk async for chunk in audio]) == b"ab"
+        assert len(attempts) == 2
+        assert scheduler.limiter.limit < 4
+
+    asyncio.run(main())
+
+
+def test_client_error_is_not_retried():
+    async def main():
+        scheduler = UpstreamScheduler(deadline=5)
+
+        async def start():
+            raise status_error(400)
+
+        with pytest.raises(openai.APIStatusError):
+            await scheduler.stream(start, characters=10)
+        assert scheduler.limiter.inflight == 0
+
+    asyncio.run(main())
@@ -0,0 +1,54 @@
+import re
+from collections.abc import Iterator
+
+PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+SENTENCE_END = re.compile(r"(?<=[.!?])[\"')\]]*\s+")
+
+
+def _split_long(text: str, max_chars: int) -> Iterator[str]:
+    """Split text with no usable sentence boundary on whitespace, or hard-cut as a last resort."""
+    while len(text) > max_chars:
+        cut = text.rfind(" ", 0, max_chars + 1)
+        if cut <= 0:
+            cut = max_chars
+        yield text[:cut].strip()
+        text = text[cut:].strip()
+    if text:
+        yield text
+
+
+def split_text(text: str, max_chars: int = 4000) -> list[str]:
+    """Split text into chunks of at most max_chars characters.
+
+    Chunks are packed greedily from whole paragraphs, then whole sentences,
+    so that each one can be synthesized on its own without cutting words or
+    sentences in half.
+    """
+    pieces = []
+    for paragraph in PARAGRAPH_BREAK.split(text):
+        paragraph = " ".join(paragraph.split())
+        if not paragraph:
+            continue
+        if len(paragraph) <= max_chars:
+            pieces.append((paragraph, "\n\n"))
+            continue
+        for sentence in SENTENCE_END.split(paragraph):
+            for piece in _split_long(sentence.strip(), max_chars):
+                pieces.append((piece, " "))
+        # The last sentence of a paragraph is followed by a paragraph break
+        pieces[-1] = (pieces[-1][0], "\n\n")
+
+    chunks = []
+    current = ""
+    separator = ""
+    for piece, next_separator in pieces:
+        if current and len(current) + len(separator) + len(piece) <= max_chars:
+            current += separator + piece
+        else:
+            if current:
+                chunks.append(current)
+            current = piece
+        separator = next_separator
+    if current:
+        chunks.append(current)
+    return chunks
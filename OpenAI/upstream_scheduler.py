@@ -0,0 +1,266 @@
+import asyncio
+import logging
+import random
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable
+from email.utils import parsedate_to_datetime
+
+import openai
+
+logger = logging.getLogger(__name__)
+
+# Upstream statuses that mean "slow down" rather than "broken"
+THROTTLE_STATUSES = {429, 503}
+RETRYABLE_STATUSES = {408, 409, 429} | set(range(500, 600))
+
+
+class UpstreamUnavailable(Exception):
+    """Raised when a request could not be completed upstream within its deadline or retry budget."""
+
+    def __init__(self, message: str, status_code: int = 503, retry_after: float | None = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at a per-minute rate.
+
+    Waiters are served in arrival order.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: float | None = None):
+        self.rate = rate_per_minute / 60
+        self.capacity = capacity or rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, amount: float, deadline: float) -> None:
+        # A single request larger than the bucket may still go through once it is full
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+
+                wait = (amount - self.tokens) / self.rate
+                if now + wait > deadline:
+                    raise UpstreamUnavailable("Rate limit budget exhausted before the request deadline")
+                await asyncio.sleep(wait)
+
+
+class AdaptiveLimiter:
+    """Concurrency limit adjusted with additive increase / multiplicative decrease.
+
+    Each successful request grows the limit by 1/limit (about one slot per
+    round of requests). A throttled request halves it, at most once per
+    cooldown period so that a burst of 429s only counts once.
+    """
+
+    def __init__(self, initial: int, minimum: int, maximum: int, cooldown: float = 1.0):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.cooldown = cooldown
+        self.inflight = 0
+        self._last_decrease = 0.0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self, deadline: float) -> None:
+        async with self._condition:
+            while self.inflight >= int(self.limit):
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    raise UpstreamUnavailable("Timed out waiting for an upstream slot")
+                try:
+                    await asyncio.wait_for(self._condition.wait(), timeout)
+                except TimeoutError:
+                    raise UpstreamUnavailable("Timed out waiting for an upstream slot")
+            self.inflight += 1
+
+    async def release(self, outcome: str) -> None:
+        async with self._condition:
+            self.inflight -= 1
+            if outcome == "success":
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            elif outcome == "throttled":
+                now = time.monotonic()
+                if now - self._last_decrease >= self.cooldown:
+                    self.limit = max(self.minimum, self.limit / 2)
+                    self._last_decrease = now
+                    logger.warning("Upstream throttled, concurrency limit lowered to %d", int(self.limit))
+            self._condition.notify_all()
+
+
+class ClosingStream:
+    """Async iterator over a response body that runs a cleanup callback once it is closed.
+
+    Unlike the finally block of an async generator, the callback also runs
+    when the stream is closed without ever having been iterated. It is
+    passed whether the body was read to the end.
+    """
+
+    def __init__(self, chunks: AsyncIterator[bytes], close: Callable[[bool], Awaitable[None]]):
+        self._chunks = chunks
+        self._close = close
+        self._closed = False
+        self.completed = False
+
+    def __aiter__(self) -> "ClosingStream":
+        return self
+
+    async def __anext__(self) -> bytes:
+        if self._closed:
+            raise StopAsyncIteration
+        try:
+            return await self._chunks.__anext__()
+        except StopAsyncIteration:
+            self.completed = True
+            await self.aclose()
+            raise
+        except BaseException:
+            await self.aclose()
+            raise
+
+    async def aclose(self) -> None:
+        if not self._closed:
+            self._closed = True
+            await self._close(self.completed)
+
+
+async def _close_stream(stream: AsyncIterator[bytes]) -> None:
+    aclose = getattr(stream, "aclose", None)
+    if aclose is not None:
+        await aclose()
+
+
+def _status_code(error: Exception) -> int | None:
+    return error.status_code if isinstance(error, openai.APIStatusError) else None
+
+
+def _retry_after(error: Exception) -> float | None:
+    """Return the delay requested by the upstream's Retry-After headers, if any."""
+    if not isinstance(error, openai.APIStatusError):
+        return None
+    headers = error.response.headers
+
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after")
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    return None
+
+
+class UpstreamScheduler:
+    """Schedules outbound speech requests.
+
+    Requests wait for the request and character token buckets and for a
+    slot under the adaptive concurrency limit, all bounded by a deadline.
+    Throttling and transient failures are retried with jittered exponential
+    backoff, honoring Retry-After.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float = 0,
+        characters_per_minute: float = 0,
+        initial_concurrency: int = 8,
+        min_concurrency: int = 1,
+        max_concurrency: int = 64,
+        max_retries: int = 4,
+        backoff_base: float = 0.5,
+        backoff_cap: float = 20.0,
+        deadline: float = 30.0,
+    ):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.characters = TokenBucket(characters_per_minute) if characters_per_minute else None
+        self.limiter = AdaptiveLimiter(initial_concurrency, min_concurrency, max_concurrency)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.deadline = deadline
+
+    async def stream(self, start: Callable[[], Awaitable[AsyncIterator[bytes]]], characters: int) -> AsyncIterator[bytes]:
+        """Start an upstream streaming request under the scheduler.
+
+        `start` opens the request and returns an iterator over the response
+        body; it is called again for each retry. The concurrency slot is held
+        until the returned stream has been read to the end or closed, which
+        the caller must do even if it never reads it.
+        """
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            if self.requests:
+                await self.requests.acquire(1, deadline)
+            if self.characters:
+                await self.characters.acquire(characters, deadline)
+            await self.limiter.acquire(deadline)
+
+            try:
+                audio = await start()
+            except (openai.APIStatusError, openai.APIConnectionError) as e:
+                status = _status_code(e)
+                await self.limiter.release("throttled" if status in THROTTLE_STATUSES else "error")
+
+                if status is not None and status not in RETRYABLE_STATUSES:
+                    raise
+                retry_after = _retry_after(e)
+                if attempt >= self.max_retries:
+                    raise UpstreamUnavailable(
+                        f"Upstream request failed after {attempt + 1} attempts: {e}",
+                        status_code=429 if status == 429 else 503,
+                        retry_after=retry_after
+                    )
+
+                delay = retry_after
+                if delay is None:
+                    delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+                if time.monotonic() + delay > deadline:
+                    raise UpstreamUnavailable(
+                        f"Upstream request could not be retried before its deadline: {e}",
+                        status_code=429 if status == 429 else 503,
+                        retry_after=retry_after
+                    )
+
+                attempt += 1
+                logger.info("Retrying upstream request in %.2fs (attempt %d): %s", delay, attempt + 1, e)
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                await self.limiter.release("error")
+                raise
+
+            return self._release_after(audio)
+
+    def _release_after(self, audio: AsyncIterator[bytes]) -> ClosingStream:
+        async def release(completed: bool) -> None:
+            try:
+                await _close_stream(audio)
+            finally:
+                await self.limiter.release("success" if completed else "error")
+
+        return ClosingStream(audio, release)
+
+    def info(self) -> dict:
+        return {
+            "concurrency_limit": int(self.limiter.limit),
+            "inflight": self.limiter.inflight,
+        }
@@ -0,0 +1,544 @@
+"""
+Benchmark harness for the TTS services.
+
+Drives a running service over HTTP with the piper/test_files corpus plus
+synthetic long inputs, at one or more concurrency levels, and records for
+each level:
+
+- latency and time to first byte (p50/p95/p99)
+- real-time factor (request time divided by seconds of audio returned)
+- requests per second
+- server CPU time and peak resident memory
+
+Results are written as JSON; `compare` diffs two result files.
+
+    python bench.py run piper --concurrency 1,4,8
+    python bench.py compare results/piper-old.json results/piper-new.json
+"""
+
+import argparse
+import http.client
+import json
+import math
+import os
+import platform
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from urllib.parse import quote, urlsplit
+
+from corpus import DEFAULT_SYNTHETIC_SIZES, load_documents, load_texts
+from tts_common.audio import estimate_mp3_seconds, wav_seconds
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+READ_SIZE = 64 * 1024
+# Enough of the body to parse an audio header from
+HEAD_SIZE = 4096
+
+
+def http_request(base_url, method, path, body=None, headers=None, timeout=300, started=None):
+    """
+    Make a request and read the whole response, timing the first body byte.
+
+    Args:
+        base_url (str): Service URL, e.g. "http://127.0.0.1:8888"
+        method (str): HTTP method
+        path (str): Request path
+        body (bytes): Request body
+        headers (dict): Request headers
+        timeout (float): Socket timeout in seconds
+        started (float): time.perf_counter() the timings are measured from
+            (default: now)
+
+    Returns:
+        dict: status, content_type, ttfb, elapsed, size, head (the first
+            bytes of the body) and body (only kept for JSON responses)
+    """
+    started = started or time.perf_counter()
+    url = urlsplit(base_url)
+    connection = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=timeout)
+    try:
+        connection.request(method, url.path.rstrip('/') + path, body=body, headers=headers or {})
+        response = connection.getresponse()
+        content_type = response.getheader('Content-Type', '')
+        keep_body = content_type.startswith('application/json')
+
+        ttfb = None
+        size = 0
+        head = b''
+        parts = []
+        while chunk := response.read1(READ_SIZE):
+            if ttfb is None:
+                ttfb = time.perf_counter() - started
+            size += len(chunk)
+            if len(head) < HEAD_SIZE:
+                head += chunk[:HEAD_SIZE - len(head)]
+            if keep_body:
+                parts.append(chunk)
+
+        return {
+            'status': response.status,
+            'content_type': content_type,
+            'ttfb': ttfb,
+            'elapsed': time.perf_counter() - started,
+            'size': size,
+            'head': head,
+            'body': b''.join(parts) if keep_body else None,
+        }
+    finally:
+        connection.close()
+
+
+def audio_seconds(response):
+    """Return the duration of the audio in a response, or None if it isn't audio we can measure."""
+    content_type = response['content_type']
+    if content_type.startswith(('audio/wav', 'audio/x-wav')):
+        return wav_seconds(response['head'], response['size'])
+    if content_type.startswith('audio/mpeg'):
+        return estimate_mp3_seconds(response['head'], response['size'])
+    return None
+
+
+def _json_request(base_url, path, payload, options):
+    return http_request(
+        base_url, 'POST', path,
+        body=json.dumps(payload).encode('utf-8'),
+        headers={'Content-Type': 'application/json'},
+        timeout=options.timeout
+    )
+
+
+def piper_convert(base_url, item, options):
+    """POST /convert with streaming, so the first audio arrives while synthesis continues."""
+    name, text = item
+    payload = {'text': text, 'stream': True}
+    if options.voice:
+        payload['voice'] = options.voice
+    return _json_request(base_url, '/convert', payload, options)
+
+
+def coqui_synthesize(base_url, item, options):
+    """POST /synthesize, then fetch the audio file it returns; timings cover both requests."""
+    name, text = item
+    started = time.perf_counter()
+    response = _json_request(base_url, '/synthesize', {'text': text}, options)
+    if response['status'] != 200:
+        return response
+    file_path = json.loads(response['body'])['file_path']
+    return http_request(
+        base_url, 'GET', '/audio/' + quote(file_path, safe=''),
+        timeout=options.timeout,
+        started=started
+    )
+
+
+def openai_text_to_speech(base_url, item, options):
+    """POST /text-to-speech."""
+    name, text = item
+    payload = {'text': text}
+    if options.voice:
+        payload['voice'] = options.voice
+    return _json_request(base_url, '/text-to-speech', payload, options)
+
+
+def openai_document_to_speech(base_url, item, options):
+    """POST /document-to-speech with the document as a multipart upload."""
+    filename, content, content_type = item
+    boundary = uuid.uuid4().hex
+    body = (
+        f'--{boundary}\r\n'
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        f'Content-Type: {content_type}\r\n\r\n'
+    ).encode('utf-8') + content + f'\r\n--{boundary}--\r\n'.encode('utf-8')
+    path = '/document-to-speech'
+    if options.voice:
+        path += '?voice=' + quote(options.voice)
+    return http_request(
+        base_url, 'POST', path,
+        body=body,
+        headers={'Content-Type': f'multipart/form-data; boundary={boundary}'},
+        timeout=options.timeout
+    )
+
+
+def gateway_synthesize(base_url, item, options):
+    """POST /synthesize on the gateway, which streams the audio from whichever backend it picks."""
+    name, text = item
+    payload = {'text': text}
+    if options.voice:
+        payload['voice'] = options.voice
+    return _json_request(base_url, '/synthesize', payload, options)
+
+
+# Target name: (request function, input kind, default service URL)
+TARGETS = {
+    'piper': (piper_convert, 'text', 'http://127.0.0.1:8888'),
+    'coqui': (coqui_synthesize, 'text', 'http://127.0.0.1:8888'),
+    'openai': (openai_text_to_speech, 'text', 'http://127.0.0.1:8000'),
+    'openai-document': (openai_document_to_speech, 'document', 'http://127.0.0.1:8000'),
+    'gateway': (gateway_synthesize, 'text', 'http://127.0.0.1:8080'),
+}
+
+
+class ServerMonitor:
+    """
+    Measures the CPU time and peak resident memory of the service under test.
+
+    With a pid, the process and its children (e.g. Piper's parallel
+    synthesis workers) are read from /proc. Otherwise the service's own
+    /metrics endpoint is scraped.
+
+    Args:
+        pid (int): Process id of the service
+        metrics_url (str): Service URL whose /metrics is scraped if no pid is given
+        interval (float): Seconds between memory samples
+    """
+
+    def __init__(self, pid=None, metrics_url=None, interval=0.25):
+        self.pid = pid
+        self.metrics_url = metrics_url
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_cpu = None
+        self.peak_rss = None
+
+    def _process_tree(self):
+        children = {}
+        for entry in os.listdir('/proc'):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f'/proc/{entry}/stat', 'rb') as stat:
+                    # The command name may contain spaces, so split after it
+                    fields = stat.read().rsplit(b')', 1)[1].split()
+            except OSError:
+                continue
+            children.setdefault(int(fields[1]), []).append(int(entry))
+
+        pids = [self.pid]
+        for pid in pids:
+            pids.extend(children.get(pid, []))
+        return pids
+
+    def _read_proc(self):
+        cpu = 0.0
+        rss = 0
+        ticks = os.sysconf('SC_CLK_TCK')
+        page_size = os.sysconf('SC_PAGE_SIZE')
+        for pid in self._process_tree():
+            try:
+                with open(f'/proc/{pid}/stat', 'rb') as stat:
+                    fields = stat.read().rsplit(b')', 1)[1].split()
+                with open(f'/proc/{pid}/statm', 'rb') as statm:
+                    rss += int(statm.read().split()[1]) * page_size
+            except OSError:
+                continue
+            # utime and stime are fields 14 and 15 of /proc/<pid>/stat
+            cpu += (int(fields[11]) + int(fields[12])) / ticks
+        return cpu, rss
+
+    def _read_metrics(self):
+        values = {}
+        for line in _read_full(self.metrics_url, '/metrics').decode('utf-8').splitlines():
+            if line.startswith(('process_cpu_seconds_total ', 'process_resident_memory_bytes ')):
+                name, value = line.split()
+                values[name] = float(value)
+        return values.get('process_cpu_seconds_total'), values.get('process_resident_memory_bytes')
+
+    def read(self):
+        """Return the current (cpu_seconds, rss_bytes), either of which may be None."""
+        if self.pid:
+            return self._read_proc()
+        if self.metrics_url:
+            try:
+                return self._read_metrics()
+            except OSError:
+                return None, None
+        return None, None
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            rss = self.read()[1]
+            if rss is not None:
+                self.peak_rss = max(self.peak_rss or 0, rss)
+
+    def start(self):
+        self._start_cpu, self.peak_rss = self.read()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, name='server-monitor', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop sampling and return the CPU time used and peak memory since start()."""
+        self._stop.set()
+        self._thread.join()
+        cpu, rss = self.read()
+        if rss is not None:
+            self.peak_rss = max(self.peak_rss or 0, rss)
+        return {
+            'cpu_seconds': round(cpu - self._start_cpu, 3) if cpu is not None and self._start_cpu is not None else None,
+            'peak_rss_bytes': int(self.peak_rss) if self.peak_rss is not None else None,
+            'source': 'proc' if self.pid else ('metrics' if self.metrics_url else None),
+        }
+
+
+def _read_full(base_url, path):
+    url = urlsplit(base_url)
+    connection = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=10)
+    try:
+        connection.request('GET', url.path.rstrip('/') + path)
+        return connection.getresponse().read()
+    finally:
+        connection.close()
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list."""
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(values):
+    """Return mean, min, max and p50/p95/p99 of a list of numbers, or None if empty."""
+    values = sorted(v for v in values if v is not None)
+    if not values:
+        return None
+    return {
+        'mean': round(sum(values) / len(values), 4),
+        'min': round(values[0], 4),
+        'p50': round(percentile(values, 50), 4),
+        'p95': round(percentile(values, 95), 4),
+        'p99': round(percentile(values, 99), 4),
+        'max': round(values[-1], 4),
+    }
+
+
+def run_one(request_func, base_url, item, options):
+    """Run one request and reduce it to a sample."""
+    name = item[0]
+    started = time.perf_counter()
+    try:
+        response = request_func(base_url, item, options)
+    except (OSError, http.client.HTTPException, ValueError, KeyError) as e:
+        return {'input': name, 'ok': False, 'latency': time.perf_counter() - started, 'error': str(e)}
+
+    ok = response['status'] == 200
+    seconds = audio_seconds(response) if ok else None
+    return {
+        'input': name,
+        'ok': ok,
+        'status': response['status'],
+        'latency': response['elapsed'],
+        'ttfb': response['ttfb'],
+        'bytes': response['size'],
+        'audio_seconds': seconds,
+        'rtf': response['elapsed'] / seconds if seconds else None,
+        'error': None if ok else response['head'][:200].decode('utf-8', 'replace'),
+    }
+
+
+def make_unique(item):
+    """
+    Append a unique sentence to an input so server-side caches can't answer it.
+
+    Only text and plain-text documents can be changed; other documents are
+    returned as they are.
+    """
+    marker = f"Request {uuid.uuid4().hex[:8]}."
+    if len(item) == 2:
+        name, text = item
+        return name, f"{text} {marker}"
+    filename, content, content_type = item
+    if content_type == 'text/plain':
+        return filename, content + f"\n\n{marker}\n".encode('utf-8'), content_type
+    return item
+
+
+def run_level(request_func, base_url, inputs, concurrency, requests, options, monitor):
+    """Run `requests` requests with `concurrency` in flight, cycling through the inputs."""
+    items = [inputs[i % len(inputs)] for i in range(requests)]
+    if not options.allow_cache:
+        items = [make_unique(item) for item in items]
+
+    monitor.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        samples = list(executor.map(lambda item: run_one(request_func, base_url, item, options), items))
+    wall = time.perf_counter() - started
+    server = monitor.stop()
+
+    succeeded = [s for s in samples if s['ok']]
+    by_input = {}
+    for sample in succeeded:
+        by_input.setdefault(sample['input'], []).append(sample)
+
+    return {
+        'concurrency': concurrency,
+        'requests': len(samples),
+        'errors': len(samples) - len(succeeded),
+        'error_samples': [s['error'] for s in samples if not s['ok']][:3],
+        'wall_seconds': round(wall, 3),
+        'rps': round(len(succeeded) / wall, 3),
+        'latency': summarize(s['latency'] for s in succeeded),
+        'ttfb': summarize(s['ttfb'] for s in succeeded),
+        'rtf': summarize(s['rtf'] for s in succeeded),
+        'audio_seconds': round(sum(s['audio_seconds'] or 0 for s in succeeded), 3),
+        'bytes': sum(s['bytes'] for s in succeeded),
+        'server': {
+            **server,
+            'cpu_utilization': round(server['cpu_seconds'] / wall, 3) if server['cpu_seconds'] is not None else None,
+        },
+        'by_input': {
+            name: {
+                'requests': len(group),
+                'latency_p50': summarize(s['latency'] for s in group)['p50'],
+                'rtf_p50': (summarize(s['rtf'] for s in group) or {}).get('p50'),
+            }
+            for name, group in by_input.items()
+        },
+    }
+
+
+def load_inputs(kind, synthetic_sizes):
+    if kind == 'document':
+        return load_documents(synthetic_sizes)
+    return load_texts(synthetic_sizes)
+
+
+def run(options):
+    request_func, kind, default_url = TARGETS[options.target]
+    base_url = options.url or default_url
+    inputs = load_inputs(kind, options.synthetic_sizes)
+    monitor = ServerMonitor(pid=options.pid, metrics_url=None if options.no_metrics else base_url)
+
+    for item in inputs[:options.warmup]:
+        sample = run_one(request_func, base_url, item, options)
+        if not sample['ok']:
+            print(f"Warmup request for {sample['input']} failed: {sample['error']}", file=sys.stderr)
+
+    results = {
+        'target': options.target,
+        'url': base_url,
+        'started_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'host': {
+            'hostname': platform.node(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'python': platform.python_version(),
+        },
+        'settings': {
+            'concurrency': options.concurrency,
+            'requests_per_level': options.requests,
+            'warmup': options.warmup,
+            'synthetic_sizes': options.synthetic_sizes,
+            'voice': options.voice,
+            'allow_cache': options.allow_cache,
+            'inputs': [item[0] for item in inputs],
+        },
+        'levels': [],
+    }
+
+    for concurrency in options.concurrency:
+        level = run_level(request_func, base_url, inputs, concurrency, options.requests, options, monitor)
+        results['levels'].append(level)
+        latency = level['latency'] or {}
+        ttfb = level['ttfb'] or {}
+        rtf = level['rtf'] or {}
+        print(
+            f"concurrency {concurrency:>3}: {level['rps']:.2f} req/s, "
+            f"latency p50 {latency.get('p50')} p95 {latency.get('p95')} p99 {latency.get('p99')}, "
+            f"ttfb p50 {ttfb.get('p50')}, rtf p50 {rtf.get('p50')}, "
+            f"errors {level['errors']}/{level['requests']}"
+        )
+
+    output = options.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        timestamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        output = os.path.join(RESULTS_DIR, f'{options.target}-{timestamp}.json')
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+
+
+# Metrics compared between runs: (label, getter, whether higher is better)
+COMPARED_METRICS = (
+    ('latency p50', lambda level: (level['latency'] or {}).get('p50'), False),
+    ('latency p95', lambda level: (level['latency'] or {}).get('p95'), False),
+    ('latency p99', lambda level: (level['latency'] or {}).get('p99'), False),
+    ('ttfb p50', lambda level: (level['ttfb'] or {}).get('p50'), False),
+    ('rtf p50', lambda level: (level['rtf'] or {}).get('p50'), False),
+    ('req/s', lambda level: level['rps'], True),
+    ('cpu seconds', lambda level: level['server'].get('cpu_seconds'), False),
+    ('peak rss MB', lambda level: (level['server'].get('peak_rss_bytes') or 0) / 1024 / 1024 or None, False),
+)
+
+
+def compare(options):
+    """Print the change in each metric between two runs; exit with 1 if any got worse by more than the threshold."""
+    with open(options.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    with open(options.current, encoding='utf-8') as f:
+        current = json.load(f)
+
+    baseline_levels = {level['concurrency']: level for level in baseline['levels']}
+    regressions = 0
+    for level in current['levels']:
+        old = baseline_levels.get(level['concurrency'])
+        if old is None:
+            continue
+        print(f"concurrency {level['concurrency']}:")
+        for label, get, higher_is_better in COMPARED_METRICS:
+            before, after = get(old), get(level)
+            if before is None or after is None:
+                continue
+            change = (after - before) / before * 100 if before else 0.0
+            worse = change < -options.threshold if higher_is_better else change > options.threshold
+            regressions += worse
+            marker = '  REGRESSION' if worse else ''
+            print(f"  {label:<12} {before:>10.3f} -> {after:>10.3f} ({change:+.1f}%){marker}")
+        if level['errors'] > old['errors']:
+            regressions += 1
+            print(f"  errors       {old['errors']:>10} -> {level['errors']:>10}  REGRESSION")
+
+    sys.exit(1 if regressions else 0)
+
+
+def _int_list(value):
+    return [int(v) for v in value.split(',') if v]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the TTS services")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help="Benchmark a running service")
+    run_parser.add_argument('target', choices=sorted(TARGETS))
+    run_parser.add_argument('--url', help="Service URL (default depends on the target)")
+    run_parser.add_argument('--concurrency', type=_int_list, default=[1, 4], help="Comma-separated concurrency levels")
+    run_parser.add_argument('--requests', type=int, default=20, help="Requests per concurrency level")
+    run_parser.add_argument('--warmup', type=int, default=1, help="Requests made before measuring")
+    run_parser.add_argument('--synthetic-sizes', type=_int_list, default=list(DEFAULT_SYNTHETIC_SIZES),
+                            help="Lengths of the synthetic long inputs, in characters")
+    run_parser.add_argument('--voice', help="Voice to request (default: the service's default)")
+    run_parser.add_argument('--allow-cache', action='store_true',
+                            help="Repeat inputs exactly, letting server-side caches answer them")
+    run_parser.add_argument('--timeout', type=float, default=300, help="Per-request timeout in seconds")
+    run_parser.add_argument('--pid', type=int, help="Service process id, to read CPU and memory from /proc")
+    run_parser.add_argument('--no-metrics', action='store_true', help="Don't scrape the service's /metrics")
+    run_parser.add_argument('--output', help="Result file (default: results/<target>-<timestamp>.json)")
+
+    compare_parser = commands.add_parser('compare', help="Compare two result files")
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=10.0, help="Percent change reported as a regression")
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        run(args)
+    else:
+        compare(args)
@@ -0,0 +1,90 @@
+"""
+Benchmark inputs: the documents in piper/test_files plus synthetic long texts.
+
+Synthetic texts are built by repeating the ghost story up to a target length
+and cutting at a sentence boundary, so they read like real prose (sentence
+lengths, punctuation) rather than a repeated word.
+"""
+
+import os
+import re
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'piper', 'test_files')
+
+# Plain-text corpus files used for the text endpoints
+TEXT_FILES = ('test.txt', 'ghost_story.txt')
+
+# Documents accepted by every document endpoint, with their content types
+DOCUMENT_FILES = {
+    'test.txt': 'text/plain',
+    'test.pdf': 'application/pdf',
+    'test.docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+}
+
+DEFAULT_SYNTHETIC_SIZES = (2000, 8000)
+
+_SENTENCE_END = re.compile(r'[.!?]["\')\]]*\s')
+
+
+def _read_text(name):
+    with open(os.path.join(CORPUS_DIR, name), 'r', encoding='utf-8') as f:
+        return f.read().strip()
+
+
+def synthetic_text(size, seed_text=None):
+    """
+    Build a text of about `size` characters ending on a sentence boundary.
+
+    Args:
+        size (int): Target length in characters
+        seed_text (str): Text to repeat (default: the ghost story)
+
+    Returns:
+        str: The synthetic text
+    """
+    seed_text = seed_text or _read_text('ghost_story.txt')
+    text = seed_text
+    while len(text) < size:
+        text += "\n\n" + seed_text
+
+    text = text[:size]
+    ends = list(_SENTENCE_END.finditer(text))
+    if ends:
+        text = text[:ends[-1].end()]
+    return text.strip()
+
+
+def load_texts(synthetic_sizes=DEFAULT_SYNTHETIC_SIZES):
+    """
+    Load the text inputs.
+
+    Args:
+        synthetic_sizes (iterable): Lengths of the synthetic long texts to add
+
+    Returns:
+        list: (name, text) pairs
+    """
+    texts = [(name, _read_text(name)) for name in TEXT_FILES]
+    texts += [(f'synthetic-{size}', synthetic_text(size)) for size in synthetic_sizes]
+    return texts
+
+
+def load_documents(synthetic_sizes=DEFAULT_SYNTHETIC_SIZES):
+    """
+    Load the document inputs.
+
+    Synthetic long texts are included as plain-text documents.
+
+    Args:
+        synthetic_sizes (iterable): Lengths of the synthetic long documents to add
+
+    Returns:
+        list: (file name, content bytes, content type) tuples
+    """
+    documents = []
+    for name, content_type in DOCUMENT_FILES.items():
+        with open(os.path.join(CORPUS_DIR, name), 'rb') as f:
+            documents.append((name, f.read(), content_type))
+    for size in synthetic_sizes:
+        documents.append((f'synthetic-{size}.txt', synthetic_text(size).encode('utf-8'), 'text/plain'))
+    return documents
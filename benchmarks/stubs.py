@@ -0,0 +1,331 @@
+"""
+Local stand-ins for the remote TTS backends, so the OpenAI proxy and the
+Coqui docker client can be benchmarked without network calls or a GPU.
+
+    python stubs.py openai --port 9100        # OPENAI_BASE_URL=http://127.0.0.1:9100/v1
+    python stubs.py coqui-server --port 5002  # what mozilla-coqui-docker talks to
+
+There are also stand-ins for the services' own APIs, so the gateway can be
+tested without any of them running:
+
+    python stubs.py piper --port 8881         # POST /convert
+    python stubs.py coqui --port 8882         # POST /synthesize, GET /audio/<name>
+    python stubs.py openai-proxy --port 8000  # POST /text-to-speech
+
+Both stubs produce silence whose duration matches the text length at a
+typical speaking rate, after a fixed latency, streamed at a configurable
+multiple of real time. The audio is well-formed enough (MP3 frame header,
+WAV header) for the benchmark to work out its duration.
+"""
+
+import argparse
+import json
+import random
+import struct
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# MPEG-1 Layer III frame header: 160 kbit/s, 44.1 kHz, mono
+MP3_FRAME_HEADER = b'\xff\xfb\xa0\xc0'
+MP3_BYTES_PER_SECOND = 160000 // 8
+WAV_SAMPLE_RATE = 22050
+CHUNK_SECONDS = 0.25
+
+
+def speech_seconds(text, characters_per_second):
+    return max(0.5, len(text) / characters_per_second)
+
+
+def wav_header(sample_rate, data_size):
+    return (
+        b'RIFF' + struct.pack('<I', 36 + data_size) + b'WAVE'
+        + b'fmt ' + struct.pack('<IHHIIHH', 16, 1, 1, sample_rate, sample_rate * 2, 2, 16)
+        + b'data' + struct.pack('<I', data_size)
+    )
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        if self.server.options.verbose:
+            super().log_message(format, *args)
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self, content_type, header, size, bytes_per_second, wait=None):
+        """
+        Send `header` plus `size` bytes of silence, paced at options.speed times real time.
+
+        `wait` is called between the header and the audio, for services that
+        send the header before synthesizing.
+        """
+        options = self.server.options
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(header) + size))
+        self.end_headers()
+
+        chunk_size = int(bytes_per_second * CHUNK_SECONDS)
+        self.wfile.write(header)
+        if wait is not None:
+            self.wfile.flush()
+            wait()
+        sent = 0
+        while sent < size:
+            chunk = min(chunk_size, size - sent)
+            time.sleep(chunk / bytes_per_second / options.speed)
+            self.wfile.write(b'\0' * chunk)
+            sent += chunk
+
+    def _delay(self):
+        """Wait the configured latency, plus the tail latency for a fraction of requests."""
+        options = self.server.options
+        latency = options.latency
+        if options.tail_rate and random.random() < options.tail_rate:
+            latency += options.tail_latency
+        time.sleep(latency)
+
+    def _throttled(self):
+        options = self.server.options
+        if options.throttle_rate and random.random() < options.throttle_rate:
+            self._send_json(429, {'error': {'message': 'Rate limit reached (stub)'}}, {'retry-after-ms': '200'})
+            return True
+        return False
+
+
+class OpenAIHandler(StubHandler):
+    """POST /v1/audio/speech returning constant-bitrate MP3."""
+
+    def do_POST(self):
+        body = self._read_body()
+        if urlsplit(self.path).path.rstrip('/') != '/v1/audio/speech':
+            self._send_json(404, {'error': {'message': 'Not found'}})
+            return
+        if self._throttled():
+            return
+
+        text = json.loads(body or b'{}').get('input', '')
+        options = self.server.options
+        self._delay()
+        seconds = speech_seconds(text, options.characters_per_second)
+        size = int(seconds * MP3_BYTES_PER_SECOND) - len(MP3_FRAME_HEADER)
+        self._stream('audio/mpeg', MP3_FRAME_HEADER, size, MP3_BYTES_PER_SECOND)
+
+
+class CoquiServerHandler(StubHandler):
+    """GET or POST /api/tts?text=... returning 16-bit mono WAV."""
+
+    def _tts(self):
+        body = self._read_body()
+        url = urlsplit(self.path)
+        if url.path.rstrip('/') != '/api/tts':
+            self._send_json(404, {'error': 'Not found'})
+            return
+        if self._throttled():
+            return
+
+        params = parse_qs(url.query)
+        if not params and body:
+            params = parse_qs(body.decode('utf-8'))
+        text = params.get('text', [''])[0]
+        options = self.server.options
+        self._delay()
+        seconds = speech_seconds(text, options.characters_per_second)
+        size = int(seconds * WAV_SAMPLE_RATE) * 2
+        self._stream('audio/wav', wav_header(WAV_SAMPLE_RATE, size), size, WAV_SAMPLE_RATE * 2)
+
+    do_GET = _tts
+    do_POST = _tts
+
+
+class ServiceHandler(StubHandler):
+    """Base for stand-ins of the services' own APIs, which answer their health check paths."""
+
+    health_paths = {'/ready', '/replicas', '/cache/stats', '/metrics'}
+
+    def do_GET(self):
+        path = urlsplit(self.path).path.rstrip('/')
+        if path in self.health_paths:
+            self._send_json(200, {'ready': True})
+        else:
+            self._send_json(404, {'error': 'Not found'})
+
+    def _request_json(self):
+        return json.loads(self._read_body() or b'{}')
+
+    def _send_wav(self, text, wait=None):
+        seconds = speech_seconds(text, self.server.options.characters_per_second)
+        size = int(seconds * WAV_SAMPLE_RATE) * 2
+        self._stream('audio/wav', wav_header(WAV_SAMPLE_RATE, size), size, WAV_SAMPLE_RATE * 2, wait)
+
+
+class PiperHandler(ServiceHandler):
+    """
+    POST /convert with "stream" returning 16-bit mono WAV, as the Piper
+    service does: the WAV header is sent before the first sentence is
+    synthesized.
+    """
+
+    def do_POST(self):
+        payload = self._request_json()
+        if urlsplit(self.path).path.rstrip('/') != '/convert':
+            self._send_json(404, {'error': 'Not found'})
+            return
+        if self._throttled():
+            return
+        self._send_wav(payload.get('text', ''), wait=self._delay)
+
+
+class CoquiHandler(ServiceHandler):
+    """
+    POST /synthesize as the Coqui services do: with "stream" the WAV is the
+    response (mozilla-coqui-docker), otherwise it is fetched from /audio/<name>.
+    """
+
+    def do_POST(self):
+        payload = self._request_json()
+        if urlsplit(self.path).path.rstrip('/') != '/synthesize':
+            self._send_json(404, {'error': 'Not found'})
+            return
+        if self._throttled():
+            return
+        self._delay()
+        text = payload.get('text', '')
+        if payload.get('stream'):
+            self._send_wav(text)
+            return
+        name = f"{uuid.uuid4().hex}.wav"
+        with self.server.lock:
+            self.server.clips[name] = text
+        self._send_json(200, {'success': True, 'file_path': name})
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if not path.startswith('/audio/'):
+            super().do_GET()
+            return
+        with self.server.lock:
+            text = self.server.clips.pop(path[len('/audio/'):], None)
+        if text is None:
+            self._send_json(404, {'error': 'Audio file not found'})
+            return
+        self._send_wav(text)
+
+
+class OpenAIProxyHandler(ServiceHandler):
+    """POST /text-to-speech returning constant-bitrate MP3, as the OpenAI service does."""
+
+    def do_POST(self):
+        payload = self._request_json()
+        if urlsplit(self.path).path.rstrip('/') != '/text-to-speech':
+            self._send_json(404, {'detail': 'Not Found'})
+            return
+        if self._throttled():
+            return
+        self._delay()
+        seconds = speech_seconds(payload.get('text', ''), self.server.options.characters_per_second)
+        size = int(seconds * MP3_BYTES_PER_SECOND) - len(MP3_FRAME_HEADER)
+        self._stream('audio/mpeg', MP3_FRAME_HEADER, size, MP3_BYTES_PER_SECOND)
+
+
+HANDLERS = {
+    'openai': OpenAIHandler,
+    'coqui-server': CoquiServerHandler,
+    'piper': PiperHandler,
+    'coqui': CoquiHandler,
+    'openai-proxy': OpenAIProxyHandler,
+}
+
+DEFAULT_PORTS = {
+    'openai': 9100,
+    'coqui-server': 5002,
+    'piper': 8881,
+    'coqui': 8882,
+    'openai-proxy': 8000,
+}
+
+
+def serve(backend, host='127.0.0.1', port=None, latency=0.3, speed=10.0,
+          characters_per_second=15.0, throttle_rate=0.0, tail_rate=0.0, tail_latency=2.0, verbose=False):
+    """
+    Create a stub server for a backend (call serve_forever() on the result).
+
+    Args:
+        backend (str): One of HANDLERS
+        host (str): Address to listen on
+        port (int): Port to listen on (default: the backend's usual port)
+        latency (float): Seconds before the response starts
+        speed (float): Audio is streamed at this multiple of real time
+        characters_per_second (float): Speaking rate used to size the audio
+        throttle_rate (float): Fraction of requests answered with 429
+        tail_rate (float): Fraction of requests delayed by tail_latency on top of latency
+        tail_latency (float): Extra seconds before a tail request's response starts
+        verbose (bool): Log every request
+
+    Returns:
+        ThreadingHTTPServer: The server, bound but not yet serving
+    """
+    server = ThreadingHTTPServer((host, port or DEFAULT_PORTS[backend]), HANDLERS[backend])
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.clips = {}  # audio names handed out by the coqui stub -> text
+    server.options = argparse.Namespace(
+        latency=latency,
+        speed=speed,
+        characters_per_second=characters_per_second,
+        throttle_rate=throttle_rate,
+        tail_rate=tail_rate,
+        tail_latency=tail_latency,
+        verbose=verbose
+    )
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run a local stub of a remote TTS backend")
+    parser.add_argument('backend', choices=sorted(HANDLERS))
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, help="Port (default: " + ", ".join(
+        f"{port} for {backend}" for backend, port in DEFAULT_PORTS.items()) + ")")
+    parser.add_argument('--latency', type=float, default=0.3, help="Seconds before the response starts")
+    parser.add_argument('--speed', type=float, default=10.0, help="Stream audio at this multiple of real time")
+    parser.add_argument('--characters-per-second', type=float, default=15.0, help="Speaking rate")
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument('--tail-rate', type=float, default=0.0, help="Fraction of requests with extra latency")
+    parser.add_argument('--tail-latency', type=float, default=2.0, help="Extra seconds for those requests")
+    parser.add_argument('--verbose', action='store_true', help="Log every request")
+    args = parser.parse_args()
+
+    stub = serve(
+        args.backend,
+        host=args.host,
+        port=args.port,
+        latency=args.latency,
+        speed=args.speed,
+        characters_per_second=args.characters_per_second,
+        throttle_rate=args.throttle_rate,
+        tail_rate=args.tail_rate,
+        tail_latency=args.tail_latency,
+        verbose=args.verbose
+    )
+    print(f"{args.backend} stub listening on http://{args.host}:{stub.server_address[1]}")
+    try:
+        stub.serve_forever()
+    except KeyboardInterrupt:
+        pass
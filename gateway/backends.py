@@ -0,0 +1,228 @@
+"""
+Adapters for the TTS services behind the gateway.
+
+Each service has its own synthesis API. An adapter turns a gateway request
+into a call to that API and returns the audio as a streamed HTTP response,
+and keeps the load, health and recent latency of its service for the
+router to choose between them.
+"""
+
+import json
+import statistics
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from urllib.parse import quote
+
+# Quality tiers, lowest first
+TIERS = ('basic', 'standard', 'premium')
+
+# Audio formats the backends return, by gateway format name
+FORMATS = {
+    'wav': 'audio/wav',
+    'mp3': 'audio/mpeg',
+}
+
+
+class Backend(ABC):
+    """
+    A TTS service the gateway can route requests to.
+
+    Args:
+        name (str): Name used in responses, metrics and logs
+        url (str): Base URL of the service
+        tier (str): Quality tier, one of TIERS
+        voices (dict): Gateway voice names mapped to the request fields that
+            select that voice on this service; the "default" voice is used
+            when a request doesn't name one
+        max_concurrency (int): Requests the service handles at once before
+            further ones queue
+        health_path (str): Path requested to check the service's health
+        latency_window (float): Seconds a latency measurement counts towards
+            the backend's recent latency
+    """
+
+    kind = None
+    audio_format = 'wav'
+    # Bytes a response can start with before any audio, like a streamed WAV
+    # header sent ahead of synthesis
+    header_bytes = 44
+    default_health_path = '/ready'
+
+    def __init__(self, name, url, tier='standard', voices=None, max_concurrency=4, health_path=None,
+                 latency_window=60):
+        if tier not in TIERS:
+            raise ValueError(f"Unknown tier for backend {name}: {tier}")
+        self.name = name
+        self.url = url.rstrip('/')
+        self.tier = tier
+        self.voices = voices or {'default': {}}
+        self.max_concurrency = max_concurrency
+        self.health_path = health_path or self.default_health_path
+        self.latency_window = latency_window
+
+        self.outstanding = 0
+        self.healthy = True
+        self.busy_until = 0.0
+        self.last_error = None
+        self.stats = {'ok': 0, 'failed': 0, 'throttled': 0, 'rejected': 0}
+        self._latencies = deque(maxlen=100)  # (time.monotonic(), seconds to the first audio)
+
+    @property
+    def mimetype(self):
+        return FORMATS[self.audio_format]
+
+    def voice_params(self, voice):
+        """Return the request fields selecting a gateway voice, or None if the backend doesn't have it."""
+        return self.voices.get(voice or 'default')
+
+    def record_latency(self, seconds):
+        self._latencies.append((time.monotonic(), seconds))
+
+    def recent_latencies(self):
+        cutoff = time.monotonic() - self.latency_window
+        return [seconds for measured, seconds in self._latencies if measured >= cutoff]
+
+    def recent_latency(self):
+        """Median time to the first audio over the latency window, or None if there were no requests."""
+        latencies = self.recent_latencies()
+        return statistics.median(latencies) if latencies else None
+
+    def expected_latency(self):
+        """
+        Estimate how long a new request would take to start returning audio.
+
+        The recent latency is scaled up by how many requests are already
+        outstanding per slot. A backend without recent measurements counts
+        as fast, so that it is tried again.
+        """
+        latency = self.recent_latency()
+        if latency is None:
+            return 0.0
+        return latency * (1 + self.outstanding / self.max_concurrency)
+
+    def saturated(self):
+        """Return True if the backend is at its concurrency limit or asked the gateway to back off."""
+        return self.outstanding >= self.max_concurrency or time.monotonic() < self.busy_until
+
+    def info(self):
+        latencies = sorted(self.recent_latencies())
+        return {
+            'name': self.name,
+            'kind': self.kind,
+            'url': self.url,
+            'tier': self.tier,
+            'format': self.audio_format,
+            'voices': sorted(self.voices),
+            'healthy': self.healthy,
+            'busy': time.monotonic() < self.busy_until,
+            'outstanding': self.outstanding,
+            'max_concurrency': self.max_concurrency,
+            'recent_latency': statistics.median(latencies) if latencies else None,
+            'recent_latency_p95': latencies[int(0.95 * (len(latencies) - 1))] if latencies else None,
+            'last_error': self.last_error,
+            **self.stats,
+        }
+
+    @abstractmethod
+    def request(self, session, text, params, timeout):
+        """
+        Ask the service for speech.
+
+        Args:
+            session (requests.Session): Session to send the request with
+            text (str): Text to synthesize
+            params (dict): Fields selecting the voice, from voice_params()
+            timeout (tuple): Connect and read timeouts
+
+        Returns:
+            requests.Response: The audio response, streamed, or the service's
+                error response
+
+        Raises:
+            requests.RequestException: If the service couldn't be reached
+            ValueError: If the service's response couldn't be understood
+        """
+
+    def _post_json(self, session, path, payload, timeout):
+        return session.post(f"{self.url}{path}", json=payload, stream=True, timeout=timeout)
+
+
+class PiperBackend(Backend):
+    """The Piper service, streaming WAV from POST /convert."""
+
+    kind = 'piper'
+
+    def request(self, session, text, params, timeout):
+        return self._post_json(session, '/convert', {**params, 'text': text, 'stream': True}, timeout)
+
+
+class CoquiBackend(Backend):
+    """The in-process Coqui service: POST /synthesize writes a WAV file, fetched from /audio."""
+
+    kind = 'coqui'
+
+    def request(self, session, text, params, timeout):
+        response = self._post_json(session, '/synthesize', {**params, 'text': text}, timeout)
+        if response.status_code != 200:
+            return response
+        try:
+            file_path = json.loads(response.content)['file_path']
+        except (ValueError, KeyError):
+            raise ValueError(f"Unexpected response from {self.url}/synthesize")
+        return session.get(f"{self.url}/audio/{quote(file_path, safe='')}", stream=True, timeout=timeout)
+
+
+class CoquiDockerBackend(Backend):
+    """The Coqui docker service, streaming WAV from POST /synthesize."""
+
+    kind = 'coqui-docker'
+    default_health_path = '/replicas'
+
+    def request(self, session, text, params, timeout):
+        return self._post_json(session, '/synthesize', {**params, 'text': text, 'stream': True}, timeout)
+
+
+class OpenAIBackend(Backend):
+    """The OpenAI service, streaming MP3 from POST /text-to-speech."""
+
+    kind = 'openai'
+    audio_format = 'mp3'
+    header_bytes = 0
+    default_health_path = '/cache/stats'
+
+    def request(self, session, text, params, timeout):
+        return self._post_json(session, '/text-to-speech', {**params, 'text': text}, timeout)
+
+
+BACKEND_TYPES = {cls.kind: cls for cls in (PiperBackend, CoquiBackend, CoquiDockerBackend, OpenAIBackend)}
+
+
+def load_backends(path):
+    """
+    Create the backends listed in a JSON file.
+
+    The file holds a list of objects with a "kind" (one of BACKEND_TYPES)
+    and the arguments of Backend, e.g.
+
+        [{"kind": "piper", "name": "piper", "url": "http://127.0.0.1:8881", "tier": "basic"}]
+
+    Returns:
+        list: The backends, in the order listed
+    """
+    with open(path, encoding='utf-8') as f:
+        config = json.load(f)
+
+    backends = []
+    for entry in config:
+        entry = dict(entry)
+        kind = entry.pop('kind')
+        if kind not in BACKEND_TYPES:
+            raise ValueError(f"Unknown backend kind: {kind}. Supported kinds are: {', '.join(BACKEND_TYPES)}")
+        entry.setdefault('name', kind)
+        backends.append(BACKEND_TYPES[kind](**entry))
+
+    names = [backend.name for backend in backends]
+    if len(set(names)) != len(names):
+        raise ValueError("Backend names must be unique")
+    return backends
@@ -0,0 +1,93 @@
+from flask import Flask, request, jsonify, Response, stream_with_context
+import os
+import time
+from tts_common import TTSMetrics, configure_logging, install_flask
+from tts_common.audio import estimate_mp3_seconds, wav_seconds
+from backends import FORMATS, TIERS, load_backends
+from router import GatewayError, Router
+
+# Log through a background thread so request handlers never block on output
+configure_logging()
+
+app = Flask(__name__)
+
+# Request latency, backend latency and real-time factor, served on /metrics
+metrics = TTSMetrics()
+install_flask(app, metrics)
+
+# The TTS services requests are routed to, listed in a JSON file
+BACKENDS_FILE = os.getenv(
+    "GATEWAY_BACKENDS", os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backends.json')
+)
+AUDIO_SECONDS = {'wav': wav_seconds, 'mp3': estimate_mp3_seconds}
+
+router = Router(
+    load_backends(BACKENDS_FILE),
+    connect_timeout=float(os.getenv("GATEWAY_CONNECT_TIMEOUT", "3.05")),
+    read_timeout=float(os.getenv("GATEWAY_READ_TIMEOUT", "60")),
+    hedge_after=float(os.getenv("GATEWAY_HEDGE_AFTER_MS", "1000")) / 1000,
+    slow_after=float(os.getenv("GATEWAY_SLOW_AFTER_MS", "5000")) / 1000,
+    health_interval=float(os.getenv("GATEWAY_HEALTH_INTERVAL", "5")),
+    on_latency=lambda backend, seconds: metrics.model_latency.observe(seconds, backend=backend)
+)
+router.register_metrics(metrics.registry)
+
+@app.route('/synthesize', methods=['POST'])
+def synthesize():
+    body = request.get_json(silent=True) or {}
+    text = body.get('text', '')
+    if not text:
+        return jsonify({'error': 'No text provided'}), 400
+    quality = body.get('quality')
+    if quality is not None and quality not in TIERS:
+        return jsonify({'error': f"Unsupported quality: {quality}. Supported qualities are: {', '.join(TIERS)}"}), 400
+    audio_format = body.get('format')
+    if audio_format is not None and audio_format not in FORMATS:
+        return jsonify({'error': f"Unsupported format: {audio_format}. Supported formats are: {', '.join(FORMATS)}"}), 400
+
+    started = time.perf_counter()
+    try:
+        audio = router.synthesize(
+            text,
+            voice=body.get('voice'),
+            quality=quality,
+            fallback=body.get('fallback', True),
+            audio_format=audio_format
+        )
+    except GatewayError as e:
+        return jsonify({'error': str(e)}), e.status_code
+
+    # Pass the audio straight through to the caller as it arrives
+    backend = audio.backend
+    chunks = metrics.instrument_stream('/synthesize', audio, started, AUDIO_SECONDS[backend.audio_format])
+    response = Response(
+        stream_with_context(chunks),
+        mimetype=audio.mimetype,
+        headers={
+            'Content-Disposition': f'inline; filename="speech.{backend.audio_format}"',
+            'X-TTS-Backend': backend.name,
+            'X-TTS-Tier': backend.tier,
+            'X-TTS-Hedged': 'true' if audio.hedged else 'false'
+        }
+    )
+    # Release the backend even if the caller disconnects part way through
+    response.call_on_close(audio.close)
+    return response
+
+@app.route('/voices')
+def list_voices():
+    return jsonify({'voices': router.voices(), 'qualities': list(TIERS), 'formats': list(FORMATS)})
+
+@app.route('/backends')
+def list_backends():
+    return jsonify(router.info())
+
+@app.route('/ready')
+def readiness():
+    if router.ready():
+        return jsonify({'ready': True})
+    return jsonify({'ready': False, 'error': 'No backend is healthy'}), 503
+
+# Development server only; see "Production" in the README
+if __name__ == '__main__':
+    app.run(host='0.0.0.0', port=8080)
@@ -0,0 +1,425 @@
+"""
+Routing of synthesis requests across the TTS backends.
+
+Only backends with the requested voice (and format) are considered. They are
+tried in order of:
+
+1. health: backends that failed recently come last
+2. spare capacity: backends at their concurrency limit, or that answered
+   429/503 recently, come after the rest
+3. speed: backends whose recent latency is over the slow threshold come
+   after the rest
+4. quality: the requested tier first, then the nearest other tiers
+5. expected latency: the recent median time to the first audio, scaled by the
+   requests already outstanding
+
+If a backend can't be reached or times out, it is marked unhealthy and the
+request fails over to the next one. A 5xx answer may have been caused by the
+text rather than the backend, so it only fails over to one other backend and
+leaves health to the health checks. If a backend hasn't
+started returning audio after the hedge delay, the request is also sent to
+the next backend with spare capacity, and whichever answers first is used.
+Once audio has started streaming a request can't move to another backend.
+"""
+
+import json
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from backends import TIERS
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 16 * 1024
+# Statuses meaning a backend is overloaded rather than broken
+BUSY_STATUSES = {429, 503}
+
+
+class GatewayError(Exception):
+    """Raised when no backend could synthesize a request."""
+
+    def __init__(self, message, status_code=502):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class BackendError(Exception):
+    """
+    Raised when one backend couldn't synthesize a request.
+
+    server_error is True if the backend answered with a 5xx for this request,
+    rather than being unreachable or overloaded.
+    """
+
+    def __init__(self, message, status_code=502, server_error=False):
+        super().__init__(message)
+        self.status_code = status_code
+        self.server_error = server_error
+
+
+class AudioStream:
+    """
+    Iterable of audio chunks streamed from the backend that answered.
+
+    The chunks read to check that the audio had started are replayed
+    first. The backend's request stays outstanding until the stream has
+    been read to the end or closed.
+    """
+
+    def __init__(self, router, backend, response, head, chunks, hedged=False):
+        self.router = router
+        self.backend = backend
+        self.response = response
+        self.hedged = hedged
+        self.mimetype = backend.mimetype
+        self._head = head
+        self._chunks = chunks
+        self._closed = False
+
+    def __iter__(self):
+        try:
+            yield from self._head
+            yield from self._chunks
+        except requests.RequestException as e:
+            # Too late to fail over once audio has been sent
+            self.router._mark(self.backend, False, str(e))
+            raise GatewayError(f"Backend {self.backend.name} failed mid-stream: {e}")
+        finally:
+            self.close()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self.response.close()
+        self.router._release(self.backend)
+
+
+def _error_message(response):
+    """Return the error a service sent, from its JSON body if it has one."""
+    try:
+        body = json.loads(response.content)
+        return str(body.get('error') or body.get('detail') or body)
+    except (ValueError, AttributeError):
+        return response.text[:200] or f"HTTP {response.status_code}"
+
+
+class Router:
+    """
+    Sends each synthesis request to the best available backend.
+
+    Args:
+        backends (list): Backend instances to route between
+        connect_timeout (float): Seconds to wait for a connection to a backend
+        read_timeout (float): Seconds to wait between bytes of a response
+        hedge_after (float): Seconds without a response before the request
+            is also sent to another backend (0 disables hedging)
+        slow_after (float): Recent latency above which a backend is only
+            used when faster ones aren't available
+        busy_backoff (float): Seconds a backend that answered 429 or 503 is
+            avoided, unless it sent a Retry-After header
+        health_interval (float): Seconds between health checks (0 disables them)
+        pool_size (int): Keep-alive connections kept per backend
+        on_latency (callable): Called with a backend's name and the seconds
+            it took to start returning audio
+    """
+
+    def __init__(self, backends, connect_timeout=3.05, read_timeout=60, hedge_after=1.0, slow_after=5.0,
+                 busy_backoff=1.0, health_interval=5, pool_size=16, on_latency=None):
+        if not backends:
+            raise ValueError("At least one backend is required")
+        self.backends = list(backends)
+        self.timeout = (connect_timeout, read_timeout)
+        self.hedge_after = hedge_after
+        self.slow_after = slow_after
+        self.busy_backoff = busy_backoff
+        self.health_interval = health_interval
+        self.on_latency = on_latency
+        self.stats = {'requests': 0, 'failovers': 0, 'hedges': 0, 'hedge_wins': 0}
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._turn = 0
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(self.backends), pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        # Requests to backends run here, so a request can wait on several at once
+        self._executor = ThreadPoolExecutor(
+            max_workers=pool_size * len(self.backends), thread_name_prefix='gateway-backend'
+        )
+
+        self._health_thread = None
+        if health_interval:
+            self._health_thread = threading.Thread(target=self._check_health, name='gateway-health', daemon=True)
+            self._health_thread.start()
+
+    def info(self):
+        """Return the routing counters and the state of every backend."""
+        with self._lock:
+            return {**self.stats, 'backends': [backend.info() for backend in self.backends]}
+
+    def voices(self):
+        """Return the gateway voices and the backends that have each one."""
+        voices = {}
+        for backend in self.backends:
+            for voice in backend.voices:
+                voices.setdefault(voice, []).append(backend.name)
+        return voices
+
+    def ready(self):
+        """Return True if any backend is healthy."""
+        return any(backend.healthy for backend in self.backends)
+
+    def candidates(self, voice=None, quality=None, fallback=True, audio_format=None):
+        """
+        Return the backends able to serve a request, best first.
+
+        Args:
+            voice (str): Gateway voice name (None for the default voice)
+            quality (str): Preferred tier, one of TIERS (None for any)
+            fallback (bool): Also return backends of other tiers
+            audio_format (str): Required audio format (None for any)
+        """
+        backends = [
+            backend for backend in self.backends
+            if backend.voice_params(voice) is not None
+            and (audio_format is None or backend.audio_format == audio_format)
+            and (fallback or quality is None or backend.tier == quality)
+        ]
+
+        def distance(backend):
+            if quality is None:
+                return 0
+            return abs(TIERS.index(backend.tier) - TIERS.index(quality))
+
+        def slow(backend):
+            latency = backend.recent_latency()
+            return latency is not None and latency > self.slow_after
+
+        with self._lock:
+            # Ties are broken round-robin so idle backends share the load
+            self._turn += 1
+            count = len(backends)
+            order = {backend: (i - self._turn) % count for i, backend in enumerate(backends)}
+            return sorted(backends, key=lambda backend: (
+                not backend.healthy,
+                backend.saturated(),
+                slow(backend),
+                distance(backend),
+                backend.expected_latency(),
+                order[backend]
+            ))
+
+    def synthesize(self, text, voice=None, quality=None, fallback=True, audio_format=None):
+        """
+        Synthesize text on the best backend, failing over and hedging as needed.
+
+        Args:
+            text (str): Text to synthesize
+            voice, quality, fallback, audio_format: As for candidates()
+
+        Returns:
+            AudioStream: The audio, streamed from the backend as it is read
+
+        Raises:
+            GatewayError: If no backend has the voice, or every backend tried failed
+        """
+        candidates = self.candidates(voice, quality, fallback, audio_format)
+        if not candidates:
+            raise GatewayError(f"No backend offers the voice {voice or 'default'} in that quality and format", 400)
+        with self._lock:
+            self.stats['requests'] += 1
+
+        pending = {}  # future -> backend
+        errors = []
+        server_errors = 0
+        hedge = None
+        hedge_deadline = time.monotonic() + self.hedge_after if self.hedge_after else None
+        self._start(candidates.pop(0), text, voice, pending)
+        try:
+            while pending:
+                timeout = None
+                if hedge_deadline is not None:
+                    timeout = max(0.0, hedge_deadline - time.monotonic())
+                done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+                if not done:
+                    # Only hedge onto a backend with spare capacity, so hedges never pile onto overloaded ones
+                    hedge_deadline = None
+                    hedge = next((b for b in candidates if b.healthy and not b.saturated()), None)
+                    if hedge is not None:
+                        candidates.remove(hedge)
+                        logger.info("Hedging request on %s after %.2fs", hedge.name, self.hedge_after)
+                        with self._lock:
+                            self.stats['hedges'] += 1
+                        self._start(hedge, text, voice, pending)
+                    continue
+
+                for future in done:
+                    backend = pending.pop(future)
+                    try:
+                        audio = future.result()
+                    except BackendError as e:
+                        errors.append(e)
+                        if e.server_error:
+                            # The text may be what broke synthesis, so try one other backend rather than all of them
+                            server_errors += 1
+                            del candidates[1 if server_errors == 1 else 0:]
+                        continue
+                    # Any other request, finished or not, is discarded below
+                    if backend is hedge:
+                        with self._lock:
+                            self.stats['hedge_wins'] += 1
+                    audio.hedged = hedge is not None
+                    return audio
+
+                if not pending and candidates:
+                    with self._lock:
+                        self.stats['failovers'] += 1
+                    self._start(candidates.pop(0), text, voice, pending)
+        finally:
+            for future, backend in pending.items():
+                self._discard(future, backend)
+
+        # Report a rejection (e.g. text too long) over an outage, since retrying won't help. If every
+        # backend answered with a 5xx, the request itself may be at fault, so it isn't an outage either
+        outage = 502 if all(e.server_error for e in errors) else 503
+        status_code = next((e.status_code for e in errors if e.status_code < 500), outage)
+        raise GatewayError("No backend could synthesize the request: " + "; ".join(map(str, errors)), status_code)
+
+    def _start(self, backend, text, voice, pending):
+        with self._lock:
+            backend.outstanding += 1
+        future = self._executor.submit(self._attempt, backend, text, backend.voice_params(voice))
+        pending[future] = backend
+
+    def _attempt(self, backend, text, params):
+        """
+        Request speech from one backend, returning it as an AudioStream once the audio starts.
+
+        A service can send its response headers, and a WAV header, before it
+        has synthesized anything. The response is read until audio arrives,
+        so that its latency is the time to the first audio, and a request that
+        fails before then can still fail over.
+        """
+        started = time.perf_counter()
+        try:
+            response = backend.request(self.session, text, params, self.timeout)
+        except (requests.RequestException, ValueError) as e:
+            self._fail(backend, e)
+
+        if response.status_code != 200:
+            message = _error_message(response)
+            response.close()
+            if response.status_code in BUSY_STATUSES:
+                retry_after = response.headers.get('Retry-After')
+                backoff = float(retry_after) if retry_after and retry_after.isdigit() else self.busy_backoff
+                with self._lock:
+                    backend.busy_until = time.monotonic() + backoff
+                self._release(backend, 'throttled')
+            elif response.status_code >= 500:
+                # One request's failure says nothing about the backend; the health checks decide that
+                self._release(backend, 'failed')
+                with self._lock:
+                    backend.last_error = f"HTTP {response.status_code}: {message}"
+            else:
+                self._release(backend, 'rejected')
+            server_error = response.status_code >= 500 and response.status_code not in BUSY_STATUSES
+            raise BackendError(f"{backend.name}: {message}", response.status_code, server_error)
+
+        head = []
+        chunks = response.iter_content(chunk_size=CHUNK_SIZE)
+        try:
+            received = 0
+            while received <= backend.header_bytes:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                head.append(chunk)
+                received += len(chunk)
+        except requests.RequestException as e:
+            response.close()
+            self._fail(backend, e)
+
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            backend.record_latency(elapsed)
+            backend.stats['ok'] += 1
+        if self.on_latency is not None:
+            self.on_latency(backend.name, elapsed)
+        return AudioStream(self, backend, response, head, chunks)
+
+    def _fail(self, backend, error):
+        self._release(backend, 'failed')
+        self._mark(backend, False, str(error))
+        raise BackendError(f"{backend.name}: {error}")
+
+    def _release(self, backend, outcome=None):
+        with self._lock:
+            backend.outstanding -= 1
+            if outcome is not None:
+                backend.stats[outcome] += 1
+
+    def _discard(self, future, backend):
+        """Throw away the response of a request that lost the race, whenever it arrives."""
+        if future.cancel():
+            self._release(backend)
+            return
+
+        def close(future):
+            if future.exception() is None:
+                # Closing the stream releases the backend
+                future.result().close()
+
+        future.add_done_callback(close)
+
+    def _mark(self, backend, healthy, error=None):
+        with self._lock:
+            if backend.healthy and not healthy:
+                logger.warning("Backend %s is unhealthy: %s", backend.name, error)
+            elif healthy and not backend.healthy:
+                logger.info("Backend %s is healthy again", backend.name)
+            backend.healthy = healthy
+            backend.last_error = error
+
+    def check(self, backend):
+        """Check one backend's health, returning True if it is ready."""
+        try:
+            response = self.session.get(f"{backend.url}{backend.health_path}", timeout=self.timeout[0])
+            response.close()
+            healthy, error = response.status_code < 500, f"HTTP {response.status_code}"
+        except requests.RequestException as e:
+            healthy, error = False, str(e)
+        self._mark(backend, healthy, None if healthy else error)
+        return healthy
+
+    def _check_health(self):
+        while not self._closed.wait(self.health_interval):
+            for backend in self.backends:
+                self.check(backend)
+
+    def register_metrics(self, registry):
+        """Report hedging and failover counts on a MetricsRegistry."""
+        registry.counter(
+            "tts_gateway_hedges_total", "Requests also sent to a second backend because the first was slow"
+        ).set_function(lambda: self.stats['hedges'])
+        registry.counter(
+            "tts_gateway_hedge_wins_total", "Hedged requests answered first by the second backend"
+        ).set_function(lambda: self.stats['hedge_wins'])
+        registry.counter(
+            "tts_gateway_failovers_total", "Requests retried on another backend after one failed"
+        ).set_function(lambda: self.stats['failovers'])
+        registry.gauge(
+            "tts_gateway_outstanding_requests", "Requests waiting on a backend"
+        ).set_function(lambda: sum(backend.outstanding for backend in self.backends))
+
+    def close(self):
+        self._closed.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
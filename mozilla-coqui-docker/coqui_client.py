@@ -0,0 +1,242 @@
+"""
+Client for one or more Coqui TTS server replicas.
+
+Connections are kept alive in a pool shared by all requests, every request
+has connect and read timeouts, and audio is streamed through in chunks
+rather than buffered whole.
+
+Each request goes to the healthy replica with the fewest outstanding
+requests. A replica that fails to connect is marked unhealthy and the
+request is retried on the next one. A 5xx error may have been caused by the
+text rather than the replica, so it doesn't mark the replica unhealthy and
+the request is only retried on one other replica. A background thread
+checks the health of every replica, marking the ones that fail unhealthy
+and the ones which come back healthy again.
+
+A Coqui server only responds once it has synthesized the whole text, so
+the read timeout grows with the length of the text. A read timeout means
+the text took too long rather than that the replica is down: it is
+reported to the caller, without marking the replica unhealthy or sending
+the same text to another replica.
+"""
+
+import logging
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 16 * 1024
+# Status meaning a replica is overloaded rather than broken
+BUSY_STATUS = 503
+
+
+class CoquiServerError(Exception):
+    """Raised when no replica could synthesize a request."""
+
+    def __init__(self, message, status_code=502):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class Replica:
+    """A Coqui server and its load and health."""
+
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+        self.outstanding = 0
+        self.healthy = True
+        self.last_error = None
+
+    def info(self):
+        return {
+            'url': self.url,
+            'healthy': self.healthy,
+            'outstanding': self.outstanding,
+            'last_error': self.last_error,
+        }
+
+
+class AudioStream:
+    """
+    Iterable of audio chunks streamed from a replica.
+
+    The replica's request stays outstanding, and its connection out of the
+    pool, until the stream has been read to the end or closed.
+    """
+
+    def __init__(self, client, replica, response):
+        self.client = client
+        self.replica = replica
+        self.response = response
+        self._closed = False
+
+    def __iter__(self):
+        try:
+            yield from self.response.iter_content(chunk_size=CHUNK_SIZE)
+        except requests.RequestException as e:
+            # Too late to fail over once audio has been sent
+            if not isinstance(e, requests.ReadTimeout):
+                self.client._mark(self.replica, False, str(e))
+            raise CoquiServerError(f"Coqui server {self.replica.url} failed mid-stream: {e}")
+        finally:
+            self.close()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self.response.close()
+        with self.client._lock:
+            self.replica.outstanding -= 1
+
+
+class CoquiClient:
+    """
+    Load-balancing client for Coqui TTS server replicas.
+
+    Args:
+        servers (list): Base URLs of the replicas
+        connect_timeout (float): Seconds to wait for a connection
+        read_timeout (float): Seconds to wait between bytes of a response
+        read_timeout_per_char (float): Seconds added to the read timeout for
+            each character of the text, since the server synthesizes all of
+            it before responding
+        health_interval (float): Seconds between health checks (0 disables them)
+        health_path (str): Path requested to check a replica's health
+        pool_size (int): Keep-alive connections kept per replica
+    """
+
+    def __init__(self, servers, connect_timeout=3.05, read_timeout=60, read_timeout_per_char=0.1,
+                 health_interval=5, health_path='/', pool_size=16):
+        if not servers:
+            raise ValueError("At least one Coqui server is required")
+        self.replicas = [Replica(url) for url in dict.fromkeys(servers)]
+        self.timeout = (connect_timeout, read_timeout)
+        self.read_timeout_per_char = read_timeout_per_char
+        self.health_interval = health_interval
+        self.health_path = health_path
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._turn = 0
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(self.replicas), pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._health_thread = None
+        if health_interval:
+            self._health_thread = threading.Thread(target=self._check_health, name='coqui-health', daemon=True)
+            self._health_thread.start()
+
+    def info(self):
+        """Return the state of every replica."""
+        with self._lock:
+            return [replica.info() for replica in self.replicas]
+
+    def _candidates(self):
+        """Replicas to try in order: healthy ones by outstanding requests, then unhealthy ones."""
+        with self._lock:
+            # Ties are broken round-robin so idle replicas share the load
+            self._turn += 1
+            count = len(self.replicas)
+            order = {replica: (i - self._turn) % count for i, replica in enumerate(self.replicas)}
+            return sorted(self.replicas, key=lambda replica: (not replica.healthy, replica.outstanding, order[replica]))
+
+    def _mark(self, replica, healthy, error=None):
+        with self._lock:
+            if replica.healthy and not healthy:
+                logger.warning("Coqui server %s is unhealthy: %s", replica.url, error)
+            elif healthy and not replica.healthy:
+                logger.info("Coqui server %s is healthy again", replica.url)
+            replica.healthy = healthy
+            replica.last_error = error
+
+    def synthesize(self, params):
+        """
+        Request speech from the least loaded replica, failing over to the others.
+
+        Args:
+            params (dict): Query parameters for the server's /api/tts endpoint
+
+        Returns:
+            AudioStream: The WAV file, streamed from the replica as it is read
+
+        Raises:
+            CoquiServerError: If every replica failed, a replica rejected the
+                request with a 4xx error, or it timed out synthesizing
+        """
+        connect_timeout, read_timeout = self.timeout
+        timeout = (connect_timeout, read_timeout + self.read_timeout_per_char * len(params.get('text', '')))
+        errors = []
+        server_errors = 0
+        for replica in self._candidates():
+            if server_errors > 1:
+                break
+            with self._lock:
+                replica.outstanding += 1
+            try:
+                response = self.session.post(
+                    f"{replica.url}/api/tts",
+                    params=params,
+                    stream=True,
+                    timeout=timeout
+                )
+            except requests.ReadTimeout:
+                with self._lock:
+                    replica.outstanding -= 1
+                # Other replicas would take as long, and the load would multiply
+                raise CoquiServerError(
+                    f"Coqui server {replica.url} timed out synthesizing the text after {timeout[1]:.0f}s",
+                    status_code=504
+                )
+            except requests.RequestException as e:
+                with self._lock:
+                    replica.outstanding -= 1
+                self._mark(replica, False, str(e))
+                errors.append(f"{replica.url}: {e}")
+                continue
+
+            if response.status_code != 200:
+                message = response.text
+                response.close()
+                with self._lock:
+                    replica.outstanding -= 1
+                if response.status_code < 500:
+                    # The request itself was rejected, so other replicas would reject it too
+                    raise CoquiServerError(f"Coqui server error: {message}", status_code=response.status_code)
+                # One request's failure says nothing about the replica; the health checks decide that
+                with self._lock:
+                    replica.last_error = f"HTTP {response.status_code}"
+                if response.status_code != BUSY_STATUS:
+                    # The text may be what broke synthesis, so try one other replica rather than all of them
+                    server_errors += 1
+                errors.append(f"{replica.url}: HTTP {response.status_code}")
+                continue
+
+            return AudioStream(self, replica, response)
+
+        raise CoquiServerError("No Coqui server could synthesize the request: " + "; ".join(errors))
+
+    def check(self, replica):
+        """Check one replica's health, returning True if it responded."""
+        try:
+            response = self.session.get(f"{replica.url}{self.health_path}", timeout=self.timeout[0])
+            response.close()
+            healthy, error = response.status_code < 500, f"HTTP {response.status_code}"
+        except requests.RequestException as e:
+            healthy, error = False, str(e)
+        self._mark(replica, healthy, None if healthy else error)
+        return healthy
+
+    def _check_health(self):
+        while not self._closed.wait(self.health_interval):
+            for replica in self.replicas:
+                self.check(replica)
+
+    def close(self):
+        self._closed.set()
+        self.session.close()
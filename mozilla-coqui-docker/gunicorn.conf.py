@@ -0,0 +1,26 @@
+"""
+Production server settings:
+
+    uv run gunicorn -c gunicorn.conf.py main:app
+
+The app holds no models, only connections to the Coqui servers, so each
+worker imports it for itself rather than sharing one copy loaded before the
+fork. Each worker balances its own requests across the Coqui servers.
+
+Any setting can be overridden on the command line, e.g. `--workers 4`.
+"""
+
+from tts_common.serving import default_workers
+
+bind = "0.0.0.0:8888"
+preload_app = False
+workers = default_workers()
+# Requests mostly wait on the Coqui servers, so each worker serves several at once
+worker_class = "gthread"
+threads = 8
+# Workers are recycled after a number of requests, jittered so they don't
+# all restart at once
+max_requests = 1000
+max_requests_jitter = 100
+timeout = 120
+graceful_timeout = 60
@@ -1,17 +1,36 @@
-from flask import Flask, render_template, request, send_file, jsonify
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context
 import os
-import uuid
-import requests
-import base64
+import time
+from tts_common import TTSMetrics, configure_logging, install_flask
+from tts_common.audio import wav_seconds
+from tts_common.audio_store import AudioStore
+from coqui_client import CoquiClient, CoquiServerError
+
+# Log through a background thread so request handlers never block on output
+configure_logging()
 
 app = Flask(__name__)
 
-# Coqui server configuration
-COQUI_SERVER = "http://localhost:5002"
+# Request latency, Coqui server latency and real-time factor, served on /metrics
+metrics = TTSMetrics()
+install_flask(app, metrics)
+
+# Coqui server replicas, comma-separated; requests go to the least loaded healthy one
+COQUI_SERVERS = [s for s in os.getenv("COQUI_SERVERS", "http://localhost:5002,http://localhost:5003").split(",") if s]
+COQUI_MODEL = "tts_models/en/ljspeech/tacotron2-DDC"
 
-# Ensure audio_files directory exists
+coqui = CoquiClient(
+    COQUI_SERVERS,
+    connect_timeout=float(os.getenv("COQUI_CONNECT_TIMEOUT", "3.05")),
+    read_timeout=float(os.getenv("COQUI_READ_TIMEOUT", "60")),
+    read_timeout_per_char=float(os.getenv("COQUI_READ_TIMEOUT_PER_CHAR", "0.1")),
+    health_interval=float(os.getenv("COQUI_HEALTH_INTERVAL", "5"))
+)
+
+# Generated audio expires and is kept under a size quota (see the AUDIO_* settings)
 AUDIO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'audio_files')
-os.makedirs(AUDIO_DIR, exist_ok=True)
+audio_store = AudioStore.from_env(AUDIO_DIR)
+audio_store.register_metrics(metrics.registry)
 
 @app.route('/')
 def index():
@@ -24,39 +43,60 @@ def synthesize():
         if not text:
             return jsonify({'error': 'No text provided'}), 400
 
-        # Create a unique filename in our audio_files directory
-        output_file = os.path.join(AUDIO_DIR, f"{uuid.uuid4()}.wav")
-        
-        # Make request to Coqui server
-        response = requests.post(
-            f"{COQUI_SERVER}/api/tts",
-            params={
-                "text": text,
-                "model_name": "tts_models/en/ljspeech/tacotron2-DDC",
-                "speaker_idx": "0",
-                "language": "en"
-            }
-        )
-        
-        if response.status_code != 200:
-            return jsonify({'error': f'Coqui server error: {response.text}'}), 500
-
-        # Save the audio file
-        with open(output_file, 'wb') as f:
-            f.write(response.content)
-        
-        # Return the relative path for the frontend to use
-        relative_path = os.path.relpath(output_file, os.path.dirname(os.path.abspath(__file__)))
+        # Make request to a Coqui server, which starts streaming the audio back
+        started = time.perf_counter()
+        try:
+            with metrics.time_model('coqui-server'):
+                audio = coqui.synthesize({
+                    "text": text,
+                    "model_name": COQUI_MODEL,
+                    "speaker_idx": "0",
+                    "language": "en"
+                })
+        except CoquiServerError as e:
+            return jsonify({'error': str(e)}), e.status_code
+
+        stream = request.json.get('stream', False)
+        chunks = metrics.instrument_stream('/synthesize', audio, started, wav_seconds, first_byte=stream)
+        if stream:
+            # Pass the audio straight through to the caller as it arrives
+            response = Response(
+                stream_with_context(chunks),
+                mimetype='audio/wav',
+                headers={'Content-Disposition': 'inline; filename="speech.wav"'}
+            )
+            # Release the replica even if the caller disconnects part way through
+            response.call_on_close(audio.close)
+            return response
+
+        # Save the audio into a new clip in the audio store as it arrives
+        try:
+            with audio_store.create('wav') as output_file:
+                for chunk in chunks:
+                    output_file.write(chunk)
+        finally:
+            audio.close()
+
+        # Return the name for the frontend to fetch from /audio
         return jsonify({
             'success': True,
-            'file_path': relative_path
+            'file_path': output_file.name
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/replicas')
+def replicas():
+    return jsonify({'replicas': coqui.info()})
+
 @app.route('/audio/<path:filename>')
 def serve_audio(filename):
-    return send_file(filename, mimetype='audio/wav')
+    # Older pages send the path including the audio_files directory
+    response = audio_store.send(os.path.basename(filename), mimetype='audio/wav', download_name='speech.wav')
+    if response is None:
+        return jsonify({'error': 'Audio file not found'}), 404
+    return response
 
+# Development server only; see "Production" in the README
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=8888)
+    app.run(host='0.0.0.0', port=8888)
@@ -0,0 +1,83 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from coqui_client import CoquiClient, CoquiServerError
+
+
+def stub_replica(status, requests):
+    """Start a stub Coqui server answering /api/tts with `status`, returning its URL."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_POST(self):
+            requests.append(self.server.server_port)
+            body = b'RIFF' + b'\0' * 40 if status == 200 else b'synthesis failed'
+            self.send_response(status)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+@pytest.fixture
+def replicas():
+    servers = []
+
+    def start(*statuses):
+        requests = []
+        urls = []
+        for status in statuses:
+            server, url = stub_replica(status, requests)
+            servers.append(server)
+            urls.append(url)
+        return urls, requests
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_server_error_fails_over_without_marking_unhealthy(replicas):
+    urls, requests = replicas(500, 200)
+    client = CoquiClient(urls, health_interval=0)
+    # Send the request to the failing replica first
+    client._candidates = lambda: list(client.replicas)
+
+    audio = client.synthesize({'text': 'hello'})
+    assert b''.join(audio).startswith(b'RIFF')
+    assert len(requests) == 2
+    assert all(replica.healthy for replica in client.replicas)
+    assert client.replicas[0].last_error == 'HTTP 500'
+    assert all(replica.outstanding == 0 for replica in client.replicas)
+    client.close()
+
+
+def test_server_errors_fail_over_to_one_other_replica(replicas):
+    urls, requests = replicas(500, 500, 500)
+    client = CoquiClient(urls, health_interval=0)
+
+    with pytest.raises(CoquiServerError) as error:
+        client.synthesize({'text': 'hello'})
+    assert error.value.status_code == 502
+    assert len(requests) == 2
+    assert all(replica.healthy for replica in client.replicas)
+    client.close()
+
+
+def test_unreachable_replica_is_marked_unhealthy(replicas):
+    urls, requests = replicas(200)
+    client = CoquiClient(['http://127.0.0.1:1'] + urls, health_interval=0)
+    client._candidates = lambda: list(client.replicas)
+
+    audio = client.synthesize({'text': 'hello'})
+    audio.close()
+    assert [replica.healthy for replica in client.replicas] == [False, True]
+    client.close()
@@ -0,0 +1,226 @@
+"""
+Dynamic micro-batching of Coqui synthesis.
+
+Concurrent requests for the same model are queued and collected for up to
+a few milliseconds (or until a batch is full), then synthesized together.
+
+Coqui's Tacotron2 decoder stops on a single stop token, so the acoustic
+model still runs one sentence at a time. The vocoder, which is a stack of
+convolutions and dominates CPU time, runs once per batch over the padded
+spectrograms of every sentence in it, and the audio is split back up per
+request.
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+
+import numpy as np
+import torch
+from TTS.tts.utils.synthesis import synthesis, trim_silence
+from TTS.vocoder.utils.generic_utils import interpolate_vocoder_input
+
+logger = logging.getLogger(__name__)
+
+# Silence inserted between sentences, as Coqui's own Synthesizer does
+SENTENCE_GAP_SAMPLES = 10000
+
+# Open batchers, restarted in forked children
+_batchers = weakref.WeakSet()
+
+
+class MicroBatcher:
+    """
+    Collects submitted items into batches processed on a single worker thread.
+
+    Args:
+        process_batch (callable): Takes a list of items and returns a list of
+            results in the same order; a result that is an exception is
+            raised to that item's caller
+        max_batch_size (int): Most items processed together
+        max_wait (float): Seconds to wait for more items after the first
+            one arrives
+        name (str): Name of the worker thread
+        on_batch (callable): Called with the size of each batch
+    """
+
+    def __init__(self, process_batch, max_batch_size=8, max_wait=0.005, name='batcher', on_batch=None):
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.on_batch = on_batch
+        self.name = name
+        self._start()
+        _batchers.add(self)
+
+    def _start(self):
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        """Queue an item, returning a Future for its result."""
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def _collect(self):
+        """Wait for the next batch; returns None once closed."""
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            try:
+                # Items already waiting are taken even once the wait is over
+                entry = self._queue.get(timeout=max(0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if entry is None:
+                self._queue.put(None)
+                break
+            batch.append(entry)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            futures = [future for _, future in batch if future.set_running_or_notify_cancel()]
+            items = [item for item, future in batch if future in futures]
+            if not items:
+                continue
+            if self.on_batch is not None:
+                self.on_batch(len(items))
+
+            try:
+                results = self.process_batch(items)
+            except Exception as e:
+                logger.exception("Batch of %d failed", len(items))
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            for future, result in zip(futures, results):
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    def close(self):
+        """Stop the worker once the items already queued are processed."""
+        _batchers.discard(self)
+        self._queue.put(None)
+
+
+def _restart_batchers():
+    # Worker threads don't survive a fork, so a forked child starts its own
+    # (nothing is queued yet when a preforking server forks its workers)
+    for batcher in list(_batchers):
+        batcher._start()
+
+
+os.register_at_fork(after_in_child=_restart_batchers)
+
+
+def can_batch_vocoder(tts):
+    """Return True if a model has a separate vocoder and no speaker or language inputs."""
+    synthesizer = tts.synthesizer
+    return (
+        getattr(synthesizer, 'vocoder_model', None) is not None
+        and not tts.is_multi_speaker
+        and not tts.is_multi_lingual
+    )
+
+
+def _spectrogram(synthesizer, sentence):
+    """Run the acoustic model on one sentence and return the vocoder input, shaped (1, mels, frames)."""
+    outputs = synthesis(
+        model=synthesizer.tts_model,
+        text=sentence,
+        CONFIG=synthesizer.tts_config,
+        use_cuda=synthesizer.use_cuda,
+        use_griffin_lim=False
+    )
+    mel = outputs["outputs"]["model_outputs"][0].detach().cpu().numpy()
+    # Convert from the acoustic model's normalization to the vocoder's
+    mel = synthesizer.tts_model.ap.denormalize(mel.T).T
+    vocoder_input = synthesizer.vocoder_ap.normalize(mel.T)
+
+    scale_factor = [1, synthesizer.vocoder_config["audio"]["sample_rate"] / synthesizer.tts_model.ap.sample_rate]
+    if scale_factor[1] != 1:
+        return interpolate_vocoder_input(scale_factor, vocoder_input)
+    return torch.tensor(vocoder_input).unsqueeze(0)
+
+
+def _vocode(synthesizer, spectrograms):
+    """Run the vocoder once over a padded batch of spectrograms and return each one's waveform."""
+    vocoder = synthesizer.vocoder_model
+    frames = [spectrogram.shape[-1] for spectrogram in spectrograms]
+    longest = max(frames)
+    # Repeat each spectrogram's last frame, as the vocoder's own inference padding does
+    batch = torch.cat([
+        torch.nn.functional.pad(spectrogram, (0, longest - spectrogram.shape[-1]), mode='replicate')
+        for spectrogram in spectrograms
+    ])
+
+    device = next(vocoder.parameters()).device
+    with torch.inference_mode():
+        waveforms = vocoder.inference(batch.to(device)).cpu()
+
+    hop_length = synthesizer.vocoder_config["audio"]["hop_length"]
+    padding = getattr(vocoder, 'inference_padding', 0)
+    return [
+        waveforms[i].reshape(-1)[:(count + 2 * padding) * hop_length].numpy()
+        for i, count in enumerate(frames)
+    ]
+
+
+def synthesize_batch(tts, texts):
+    """
+    Synthesize several texts with one vocoder pass.
+
+    Args:
+        tts (TTS): A model for which can_batch_vocoder() is True
+        texts (list): Texts to synthesize
+
+    Returns:
+        list: A waveform (float32 array of samples) or an exception for each text
+    """
+    synthesizer = tts.synthesizer
+    results = [None] * len(texts)
+    spectrograms = []
+    owners = []  # index of the text each spectrogram belongs to
+    for index, text in enumerate(texts):
+        try:
+            sentences = synthesizer.split_into_sentences(text)
+            for sentence in sentences:
+                spectrograms.append(_spectrogram(synthesizer, sentence))
+                owners.append(index)
+            if not sentences:
+                results[index] = ValueError("No text to synthesize")
+        except Exception as e:
+            results[index] = e
+
+    if not spectrograms:
+        return results
+
+    trim = synthesizer.tts_config.audio.get("do_trim_silence", False)
+    wavs = {}
+    for owner, waveform in zip(owners, _vocode(synthesizer, spectrograms)):
+        if isinstance(results[owner], Exception):
+            continue
+        if trim:
+            waveform = trim_silence(waveform, synthesizer.tts_model.ap)
+        parts = wavs.setdefault(owner, [])
+        parts.append(np.asarray(waveform, dtype=np.float32))
+        parts.append(np.zeros(SENTENCE_GAP_SAMPLES, dtype=np.float32))
+
+    for owner, parts in wavs.items():
+        results[owner] = np.concatenate(parts)
+    return results
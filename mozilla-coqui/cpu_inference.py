@@ -0,0 +1,62 @@
+"""
+CPU inference tuning for Coqui models.
+
+Dynamic int8 quantization stores the weights of the Linear and LSTM layers
+as int8 and quantizes activations on the fly, which suits Tacotron2: its
+autoregressive decoder is mostly LSTM cells and small Linear layers run
+once per frame. Convolutions (the postnet and convolutional vocoders such
+as HiFiGAN) stay in fp32, since PyTorch has no dynamic quantization for
+them. With a HiFiGAN vocoder, which takes much of the CPU time, the
+overall speedup is therefore well short of the decoder's own, and no
+particular speedup is claimed.
+
+Use quality_check.py to measure the speedup and compare the output
+against the fp32 model before enabling quantization for a model.
+"""
+
+import logging
+
+import torch
+from torch.ao.quantization import quantize_dynamic
+from tts_common.serving import cpu_count
+
+from model_pool import load_model
+
+logger = logging.getLogger(__name__)
+
+# Layer types with dynamic int8 kernels
+QUANTIZED_LAYERS = {torch.nn.Linear, torch.nn.LSTM, torch.nn.LSTMCell, torch.nn.GRU}
+
+
+def configure_threads(intra_op=None, inter_op=None):
+    """
+    Pin the number of threads torch uses.
+
+    Must be called before the first model is loaded: torch refuses to change
+    the inter-op pool once it has been used.
+
+    Args:
+        intra_op (int): Threads used inside one operator (default: one per
+            core this process may run on)
+        inter_op (int): Threads running independent operators in parallel
+            (default: 1, as synthesis is a chain of dependent operators)
+    """
+    intra_op = intra_op or cpu_count()
+    inter_op = inter_op or 1
+    torch.set_num_threads(intra_op)
+    torch.set_num_interop_threads(inter_op)
+    logger.info("Using %d intra-op and %d inter-op torch threads", intra_op, inter_op)
+
+
+def quantize(tts):
+    """Apply dynamic int8 quantization to a model's acoustic model and vocoder, in place."""
+    synthesizer = tts.synthesizer
+    quantize_dynamic(synthesizer.tts_model, QUANTIZED_LAYERS, dtype=torch.qint8, inplace=True)
+    if getattr(synthesizer, 'vocoder_model', None) is not None:
+        quantize_dynamic(synthesizer.vocoder_model, QUANTIZED_LAYERS, dtype=torch.qint8, inplace=True)
+    return tts
+
+
+def load_quantized_model(model_name):
+    """Load a Coqui TTS model by name and quantize it."""
+    return quantize(load_model(model_name))
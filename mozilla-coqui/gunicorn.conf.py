@@ -0,0 +1,51 @@
+"""
+Production server settings:
+
+    uv run gunicorn -c gunicorn.conf.py main:app
+
+The app is loaded once in the master process, which loads and warms up the
+configured models before forking the workers, so the workers share the
+model weights copy-on-write instead of each holding a copy. The master runs
+torch on a single thread, since an OpenMP thread pool doesn't survive a
+fork; each worker then gets an equal share of the cores for its own.
+
+Any setting can be overridden on the command line, e.g. `--max-requests 500`.
+"""
+
+import gc
+import os
+
+from tts_common.serving import default_workers, threads_per_worker
+
+# Threads per worker requested by the user; 0 shares the cores between the workers
+WORKER_TORCH_THREADS = int(os.getenv("COQUI_TORCH_THREADS", "0"))
+
+# Load the models before forking instead of in a startup thread
+os.environ["COQUI_EAGER_STARTUP"] = "1"
+os.environ["COQUI_TORCH_THREADS"] = "1"
+os.environ["COQUI_TORCH_INTEROP_THREADS"] = "1"
+
+bind = "0.0.0.0:8888"
+preload_app = True
+workers = default_workers()
+# Concurrent requests within a worker are micro-batched together
+worker_class = "gthread"
+threads = 4
+# Workers are recycled after a number of requests to bound memory growth,
+# jittered so they don't all restart at once
+max_requests = 1000
+max_requests_jitter = 100
+timeout = 120
+graceful_timeout = 60
+
+
+def pre_fork(server, worker):
+    # Keep the garbage collector from writing to (and so copying) the
+    # pages of the objects the workers inherit
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    import torch
+
+    torch.set_num_threads(WORKER_TORCH_THREADS or threads_per_worker(server.cfg.workers))
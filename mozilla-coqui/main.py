@@ -1,21 +1,132 @@
-from flask import Flask, render_template, request, send_file, jsonify
-from TTS.api import TTS
+from flask import Flask, render_template, request, jsonify
+from tts_common import TTSMetrics, configure_logging, install_flask
+from tts_common.audio import wav_seconds
+from tts_common.audio_store import AudioStore
+from tts_common.sentence_cache import SentenceCache
+from model_pool import ModelPool, ModelNotFoundError, ModelNotReadyError, load_model
+from cpu_inference import configure_threads, load_quantized_model
+import numpy as np
 import os
-import uuid
+import threading
+import time
+
+# Log through a background thread so request handlers never block on output
+configure_logging()
 
 app = Flask(__name__)
 
-# Initialize TTS
-tts = TTS(model_name="tts_models/en/ljspeech/tacotron2-DDC", progress_bar=False)
+# Request latency, model latency and real-time factor, served on /metrics
+metrics = TTSMetrics()
+install_flask(app, metrics)
+
+# Models that requests may choose from, preloaded in this order
+COQUI_MODELS = [m for m in os.getenv("COQUI_MODELS", "tts_models/en/ljspeech/tacotron2-DDC").split(",") if m]
+DEFAULT_MODEL = os.getenv("COQUI_DEFAULT_MODEL", COQUI_MODELS[0])
+MAX_MODEL_MEMORY_MB = os.getenv("COQUI_MAX_MODEL_MEMORY_MB")
+EAGER_STARTUP = os.getenv("COQUI_EAGER_STARTUP", "0") == "1"
+# Concurrent requests for a model are synthesized together, up to this many at a time
+MAX_BATCH_SIZE = int(os.getenv("COQUI_MAX_BATCH_SIZE", "8"))
+MAX_BATCH_WAIT_MS = float(os.getenv("COQUI_MAX_BATCH_WAIT_MS", "5"))
+# Opt-in int8 quantization for CPU-only hosts; check quality with quality_check.py first
+QUANTIZE = os.getenv("COQUI_QUANTIZE", "0") == "1"
+TORCH_THREADS = int(os.getenv("COQUI_TORCH_THREADS", "0"))
+TORCH_INTEROP_THREADS = int(os.getenv("COQUI_TORCH_INTEROP_THREADS", "0"))
+SENTENCE_CACHE_DIR = os.getenv(
+    "COQUI_SENTENCE_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sentence_cache')
+)
+SENTENCE_CACHE_MB = int(os.getenv("COQUI_SENTENCE_CACHE_MB", "1024"))
+
+configure_threads(TORCH_THREADS, TORCH_INTEROP_THREADS)
+
+batch_sizes = metrics.registry.histogram(
+    'tts_batch_size',
+    'Number of requests synthesized together',
+    buckets=(1, 2, 4, 8, 16, 32)
+)
+
+models = ModelPool(
+    COQUI_MODELS if DEFAULT_MODEL in COQUI_MODELS else [DEFAULT_MODEL] + COQUI_MODELS,
+    max_memory_bytes=int(MAX_MODEL_MEMORY_MB) * 1024 * 1024 if MAX_MODEL_MEMORY_MB else None,
+    loader=load_quantized_model if QUANTIZE else load_model,
+    max_batch_size=MAX_BATCH_SIZE,
+    max_batch_wait=MAX_BATCH_WAIT_MS / 1000,
+    on_batch=batch_sizes.observe
+)
+
+# Audio of recently synthesized sentences, so resubmitted text only synthesizes what changed
+sentence_cache = None
+if SENTENCE_CACHE_MB > 0:
+    sentence_cache = SentenceCache(SENTENCE_CACHE_DIR, max_bytes=SENTENCE_CACHE_MB * 1024 * 1024)
+    sentence_cache.register_metrics(metrics.registry)
+
+def synthesize_to_file(model, text, output_file, speaker=None, language=None):
+    """Synthesize text to a WAV file (a path or file object), only synthesizing the sentences that aren't cached"""
+    if sentence_cache is None:
+        model.synthesize_to_file(text, output_file, speaker=speaker, language=language)
+        return
+
+    speaker, language = model.defaults(speaker, language)
+
+    def synthesize_many(sentences):
+        # Samples are cached as float32 so the whole file is normalized together, as before
+        wavs = model.synthesize_many(sentences, speaker=speaker, language=language)
+        return [np.asarray(wav, dtype=np.float32).tobytes() for wav in wavs]
+
+    audio = sentence_cache.synthesize_all(
+        model.split_sentences(text),
+        model.name,
+        synthesize_many,
+        {'speaker': speaker, 'language': language, 'quantized': QUANTIZE}
+    )
+    model.save_wav(np.frombuffer(b''.join(audio), dtype=np.float32), output_file)
 
-# Ensure audio_files directory exists
+# Startup state reported by /ready
+ready = threading.Event()
+startup_error = None
+
+def start_up():
+    """Load and warm up the configured models"""
+    global startup_error
+    try:
+        models.preload()
+        ready.set()
+    except Exception as e:
+        startup_error = f"Failed to load Coqui models: {str(e)}"
+        app.logger.error(startup_error)
+        if EAGER_STARTUP:
+            raise
+
+if EAGER_STARTUP:
+    start_up()
+else:
+    threading.Thread(target=start_up, name="startup", daemon=True).start()
+
+# Generated audio expires and is kept under a size quota (see the AUDIO_* settings)
 AUDIO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'audio_files')
-os.makedirs(AUDIO_DIR, exist_ok=True)
+audio_store = AudioStore.from_env(AUDIO_DIR)
+audio_store.register_metrics(metrics.registry)
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
+@app.route('/ready')
+def readiness():
+    if ready.is_set():
+        return jsonify({'ready': True, 'models': models.loaded()})
+    status = {'ready': False}
+    if startup_error:
+        status['error'] = startup_error
+    return jsonify(status), 503
+
+@app.route('/models')
+def list_models():
+    return jsonify({
+        'default': DEFAULT_MODEL,
+        'available': models.available(),
+        **models.info()
+    })
+
 @app.route('/synthesize', methods=['POST'])
 def synthesize():
     try:
@@ -23,24 +134,43 @@ def synthesize():
         if not text:
             return jsonify({'error': 'No text provided'}), 400
 
-        # Create a unique filename in our audio_files directory
-        output_file = os.path.join(AUDIO_DIR, f"{uuid.uuid4()}.wav")
-        
-        # Generate speech
-        tts.tts_to_file(text=text, file_path=output_file, model_name="tts_models/en/jenny/jenny")
-        
-        # Return the relative path for the frontend to use
-        relative_path = os.path.relpath(output_file, os.path.dirname(os.path.abspath(__file__)))
+        # Only models that are already loaded serve requests
+        try:
+            model = models.get(request.json.get('model', DEFAULT_MODEL))
+        except ModelNotFoundError as e:
+            return jsonify({'error': str(e.args[0])}), 404
+        except ModelNotReadyError as e:
+            return jsonify({'error': str(e)}), 503, {'Retry-After': str(e.retry_after)}
+
+        # Generate speech into a new clip in the audio store
+        started = time.perf_counter()
+        with metrics.time_model('coqui'), audio_store.create('wav') as output_file:
+            synthesize_to_file(
+                model,
+                text,
+                output_file,
+                speaker=request.json.get('speaker'),
+                language=request.json.get('language')
+            )
+        audio = audio_store.get(output_file.name)
+        metrics.observe_audio('/synthesize', time.perf_counter() - started, wav_seconds(audio.head(), audio.size))
+
+        # Return the name for the frontend to fetch from /audio
         return jsonify({
             'success': True,
-            'file_path': relative_path
+            'file_path': output_file.name
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/audio/<path:filename>')
 def serve_audio(filename):
-    return send_file(filename, mimetype='audio/wav')
+    # Older pages send the path including the audio_files directory
+    response = audio_store.send(os.path.basename(filename), mimetype='audio/wav', download_name='speech.wav')
+    if response is None:
+        return jsonify({'error': 'Audio file not found'}), 404
+    return response
 
+# Development server only; see "Production" in the README
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=8888)
+    app.run(host='0.0.0.0', port=8888)
@@ -0,0 +1,290 @@
+"""
+Pool of Coqui TTS models kept resident in memory.
+
+The configured models are loaded and warmed up at startup, and each request
+picks one of them by name. A model is never loaded on the request path: a
+request for a configured model that isn't resident (because it didn't fit in
+the memory budget or was evicted) fails straight away with
+ModelNotReadyError while the model is loaded in the background, so request
+latency never includes a multi-second load.
+
+Once the estimated memory of the resident models exceeds the budget, the
+least recently used models are evicted.
+
+Concurrent requests for a model can be micro-batched (see batching.py).
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+
+import torch
+from TTS.api import TTS
+
+from batching import MicroBatcher, can_batch_vocoder, synthesize_batch
+
+logger = logging.getLogger(__name__)
+
+WARMUP_TEXT = "Hello."
+
+
+def load_model(model_name):
+    """Load a Coqui TTS model by name (downloading it on first use)."""
+    return TTS(model_name=model_name, progress_bar=False)
+
+
+def _module_bytes(module):
+    if module is None:
+        return 0
+    return sum(t.numel() * t.element_size() for t in chain(module.parameters(), module.buffers()))
+
+
+def estimate_model_bytes(tts):
+    """Estimate the memory held by a model from the size of its weights."""
+    synthesizer = tts.synthesizer
+    return _module_bytes(synthesizer.tts_model) + _module_bytes(getattr(synthesizer, 'vocoder_model', None))
+
+
+class ModelNotFoundError(KeyError):
+    """Raised when a requested model is not one of the configured models."""
+
+
+class ModelNotReadyError(Exception):
+    """Raised when a requested model is configured but not resident yet."""
+
+    def __init__(self, message, retry_after=5):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class PooledModel:
+    """
+    A loaded model and the defaults used to synthesize with it.
+
+    Coqui models keep decoder state on the module while synthesizing, so
+    calls on the same model are serialized with a lock. They run in torch
+    inference mode, skipping autograd bookkeeping.
+
+    With a max_batch_size above 1, concurrent calls are queued and
+    synthesized in batches on one worker thread instead.
+    """
+
+    def __init__(self, name, tts, size_bytes, max_batch_size=1, max_batch_wait=0.005, on_batch=None):
+        self.name = name
+        self.tts = tts
+        self.size_bytes = size_bytes
+        self.lock = threading.Lock()
+        self.speakers = list(tts.speakers or []) if tts.is_multi_speaker else []
+        self.languages = list(tts.languages or []) if tts.is_multi_lingual else []
+        self.batcher = None
+        if max_batch_size > 1:
+            self.batcher = MicroBatcher(
+                self._synthesize_batch,
+                max_batch_size=max_batch_size,
+                max_wait=max_batch_wait,
+                name=f'batcher-{name}',
+                on_batch=on_batch
+            )
+
+    def defaults(self, speaker=None, language=None):
+        """Return the speaker and language to use, defaulting to the model's first ones."""
+        if self.speakers:
+            speaker = speaker or self.speakers[0]
+        if self.languages:
+            language = language or self.languages[0]
+        return speaker, language
+
+    def synthesize_to_file(self, text, file_path, speaker=None, language=None):
+        """Synthesize text to a WAV file (a path or file object), using the model's first speaker and language by default."""
+        speaker, language = self.defaults(speaker, language)
+        if self.batcher is None:
+            with self.lock, torch.inference_mode():
+                self.tts.tts_to_file(text=text, file_path=file_path, speaker=speaker, language=language)
+            return
+        wav = self.batcher.submit((text, speaker, language)).result()
+        self.save_wav(wav, file_path)
+
+    def synthesize_many(self, texts, speaker=None, language=None):
+        """Synthesize several texts (batched together if batching is on), returning each one's samples."""
+        speaker, language = self.defaults(speaker, language)
+        if self.batcher is None:
+            with self.lock, torch.inference_mode():
+                return [self.tts.tts(text=text, speaker=speaker, language=language) for text in texts]
+        futures = [self.batcher.submit((text, speaker, language)) for text in texts]
+        return [future.result() for future in futures]
+
+    def split_sentences(self, text):
+        """Split text into sentences the way the model's synthesizer does."""
+        return self.tts.synthesizer.split_into_sentences(text)
+
+    def save_wav(self, wav, file_path):
+        """Write samples to a WAV file (a path or file object) at the model's output sample rate, normalized to full scale."""
+        self.tts.synthesizer.save_wav(wav=wav, path=file_path)
+
+    def _synthesize_batch(self, items):
+        """Synthesize a batch of (text, speaker, language) items, returning a waveform or exception for each."""
+        with self.lock, torch.inference_mode():
+            if can_batch_vocoder(self.tts):
+                return synthesize_batch(self.tts, [text for text, _, _ in items])
+            # End-to-end and multi-speaker models are synthesized one item at a time
+            results = []
+            for text, speaker, language in items:
+                try:
+                    results.append(self.tts.tts(text=text, speaker=speaker, language=language))
+                except Exception as e:
+                    results.append(e)
+            return results
+
+    def warm_up(self):
+        """Run one short synthesis so the first request doesn't pay for first-call setup."""
+        speaker = self.speakers[0] if self.speakers else None
+        language = self.languages[0] if self.languages else None
+        with self.lock, torch.inference_mode():
+            self.tts.tts(text=WARMUP_TEXT, speaker=speaker, language=language)
+
+    def close(self):
+        """Stop batching once the queued requests are served."""
+        if self.batcher is not None:
+            self.batcher.close()
+
+
+class ModelPool:
+    """
+    Resident Coqui models with LRU eviction under a memory budget.
+
+    Args:
+        model_names (list): Models that may be requested, in preload priority order
+        max_memory_bytes (int): Maximum estimated memory of the resident
+            models (None for no limit)
+        loader (callable): Function taking a model name and returning a
+            loaded TTS instance (default: load_model)
+        max_batch_size (int): Most concurrent requests synthesized together
+            by one model (1 disables batching)
+        max_batch_wait (float): Seconds a request waits for others to batch with
+        on_batch (callable): Called with the size of each batch
+    """
+
+    def __init__(self, model_names, max_memory_bytes=None, loader=load_model,
+                 max_batch_size=1, max_batch_wait=0.005, on_batch=None):
+        self.model_names = list(dict.fromkeys(model_names))
+        self.max_memory_bytes = max_memory_bytes
+        self._loader = loader
+        self.max_batch_size = max_batch_size
+        self.max_batch_wait = max_batch_wait
+        self.on_batch = on_batch
+        self._models = OrderedDict()  # name -> PooledModel
+        self._loading = set()
+        self._lock = threading.Lock()
+        # Background loads run one at a time, off the request path
+        self._load_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='model-loader')
+
+    def available(self):
+        """List the names of the models that may be requested."""
+        return list(self.model_names)
+
+    def loaded(self):
+        """List the names of the resident models, least recently used first."""
+        with self._lock:
+            return list(self._models)
+
+    def info(self):
+        """Return the resident models and their estimated sizes."""
+        with self._lock:
+            return {
+                'loaded': {name: model.size_bytes for name, model in self._models.items()},
+                'loading': sorted(self._loading),
+                'max_memory_bytes': self.max_memory_bytes,
+            }
+
+    def preload(self):
+        """
+        Load and warm up the configured models in order, skipping any that
+        would exceed the memory budget.
+
+        Skipped models are loaded in the background when first requested
+        (evicting others).
+        """
+        with self._lock:
+            # Requests arriving meanwhile must not start loads of their own
+            self._loading.update(self.model_names)
+        try:
+            for name in self.model_names:
+                model = self._load(name)
+                with self._lock:
+                    self._loading.discard(name)
+                    total = sum(m.size_bytes for m in self._models.values()) + model.size_bytes
+                    if self._models and self.max_memory_bytes is not None and total > self.max_memory_bytes:
+                        logger.warning("Not preloading %s: it would exceed the model memory budget", name)
+                        model.close()
+                        continue
+                    # Earlier models have priority, so keep them the most recently used
+                    self._models[name] = model
+                    self._models.move_to_end(name, last=False)
+        finally:
+            with self._lock:
+                self._loading.difference_update(self.model_names)
+
+    def get(self, name):
+        """
+        Return a resident model.
+
+        Raises:
+            ModelNotFoundError: If the model is not one of the configured models
+            ModelNotReadyError: If the model is not resident; a background
+                load is started if one isn't already running
+        """
+        if name not in self.model_names:
+            raise ModelNotFoundError(f"Unknown model: {name}")
+
+        with self._lock:
+            model = self._models.get(name)
+            if model is not None:
+                self._models.move_to_end(name)
+                return model
+            if name not in self._loading:
+                self._loading.add(name)
+                self._load_executor.submit(self._load_in_background, name)
+
+        raise ModelNotReadyError(f"Model {name} is being loaded, try again shortly")
+
+    def _load(self, name):
+        logger.info("Loading model %s", name)
+        tts = self._loader(name)
+        model = PooledModel(
+            name,
+            tts,
+            estimate_model_bytes(tts),
+            max_batch_size=self.max_batch_size,
+            max_batch_wait=self.max_batch_wait,
+            on_batch=self.on_batch
+        )
+        model.warm_up()
+        logger.info("Model %s ready (%.0f MB)", name, model.size_bytes / 1024 / 1024)
+        return model
+
+    def _load_in_background(self, name):
+        try:
+            model = self._load(name)
+            with self._lock:
+                self._models[name] = model
+                self._evict()
+        except Exception:
+            logger.exception("Failed to load model %s", name)
+        finally:
+            with self._lock:
+                self._loading.discard(name)
+
+    def _evict(self):
+        """Evict least recently used models until within budget. Caller holds the lock."""
+        if self.max_memory_bytes is None:
+            return
+        # Always keep the most recently loaded model, even if it alone exceeds the budget
+        while len(self._models) > 1 and sum(m.size_bytes for m in self._models.values()) > self.max_memory_bytes:
+            name, model = self._models.popitem(last=False)
+            model.close()
+            logger.info("Evicted model %s", name)
+
+    def shutdown(self):
+        self._load_executor.shutdown(wait=False, cancel_futures=True)
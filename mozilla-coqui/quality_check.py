@@ -0,0 +1,141 @@
+"""
+Compare a quantized Coqui model against the fp32 model.
+
+    uv run python quality_check.py
+    uv run python quality_check.py --model tts_models/en/ljspeech/tacotron2-DDC --text-file script.txt
+
+Each text is synthesized by both models. The script reports their real-time
+factors and the distance between their log-mel spectrograms, aligned with
+dynamic time warping since the autoregressive decoder may stop a few frames
+apart. It exits with status 1 if the distance or speedup misses the limits.
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+import torch
+
+from cpu_inference import configure_threads, quantize
+from model_pool import load_model
+
+DEFAULT_TEXTS = [
+    "The quick brown fox jumps over the lazy dog.",
+    "It was a dark and stormy night; the rain fell in torrents, except at occasional intervals.",
+    "Please call Stella. Ask her to bring these things with her from the store: six spoons of fresh snow peas, "
+    "five thick slabs of blue cheese, and maybe a snack for her brother Bob.",
+]
+
+
+def synthesize(tts, text):
+    """Return a model's waveform for text and the real-time factor it took."""
+    started = time.perf_counter()
+    with torch.inference_mode():
+        wav = np.asarray(tts.tts(text=text), dtype=np.float32)
+    elapsed = time.perf_counter() - started
+    return wav, elapsed / (len(wav) / tts.synthesizer.output_sample_rate)
+
+
+def log_mel(tts, wav):
+    """Log-mel spectrogram of a waveform, shaped (frames, mels)."""
+    audio_processor = tts.synthesizer.tts_model.ap
+    mel = audio_processor.melspectrogram(wav)
+    if audio_processor.signal_norm:
+        # Already scaled into a fixed range of dB
+        return mel.T
+    return np.log(np.maximum(mel, 1e-5)).T
+
+
+def dtw_distance(reference, candidate):
+    """
+    Mean per-frame L1 distance between two spectrograms along the best alignment.
+
+    The cost matrix is filled in one row at a time, so memory stays linear in
+    the length of the utterances; each row's frame distances are computed
+    with numpy. Silent frames often cost exactly the same, so ties between
+    paths are common and decide the step count the distance is divided by.
+    Equal totals prefer the diagonal step, then the step down, then the step
+    along the row.
+    """
+    columns = len(candidate)
+    previous = [0.0] + [np.inf] * columns
+    previous_steps = [0] * (columns + 1)
+
+    for frame in reference:
+        cost = np.abs(frame[None, :] - candidate).mean(axis=1).tolist()
+        current = [np.inf] * (columns + 1)
+        steps = [0] * (columns + 1)
+        for j in range(1, columns + 1):
+            best, best_steps = previous[j - 1], previous_steps[j - 1]
+            if previous[j] < best:
+                best, best_steps = previous[j], previous_steps[j]
+            if current[j - 1] < best:
+                best, best_steps = current[j - 1], steps[j - 1]
+            current[j] = cost[j - 1] + best
+            steps[j] = best_steps + 1
+        previous, previous_steps = current, steps
+
+    return previous[columns] / previous_steps[columns]
+
+
+def compare(model_name, texts):
+    """Synthesize texts with the fp32 and quantized models, returning a result per text."""
+    reference = load_model(model_name)
+    quantized = quantize(load_model(model_name))
+    # Warm up both so first-call setup isn't counted
+    synthesize(reference, "Hello.")
+    synthesize(quantized, "Hello.")
+
+    results = []
+    for text in texts:
+        reference_wav, reference_rtf = synthesize(reference, text)
+        quantized_wav, quantized_rtf = synthesize(quantized, text)
+        results.append({
+            'text': text,
+            'fp32_rtf': reference_rtf,
+            'int8_rtf': quantized_rtf,
+            'speedup': reference_rtf / quantized_rtf,
+            'duration_ratio': len(quantized_wav) / len(reference_wav),
+            'mel_distance': dtw_distance(log_mel(reference, reference_wav), log_mel(quantized, quantized_wav)),
+        })
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare a quantized Coqui model against the fp32 model")
+    parser.add_argument('--model', default="tts_models/en/ljspeech/tacotron2-DDC")
+    parser.add_argument('--text-file', help="File with one text per line (default: built-in sentences)")
+    parser.add_argument('--threads', type=int, default=0, help="Intra-op torch threads (default: one per core)")
+    parser.add_argument('--max-distance', type=float, default=0.5,
+                        help="Largest acceptable mean log-mel distance")
+    parser.add_argument('--min-speedup', type=float, default=0.0,
+                        help="Smallest acceptable mean speedup, e.g. 2 for a 2x real-time factor")
+    args = parser.parse_args()
+
+    configure_threads(args.threads)
+    if args.text_file:
+        with open(args.text_file, encoding='utf-8') as f:
+            texts = [line.strip() for line in f if line.strip()]
+    else:
+        texts = DEFAULT_TEXTS
+
+    results = compare(args.model, texts)
+    print(f"{'fp32 RTF':>9} {'int8 RTF':>9} {'speedup':>8} {'length':>7} {'distance':>9}  text")
+    for result in results:
+        print(
+            f"{result['fp32_rtf']:9.3f} {result['int8_rtf']:9.3f} {result['speedup']:7.2f}x "
+            f"{result['duration_ratio']:7.2f} {result['mel_distance']:9.3f}  {result['text'][:40]}"
+        )
+
+    speedup = sum(r['speedup'] for r in results) / len(results)
+    distance = sum(r['mel_distance'] for r in results) / len(results)
+    print(f"Mean speedup {speedup:.2f}x, mean distance {distance:.3f}")
+    failures = []
+    if distance > args.max_distance:
+        failures.append(f"distance {distance:.3f} exceeds {args.max_distance}")
+    if speedup < args.min_speedup:
+        failures.append(f"speedup {speedup:.2f}x is below {args.min_speedup}x")
+    if failures:
+        print("FAILED: " + "; ".join(failures))
+        sys.exit(1)
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from quality_check import dtw_distance
+
+
+def reference_dtw(reference, candidate):
+    """Full-matrix DTW: diagonal, then down, then along the row on ties."""
+    cost = np.abs(reference[:, None, :] - candidate[None, :, :]).mean(axis=2)
+    rows, columns = cost.shape
+    total = np.full((rows + 1, columns + 1), np.inf)
+    steps = np.zeros((rows + 1, columns + 1), dtype=np.int64)
+    total[0, 0] = 0
+    for i in range(1, rows + 1):
+        for j in range(1, columns + 1):
+            options = (total[i - 1, j - 1], total[i - 1, j], total[i, j - 1])
+            best = int(np.argmin(options))
+            previous = ((i - 1, j - 1), (i - 1, j), (i, j - 1))[best]
+            total[i, j] = cost[i - 1, j - 1] + options[best]
+            steps[i, j] = steps[previous] + 1
+    return total[rows, columns] / steps[rows, columns]
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_matches_reference(seed):
+    rng = np.random.default_rng(seed)
+    reference = rng.normal(size=(rng.integers(1, 30), 8))
+    candidate = rng.normal(size=(rng.integers(1, 30), 8))
+    assert dtw_distance(reference, candidate) == reference_dtw(reference, candidate)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_matches_reference_with_tied_costs(seed):
+    # Few distinct values, like silent frames at the floor of a log-mel
+    rng = np.random.default_rng(seed)
+    reference = rng.integers(0, 3, size=(rng.integers(1, 30), 4)).astype(float)
+    candidate = rng.integers(0, 3, size=(rng.integers(1, 30), 4)).astype(float)
+    assert dtw_distance(reference, candidate) == reference_dtw(reference, candidate)
+
+
+def test_identical_spectrograms_are_zero_apart():
+    mel = np.random.default_rng(0).normal(size=(40, 8))
+    assert dtw_distance(mel, mel) == 0
+
+
+def test_time_stretch_aligns():
+    mel = np.random.default_rng(0).normal(size=(40, 8))
+    stretched = np.repeat(mel, 2, axis=0)
+    assert dtw_distance(mel, stretched) == 0
+    assert dtw_distance(mel, mel[::-1]) > 0
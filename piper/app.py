@@ -1,135 +1,315 @@
-from flask import Flask, render_template, request, send_file, jsonify
+import time
+process_start = time.perf_counter()
+
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context
+import logging
 import os
+import threading
+from functools import partial
+import shutil
 import tempfile
-from piper import PiperVoice
-import wave
-import numpy as np
-import io
-import uuid
-import PyPDF2
-from docx import Document
-import striprtf.striprtf
-from model_downloader import download_models
+from model_downloader import DEFAULT_CACHE_DIR, ModelCache, load_manifest
+from synthesis import split_sentences, split_sentences_from_blocks, synthesize_sentences
+from audio_encoding import FORMATS, MIMETYPES, encode_stream, encode_to_file
+from resampling import MIN_SAMPLE_RATE, MAX_SAMPLE_RATE, resample_chunks
+from text_extraction import ALLOWED_EXTENSIONS, iter_text_from_file
+from voice_registry import VoiceRegistry, VoiceNotFoundError, load_voice
+from parallel_synthesis import ParallelSynthesizer
+from jobs import JobQueue, QueueFullError, DONE
+from tts_common import TTSMetrics, configure_logging, install_flask, pcm_seconds
+from tts_common.audio_store import AudioStore
+from tts_common.sentence_cache import SentenceCache
+
+# Log through a background thread so request handlers never block on output
+configure_logging()
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 
-# Create audio directory if it doesn't exist
-AUDIO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'audio_files')
-os.makedirs(AUDIO_DIR, exist_ok=True)
+# Request latency, time to first byte and real-time factor, served on /metrics
+metrics = TTSMetrics()
+install_flask(app, metrics)
 
-# Allowed file extensions
-ALLOWED_EXTENSIONS = {'txt', 'pdf', 'docx', 'rtf'}
+# Generated audio expires and is kept under a size quota (see the AUDIO_* settings)
+AUDIO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'audio_files')
+audio_store = AudioStore.from_env(AUDIO_DIR)
+audio_store.register_metrics(metrics.registry)
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def extract_text_from_file(file_path, file_extension):
-    """Extract text from various file formats"""
+# Initialize Piper TTS
+MODELS_DIR = DEFAULT_CACHE_DIR
+DEFAULT_VOICE = os.getenv("PIPER_DEFAULT_VOICE", "en_GB-alan-medium")
+PREFETCH_VOICES = [v for v in os.getenv("PIPER_PREFETCH_VOICES", "").split(",") if v]
+MODEL_MANIFEST = os.getenv("PIPER_MODEL_MANIFEST")
+MAX_LOADED_VOICES = int(os.getenv("PIPER_MAX_LOADED_VOICES", "4"))
+MAX_VOICE_MEMORY_MB = os.getenv("PIPER_MAX_VOICE_MEMORY_MB")
+PARALLEL_WORKERS = int(os.getenv("PIPER_PARALLEL_WORKERS", "0"))
+WORKER_THREADS = int(os.getenv("PIPER_WORKER_THREADS", "1"))
+JOB_WORKERS = int(os.getenv("PIPER_JOB_WORKERS", "2"))
+JOB_QUEUE_SIZE = int(os.getenv("PIPER_JOB_QUEUE_SIZE", "16"))
+JOB_STATE_DIR = os.getenv("PIPER_JOB_STATE_DIR")
+MAX_UPLOAD_MB = int(os.getenv("PIPER_MAX_UPLOAD_MB", "10"))
+ORT_INTRA_OP_THREADS = int(os.getenv("PIPER_ORT_INTRA_OP_THREADS", "0"))
+ORT_INTER_OP_THREADS = int(os.getenv("PIPER_ORT_INTER_OP_THREADS", "0"))
+ORT_OPTIMIZATION = os.getenv("PIPER_ORT_OPTIMIZATION", "all")
+EAGER_STARTUP = os.getenv("PIPER_EAGER_STARTUP", "0") == "1"
+SENTENCE_CACHE_DIR = os.getenv(
+    "PIPER_SENTENCE_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sentence_cache')
+)
+SENTENCE_CACHE_MB = int(os.getenv("PIPER_SENTENCE_CACHE_MB", "1024"))
+WARMUP_TEXT = "Hello."
+
+# Larger request bodies are refused with 413 as they are read, even without a Content-Length
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_MB * 1024 * 1024
+
+@app.errorhandler(413)
+def request_too_large(e):
+    return jsonify({'error': f'Upload is larger than the {MAX_UPLOAD_MB} MB limit'}), 413
+
+voices = VoiceRegistry(
+    models_dir=MODELS_DIR,
+    max_loaded=MAX_LOADED_VOICES,
+    max_memory_bytes=int(MAX_VOICE_MEMORY_MB) * 1024 * 1024 if MAX_VOICE_MEMORY_MB else None,
+    loader=partial(
+        load_voice,
+        intra_op_num_threads=ORT_INTRA_OP_THREADS,
+        inter_op_num_threads=ORT_INTER_OP_THREADS,
+        optimization_level=ORT_OPTIMIZATION
+    )
+)
+
+# Audio of recently synthesized sentences, so resubmitted text only synthesizes what changed
+sentence_cache = None
+if SENTENCE_CACHE_MB > 0:
+    sentence_cache = SentenceCache(SENTENCE_CACHE_DIR, max_bytes=SENTENCE_CACHE_MB * 1024 * 1024)
+    sentence_cache.register_metrics(metrics.registry)
+
+# When this module is run as a script, the parallel synthesis workers run it
+# again as __mp_main__. They only need its imports, not its services.
+IN_WORKER_PROCESS = __name__ == '__mp_main__'
+
+parallel_synthesizer = None
+if PARALLEL_WORKERS > 0 and not IN_WORKER_PROCESS:
+    parallel_synthesizer = ParallelSynthesizer(
+        models_dir=MODELS_DIR,
+        workers=PARALLEL_WORKERS,
+        threads_per_worker=WORKER_THREADS
+    )
+    parallel_synthesizer.start()
+
+# Startup state reported by /ready
+ready = threading.Event()
+startup_error = None
+startup_timings = {'imports': round(time.perf_counter() - process_start, 3)}
+
+def start_up():
+    """Download (if needed), load and warm up the default voice"""
+    global startup_error
     try:
-        if file_extension == 'txt':
-            with open(file_path, 'r', encoding='utf-8') as file:
-                return file.read()
-        
-        elif file_extension == 'pdf':
-            text = ""
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                for page in pdf_reader.pages:
-                    text += page.extract_text() + "\n"
-            return text
-        
-        elif file_extension == 'docx':
-            doc = Document(file_path)
-            text = ""
-            for paragraph in doc.paragraphs:
-                text += paragraph.text + "\n"
-            return text
-        
-        elif file_extension == 'rtf':
-            with open(file_path, 'r', encoding='utf-8') as file:
-                rtf_content = file.read()
-                return striprtf.striprtf(rtf_content)
-        
-        else:
-            raise ValueError(f"Unsupported file format: {file_extension}")
-    
+        # Make sure the default (and any prefetched) voices are in the model cache.
+        # Cached models are never downloaded again.
+        phase_start = time.perf_counter()
+        model_cache = ModelCache(
+            cache_dir=MODELS_DIR,
+            manifest=load_manifest(MODEL_MANIFEST) if MODEL_MANIFEST else None
+        )
+        missing_voices = [v for v in [DEFAULT_VOICE] + PREFETCH_VOICES if not model_cache.is_cached(v)]
+        if missing_voices:
+            logger.info("Model files not found. Attempting to download...")
+            try:
+                model_cache.fetch_many(missing_voices)
+            except Exception as e:
+                logger.error("Failed to download models: %s", e)
+                logger.error("Please download the model files manually or check your internet connection.")
+        startup_timings['download'] = round(time.perf_counter() - phase_start, 3)
+
+        phase_start = time.perf_counter()
+        try:
+            voice = voices.get(DEFAULT_VOICE)
+        except Exception as e:
+            raise RuntimeError(f"Failed to load Piper voice model: {str(e)}. Have you downloaded the model files?")
+        startup_timings['load'] = round(time.perf_counter() - phase_start, 3)
+
+        # Run a short synthesis so the first real request doesn't pay for graph initialization
+        phase_start = time.perf_counter()
+        for _ in voice.synthesize_stream_raw(WARMUP_TEXT):
+            pass
+        startup_timings['warmup'] = round(time.perf_counter() - phase_start, 3)
+
+        startup_timings['total'] = round(time.perf_counter() - process_start, 3)
+        logger.info(
+            "Startup complete: %s",
+            ", ".join(f"{phase} {seconds:.3f}s" for phase, seconds in startup_timings.items())
+        )
+        ready.set()
     except Exception as e:
-        raise Exception(f"Error extracting text from file: {str(e)}")
+        startup_error = str(e)
+        logger.error(startup_error)
+        if EAGER_STARTUP:
+            raise
 
-# Initialize Piper TTS
-model_path = "en_GB-alan-medium.onnx"
-config_path = "en_GB-alan-medium.onnx.json"
+# The parallel synthesis workers load their own voices
+if not IN_WORKER_PROCESS:
+    if EAGER_STARTUP:
+        start_up()
+    else:
+        threading.Thread(target=start_up, name="startup", daemon=True).start()
 
-# Check if model files exist, if not, attempt to download them
-if not (os.path.exists(model_path) and os.path.exists(config_path)):
-    print("Model files not found. Attempting to download...")
+def parse_sample_rate(value):
+    """Return a requested output sample rate as an int, or None if none was requested"""
+    if value is None or value == '':
+        return None
     try:
-        model_path, config_path = download_models()
-    except Exception as e:
-        print(f"Failed to download models: {e}")
-        print("Please download the model files manually or check your internet connection.")
+        sample_rate = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Sample rate must be a whole number of Hz, not {value!r}")
+    if not MIN_SAMPLE_RATE <= sample_rate <= MAX_SAMPLE_RATE:
+        raise ValueError(f"Sample rate must be between {MIN_SAMPLE_RATE} and {MAX_SAMPLE_RATE} Hz")
+    return sample_rate
 
-try:
-    voice = PiperVoice.load(model_path, config_path)
-except Exception as e:
-    raise RuntimeError(f"Failed to load Piper voice model: {str(e)}. Have you downloaded the model files?")
+def output_sample_rate(value, voice):
+    """Return the requested output sample rate, defaulting to the voice's own rate"""
+    sample_rate = parse_sample_rate(value)
+    return voice.config.sample_rate if sample_rate is None else sample_rate
+
+def encode_to_store(pcm_chunks, sample_rate, output_format):
+    """Encode PCM into a new clip in the audio store, returning its name"""
+    with audio_store.create(FORMATS[output_format]['extension']) as audio:
+        if FORMATS[output_format]['ffmpeg_args'] is None:
+            encode_to_file(pcm_chunks, sample_rate, output_format, audio)
+        else:
+            # ffmpeg writes the file itself
+            encode_to_file(pcm_chunks, sample_rate, output_format, audio.path())
+    return audio.name
+
+def synthesize_sentence(voice, sentence):
+    return b''.join(voice.synthesize_stream_raw(sentence))
+
+def sentence_audio(voice_name, voice, sentences):
+    """Yield PCM for each sentence, taken from the sentence cache where possible"""
+    if sentence_cache is None:
+        return synthesize_sentences(voice, sentences)
+    return sentence_cache.synthesize(sentences, voice_name, partial(synthesize_sentence, voice))
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
+@app.route('/ready')
+def readiness():
+    if ready.is_set():
+        return jsonify({'ready': True, 'startup_timings': startup_timings})
+    status = {'ready': False, 'startup_timings': startup_timings}
+    if startup_error:
+        status['error'] = startup_error
+    return jsonify(status), 503
+
+@app.route('/voices')
+def list_voices():
+    return jsonify({
+        'default': DEFAULT_VOICE,
+        'available': voices.available(),
+        'loaded': voices.loaded()
+    })
+
 @app.route('/convert', methods=['POST'])
 def convert_text():
+    started = time.perf_counter()
     text = request.json.get('text', '')
     if not text:
         return jsonify({'error': 'No text provided'}), 400
 
+    voice_name = request.json.get('voice', DEFAULT_VOICE)
+    parallel = request.json.get('parallel', False) and parallel_synthesizer is not None
+    output_format = request.json.get('format', 'wav')
+    if output_format not in FORMATS:
+        return jsonify({'error': f"Unsupported format: {output_format}. Supported formats are: {', '.join(FORMATS)}"}), 400
+    try:
+        voice = voices.get(voice_name)
+    except VoiceNotFoundError as e:
+        return jsonify({'error': str(e.args[0])}), 404
+    except Exception as e:
+        return jsonify({'error': f'Failed to load voice: {str(e)}'}), 500
+
     try:
-        # Generate a unique filename
-        filename = f"{uuid.uuid4()}.wav"
-        file_path = os.path.join(AUDIO_DIR, filename)
-
-        # Open the file as a WAV file
-        with wave.open(file_path, 'wb') as wav_file:
-            wav_file.setnchannels(1)  # Mono
-            wav_file.setsampwidth(2)  # 16-bit
-            wav_file.setframerate(22050)  # Sample rate
-            # Generate speech directly to the WAV file
-            voice.synthesize(text, wav_file)
+        sample_rate = output_sample_rate(request.json.get('sample_rate'), voice)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Streaming mode: send audio sentence by sentence as it is synthesized
+    if request.json.get('stream', False):
+        return streaming_audio_response(voice_name, voice, split_sentences(text), output_format, sample_rate, started)
+
+    try:
+        extension = FORMATS[output_format]['extension']
+        if parallel and sentence_cache is not None:
+            # Synthesize the sentences that aren't cached across the worker pool
+            pcm_chunks = sentence_cache.synthesize_all(
+                list(split_sentences(text)), voice_name, partial(parallel_synthesizer.synthesize_each, voice_name)
+            )
+        elif parallel:
+            # Synthesize segments across the worker pool, stitched in order
+            pcm_chunks = parallel_synthesizer.synthesize(voice_name, text)
+        else:
+            pcm_chunks = sentence_audio(voice_name, voice, split_sentences(text))
+        pcm_chunks = metrics.instrument_stream(
+            '/convert', pcm_chunks, started, pcm_seconds(voice.config.sample_rate), first_byte=False
+        )
+        pcm_chunks = resample_chunks(pcm_chunks, voice.config.sample_rate, sample_rate)
+        with metrics.time_model('piper'):
+            filename = encode_to_store(pcm_chunks, sample_rate, output_format)
 
         # Return the filename
         return jsonify({
             'audio_path': filename,
-            'filename': 'speech.wav'
+            'filename': f'speech.{extension}'
         })
     except Exception as e:
-        # Clean up the file if it exists
-        if 'file_path' in locals():
-            try:
-                os.unlink(file_path)
-            except:
-                pass
         return jsonify({'error': str(e)}), 500
 
+def streaming_audio_response(voice_name, voice, sentences, output_format, sample_rate, started):
+    """Stream sentences as audio, encoding each one as soon as it is synthesized"""
+    extension = FORMATS[output_format]['extension']
+    pcm_chunks = metrics.instrument_stream(
+        request.url_rule.rule,
+        sentence_audio(voice_name, voice, sentences),
+        started,
+        pcm_seconds(voice.config.sample_rate)
+    )
+    pcm_chunks = resample_chunks(pcm_chunks, voice.config.sample_rate, sample_rate)
+    try:
+        audio_stream = encode_stream(pcm_chunks, sample_rate, output_format)
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 500
+    return Response(
+        stream_with_context(audio_stream),
+        mimetype=FORMATS[output_format]['mimetype'],
+        headers={'Content-Disposition': f'inline; filename="speech.{extension}"'}
+    )
+
 @app.route('/audio/<path:filename>')
 def serve_audio(filename):
     try:
-        file_path = os.path.join(AUDIO_DIR, filename)
-        
-        if not os.path.exists(file_path):
-            return jsonify({'error': 'Audio file not found'}), 404
-            
-        return send_file(
-            file_path,
-            mimetype='audio/wav',
-            as_attachment=False,
-            download_name='speech.wav'
+        # Range, If-None-Match and If-Modified-Since requests are answered so
+        # players can seek and resume without re-downloading
+        extension = filename.rsplit('.', 1)[-1].lower()
+        response = audio_store.send(
+            filename,
+            mimetype=MIMETYPES.get(extension, 'application/octet-stream'),
+            download_name=f'speech.{extension}',
+            max_age=3600
         )
+        if response is None:
+            return jsonify({'error': 'Audio file not found'}), 404
+        return response
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/upload', methods=['POST'])
 def upload_file():
+    started = time.perf_counter()
     if 'file' not in request.files:
         return jsonify({'error': 'No file provided'}), 400
     
@@ -140,19 +320,31 @@ def upload_file():
     if not allowed_file(file.filename):
         return jsonify({'error': 'File type not supported. Please upload .txt, .pdf, .docx, or .rtf files'}), 400
     
+    file_extension = file.filename.rsplit('.', 1)[1].lower()
+    blocks = iter_text_from_file(file.stream, file_extension)
+
+    # Streaming mode: synthesize each page or paragraph as soon as it is extracted
+    if request.form.get('stream', '').lower() in ('1', 'true'):
+        output_format = request.form.get('format', 'wav')
+        if output_format not in FORMATS:
+            return jsonify({'error': f"Unsupported format: {output_format}. Supported formats are: {', '.join(FORMATS)}"}), 400
+        voice_name = request.form.get('voice', DEFAULT_VOICE)
+        try:
+            voice = voices.get(voice_name)
+        except VoiceNotFoundError as e:
+            return jsonify({'error': str(e.args[0])}), 404
+        try:
+            sample_rate = output_sample_rate(request.form.get('sample_rate'), voice)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return streaming_audio_response(
+            voice_name, voice, split_sentences_from_blocks(blocks), output_format, sample_rate, started
+        )
+
     try:
-        # Save uploaded file temporarily
-        temp_dir = tempfile.mkdtemp()
-        temp_file_path = os.path.join(temp_dir, file.filename)
-        file.save(temp_file_path)
-        
-        # Extract text from file
-        file_extension = file.filename.rsplit('.', 1)[1].lower()
-        extracted_text = extract_text_from_file(temp_file_path, file_extension)
-        
-        # Clean up temporary file
-        os.remove(temp_file_path)
-        os.rmdir(temp_dir)
+        # Extract text straight from the upload stream
+        with metrics.time_extraction(file_extension):
+            extracted_text = "".join(blocks)
         
         if not extracted_text.strip():
             return jsonify({'error': 'No text could be extracted from the file'}), 400
@@ -163,14 +355,137 @@ def upload_file():
         })
     
     except Exception as e:
-        # Clean up on error
-        if 'temp_file_path' in locals() and os.path.exists(temp_file_path):
-            try:
-                os.remove(temp_file_path)
-                os.rmdir(temp_dir)
-            except:
-                pass
         return jsonify({'error': str(e)}), 500
 
+def remove_job_audio(job):
+    if job.status == DONE:
+        audio_store.delete(job.result)
+
+# Background jobs run on their own threads so long documents don't tie up
+# request handlers or starve short /convert calls
+jobs = JobQueue(
+    workers=JOB_WORKERS,
+    max_queued=JOB_QUEUE_SIZE,
+    on_forget=remove_job_audio,
+    state_dir=JOB_STATE_DIR
+)
+
+def make_synthesis_job(voice_name, output_format, sample_rate=None, text=None, document=None, file_extension=None):
+    """Build a job function synthesizing either text or an uploaded document to an audio file"""
+    def run(job):
+        voice = voices.get(voice_name)
+        rate = output_sample_rate(sample_rate, voice)
+        if document is not None:
+            # Pages are extracted while synthesis is under way, so the total
+            # stays unknown until the whole document has been read
+            try:
+                sentences = split_sentences_from_blocks(iter_text_from_file(document, file_extension))
+                filename = synthesize_to_file(job, voice_name, voice, sentences, output_format, rate)
+            finally:
+                document.close()
+            job.set_total(job.segments_done)
+            return filename
+
+        sentences = list(split_sentences(text))
+        job.set_total(len(sentences))
+        return synthesize_to_file(job, voice_name, voice, sentences, output_format, rate)
+    return run
+
+def synthesize_to_file(job, voice_name, voice, sentences, output_format, sample_rate):
+    """Synthesize sentences to a new clip in the audio store, reporting progress on the job"""
+    started = time.perf_counter()
+
+    def pcm_chunks():
+        for sentence in sentences:
+            yield from sentence_audio(voice_name, voice, [sentence])
+            job.advance()
+
+    pcm = metrics.instrument_stream(
+        '/jobs', pcm_chunks(), started, pcm_seconds(voice.config.sample_rate), first_byte=False
+    )
+    pcm = resample_chunks(pcm, voice.config.sample_rate, sample_rate)
+    with metrics.time_model('piper'):
+        filename = encode_to_store(pcm, sample_rate, output_format)
+
+    if job.segments_done == 0:
+        audio_store.delete(filename)
+        raise ValueError('No text could be extracted from the file')
+    return filename
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    # Check for room before reading the body, so a full queue doesn't take uploads onto disk
+    if jobs.full():
+        return jsonify({'error': 'Job queue is full, please retry later'}), 429, {'Retry-After': '5'}
+
+    if 'file' in request.files:
+        file = request.files['file']
+        voice_name = request.form.get('voice', DEFAULT_VOICE)
+        output_format = request.form.get('format', 'wav')
+        sample_rate = request.form.get('sample_rate')
+        if not allowed_file(file.filename):
+            return jsonify({'error': 'File type not supported. Please upload .txt, .pdf, .docx, or .rtf files'}), 400
+
+        # The request stream is gone once we respond, so keep an anonymous copy for the job
+        document = tempfile.TemporaryFile()
+        shutil.copyfileobj(file.stream, document)
+        document.seek(0)
+        job_func = make_synthesis_job(
+            voice_name,
+            output_format,
+            sample_rate,
+            document=document,
+            file_extension=file.filename.rsplit('.', 1)[1].lower()
+        )
+    else:
+        data = request.get_json(silent=True) or {}
+        text = data.get('text', '')
+        voice_name = data.get('voice', DEFAULT_VOICE)
+        output_format = data.get('format', 'wav')
+        sample_rate = data.get('sample_rate')
+        if not text:
+            return jsonify({'error': 'No text or file provided'}), 400
+        document = None
+        job_func = make_synthesis_job(voice_name, output_format, sample_rate, text=text)
+
+    # Reject what the job would fail on before it is queued
+    error = None
+    if output_format not in FORMATS:
+        error = jsonify({'error': f"Unsupported format: {output_format}. Supported formats are: {', '.join(FORMATS)}"}), 400
+    else:
+        try:
+            parse_sample_rate(sample_rate)
+            voices.require(voice_name)
+            job = jobs.submit(job_func)
+        except ValueError as e:
+            error = jsonify({'error': str(e)}), 400
+        except VoiceNotFoundError as e:
+            error = jsonify({'error': str(e.args[0])}), 404
+        except QueueFullError as e:
+            error = jsonify({'error': str(e)}), 429, {'Retry-After': '5'}
+    if error is not None:
+        if document is not None:
+            document.close()
+        return error
+
+    return jsonify(job.to_dict()), 202
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>/audio')
+def job_audio(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if job.status != DONE:
+        return jsonify({'error': f'Job is {job.status}'}), 409
+    return serve_audio(job.result)
+
+# Development server only; see "Production" in the README
 if __name__ == '__main__':
-    app.run(debug=True, port=8888) 
\ No newline at end of file
+    app.run(port=8888)
@@ -0,0 +1,138 @@
+"""
+Output encodings for synthesized audio.
+
+Raw 16-bit mono PCM from Piper is written as WAV directly, or piped through
+ffmpeg to produce compressed formats such as FLAC and Ogg/Opus. Encoding
+runs as a streaming stage, so compressed audio can be sent while synthesis
+is still under way.
+"""
+
+import shutil
+import subprocess
+import threading
+import wave
+
+from synthesis import wav_header
+
+# Supported output formats: file extension, mimetype and ffmpeg encoder arguments
+FORMATS = {
+    'wav': {'extension': 'wav', 'mimetype': 'audio/wav', 'ffmpeg_args': None},
+    'flac': {'extension': 'flac', 'mimetype': 'audio/flac', 'ffmpeg_args': ['-c:a', 'flac', '-f', 'flac']},
+    'opus': {'extension': 'ogg', 'mimetype': 'audio/ogg', 'ffmpeg_args': ['-c:a', 'libopus', '-b:a', '32k', '-f', 'ogg']},
+}
+
+MIMETYPES = {fmt['extension']: fmt['mimetype'] for fmt in FORMATS.values()}
+
+
+def _ffmpeg_command(sample_rate, output_format, output):
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg is None:
+        raise RuntimeError(f"ffmpeg is required to encode {output_format} audio but was not found on PATH")
+
+    return [
+        ffmpeg, '-hide_banner', '-loglevel', 'error', '-y',
+        '-f', 's16le', '-ar', str(sample_rate), '-ac', '1', '-i', 'pipe:0',
+        *FORMATS[output_format]['ffmpeg_args'],
+        output
+    ]
+
+
+def _feed(process, pcm_chunks, errors):
+    try:
+        for chunk in pcm_chunks:
+            process.stdin.write(chunk)
+    except Exception as e:
+        errors.append(e)
+    finally:
+        try:
+            process.stdin.close()
+        except OSError:
+            pass
+
+
+def encode_stream(pcm_chunks, sample_rate, output_format='wav', chunk_size=16384):
+    """
+    Encode a stream of PCM chunks on the fly.
+
+    The encoder is checked before returning, so a missing ffmpeg is reported
+    before any response has been started.
+
+    Args:
+        pcm_chunks (iterable): Raw 16-bit mono PCM chunks
+        sample_rate (int): Sample rate of the PCM in Hz
+        output_format (str): One of FORMATS
+        chunk_size (int): Maximum size of the encoded chunks yielded
+
+    Returns:
+        generator: Yields encoded audio as it becomes available
+    """
+    if FORMATS[output_format]['ffmpeg_args'] is None:
+        return _stream_wav(pcm_chunks, sample_rate)
+    command = _ffmpeg_command(sample_rate, output_format, 'pipe:1')
+    return _stream_ffmpeg(command, pcm_chunks, chunk_size)
+
+
+def _stream_wav(pcm_chunks, sample_rate):
+    yield wav_header(sample_rate)
+    yield from pcm_chunks
+
+
+def _stream_ffmpeg(command, pcm_chunks, chunk_size):
+    process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    # Feed ffmpeg from a separate thread so reading its output never blocks writing
+    errors = []
+    feeder = threading.Thread(target=_feed, args=(process, pcm_chunks, errors), daemon=True)
+    feeder.start()
+
+    try:
+        while True:
+            data = process.stdout.read1(chunk_size)
+            if not data:
+                break
+            yield data
+    finally:
+        if process.poll() is None:
+            process.kill()
+        process.wait()
+        process.stdout.close()
+        feeder.join()
+
+    if errors:
+        raise errors[0]
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg exited with status {process.returncode}")
+
+
+def encode_to_file(pcm_chunks, sample_rate, output_format, file_path):
+    """
+    Encode a stream of PCM chunks to a file.
+
+    Args:
+        pcm_chunks (iterable): Raw 16-bit mono PCM chunks
+        sample_rate (int): Sample rate of the PCM in Hz
+        output_format (str): One of FORMATS
+        file_path (str): Path of the file to write, or a seekable file
+            object (WAV only)
+    """
+    if FORMATS[output_format]['ffmpeg_args'] is None:
+        with wave.open(file_path, 'wb') as wav_file:
+            wav_file.setnchannels(1)  # Mono
+            wav_file.setsampwidth(2)  # 16-bit
+            wav_file.setframerate(sample_rate)
+            for chunk in pcm_chunks:
+                wav_file.writeframes(chunk)
+        return
+
+    process = subprocess.Popen(
+        _ffmpeg_command(sample_rate, output_format, file_path),
+        stdin=subprocess.PIPE
+    )
+    try:
+        for chunk in pcm_chunks:
+            process.stdin.write(chunk)
+    finally:
+        process.stdin.close()
+        process.wait()
+
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg exited with status {process.returncode}")
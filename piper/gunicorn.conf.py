@@ -0,0 +1,74 @@
+"""
+Production server settings:
+
+    uv run gunicorn -c gunicorn.conf.py app:app
+
+The app is loaded once in the master process, which downloads, loads and
+warms up the default voice before forking the workers, so the workers share
+the voice's memory copy-on-write. Each worker runs ONNX Runtime on one
+thread and throughput comes from running one worker per core.
+
+Any setting can be overridden on the command line, e.g. `--max-requests 500`.
+"""
+
+import gc
+import os
+import shutil
+import sys
+import tempfile
+
+from tts_common.serving import default_workers
+
+# Load the default voice before forking instead of in a startup thread
+os.environ["PIPER_EAGER_STARTUP"] = "1"
+# A single-threaded ONNX Runtime session starts no thread pool, which
+# wouldn't survive the fork; the workers are the parallelism instead
+os.environ["PIPER_ORT_INTRA_OP_THREADS"] = "1"
+os.environ["PIPER_ORT_INTER_OP_THREADS"] = "1"
+# The worker processes replace the parallel synthesis pool
+os.environ["PIPER_PARALLEL_WORKERS"] = "0"
+# Jobs are polled through whichever worker accepts the request
+job_state_dir = None
+if not os.getenv("PIPER_JOB_STATE_DIR"):
+    job_state_dir = os.environ["PIPER_JOB_STATE_DIR"] = tempfile.mkdtemp(prefix="piper-jobs-")
+
+bind = "127.0.0.1:8888"
+preload_app = True
+workers = default_workers()
+# Threads per worker serve slow clients and streaming while another synthesizes
+worker_class = "gthread"
+threads = 2
+# Workers are recycled after a number of requests to bound memory growth,
+# jittered so they don't all restart at once, but never while running jobs
+max_requests = 1000
+max_requests_jitter = 100
+timeout = 120
+graceful_timeout = 60
+
+
+def pre_fork(server, worker):
+    # Keep the garbage collector from writing to (and so copying) the
+    # pages of the objects the workers inherit
+    gc.freeze()
+
+
+def pre_request(worker, req):
+    # A worker due to be recycled keeps serving until its jobs are done,
+    # rather than cutting them short; gunicorn counts this request next
+    app = sys.modules.get("app")
+    if app is not None and worker.nr + 1 >= worker.max_requests and app.jobs.pending():
+        worker.max_requests = worker.nr + 2
+
+
+def worker_exit(server, worker):
+    # Only reached with jobs running when the server is stopped or reloaded.
+    # Give them half the graceful timeout to finish; the rest are marked
+    # failed so clients stop polling them
+    app = sys.modules.get("app")
+    if app is not None:
+        app.jobs.shutdown(timeout=server.cfg.graceful_timeout / 2)
+
+
+def on_exit(server):
+    if job_state_dir:
+        shutil.rmtree(job_state_dir, ignore_errors=True)
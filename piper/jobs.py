@@ -0,0 +1,267 @@
+"""
+Background job queue for long-running synthesis.
+
+Jobs are run by a fixed number of worker threads fed from a bounded queue.
+When the queue is full new submissions are rejected instead of piling up,
+so callers can apply backpressure (e.g. respond with HTTP 429).
+
+Jobs live in the process that accepted them. When several processes serve
+the same jobs (the workers of a preforking server), each one writes its
+jobs' progress to a shared state directory, so a job can be polled through
+any of them.
+"""
+
+import json
+import logging
+import os
+import queue
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at capacity."""
+
+
+class Job:
+    """
+    A unit of background work and its progress.
+
+    The job's function is called with the job itself so it can report
+    progress through set_total() and advance().
+    """
+
+    def __init__(self, func, on_change=None):
+        self.id = str(uuid.uuid4())
+        self.status = QUEUED
+        self.segments_done = 0
+        self.segments_total = None
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self._func = func
+        self._on_change = on_change
+
+    def _changed(self):
+        if self._on_change is not None:
+            self._on_change(self)
+
+    def set_total(self, total):
+        self.segments_total = total
+        self._changed()
+
+    def advance(self, count=1):
+        self.segments_done += count
+        self._changed()
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'segments_done': self.segments_done,
+            'segments_total': self.segments_total,
+            'error': self.error
+        }
+
+    def to_state(self):
+        """Return everything about the job except its function, for other processes to read."""
+        return {
+            **self.to_dict(),
+            'result': self.result,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        """Rebuild a job (which can't be run) from to_state()."""
+        job = cls(None)
+        job.id = state['job_id']
+        for name in ('status', 'segments_done', 'segments_total', 'error', 'result', 'created_at', 'finished_at'):
+            setattr(job, name, state[name])
+        return job
+
+    def run(self):
+        self.status = RUNNING
+        self._changed()
+        try:
+            self.result = self._func(self)
+            self.status = DONE
+        except Exception as e:
+            self.error = str(e)
+            self.status = FAILED
+        finally:
+            self.finished_at = time.time()
+            self._changed()
+
+    def fail(self, error):
+        """Mark a job that will never run (or finish) as failed."""
+        self.error = error
+        self.status = FAILED
+        self.finished_at = time.time()
+        self._changed()
+
+
+class JobQueue:
+    """
+    Bounded queue of jobs processed by a fixed pool of worker threads.
+
+    Args:
+        workers (int): Number of worker threads
+        max_queued (int): Maximum number of jobs waiting to run
+        max_finished (int): Number of finished jobs kept for polling before
+            the oldest are forgotten
+        on_forget (callable): Called with a finished job when it is forgotten,
+            e.g. to delete its output
+        state_dir (str): Directory shared with other processes serving the
+            same jobs (None keeps jobs private to this process)
+    """
+
+    def __init__(self, workers=2, max_queued=16, max_finished=256, on_forget=None, state_dir=None):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.max_finished = max_finished
+        self.state_dir = state_dir
+        self._on_forget = on_forget
+        self._jobs = OrderedDict()
+        self._closed = False
+        if state_dir:
+            os.makedirs(state_dir, exist_ok=True)
+
+        self._start()
+        os.register_at_fork(after_in_child=self._start)
+
+    def _start(self):
+        # Also runs in a forked child, where the parent's worker threads don't exist
+        self._queue = queue.Queue(maxsize=self.max_queued)
+        self._lock = threading.Lock()
+        for i in range(self.workers):
+            threading.Thread(target=self._worker, name=f"job-worker-{i}", daemon=True).start()
+
+    def submit(self, func):
+        """
+        Queue a function to run in the background.
+
+        Args:
+            func (callable): Called with the Job; its return value becomes job.result
+
+        Returns:
+            Job: The queued job
+
+        Raises:
+            QueueFullError: If the queue is at capacity
+        """
+        job = Job(func, on_change=self._save if self.state_dir else None)
+        with self._lock:
+            if self._closed:
+                raise QueueFullError("Job queue is shutting down, please retry later")
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                raise QueueFullError("Job queue is full, please retry later")
+            self._jobs[job.id] = job
+        job._changed()
+        return job
+
+    def get(self, job_id):
+        """
+        Return the job with the given id, or None if it is unknown.
+
+        A job accepted by another process is returned as read from the state
+        directory.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None or not self.state_dir:
+            return job
+        path = self._state_path(job_id)
+        if path is None:
+            return None
+        try:
+            with open(path, encoding='utf-8') as f:
+                return Job.from_state(json.load(f))
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def full(self):
+        """Return True if a job submitted now would be rejected."""
+        with self._lock:
+            return self._closed or self._queue.full()
+
+    def pending(self):
+        """Return the number of jobs queued or running in this process."""
+        return self._queue.unfinished_tasks
+
+    def _state_path(self, job_id):
+        try:
+            # Job ids are UUIDs, so they are safe to use as file names
+            return os.path.join(self.state_dir, f"{uuid.UUID(job_id)}.json")
+        except ValueError:
+            return None
+
+    def _save(self, job):
+        # Written to a temporary file first so readers never see a partial state
+        fd, temp_path = tempfile.mkstemp(dir=self.state_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(job.to_state(), f)
+        os.replace(temp_path, self._state_path(job.id))
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            # Skips jobs failed by shutdown() before they started
+            if job.finished_at is None:
+                job.run()
+            self._queue.task_done()
+            self._forget_finished()
+
+    def shutdown(self, timeout=None):
+        """
+        Stop accepting jobs and wait for the queued and running ones to finish.
+
+        Jobs still unfinished after the timeout are marked as failed, so that
+        clients polling them from another process stop waiting.
+
+        Args:
+            timeout (float): Seconds to wait (None waits indefinitely)
+        """
+        with self._lock:
+            self._closed = True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            time.sleep(0.1)
+
+        with self._lock:
+            unfinished = [job for job in self._jobs.values() if job.finished_at is None]
+        for job in unfinished:
+            logger.warning("Job %s didn't finish before shutdown", job.id)
+            job.fail("The server restarted before the job finished, please submit it again")
+
+    def _forget_finished(self):
+        with self._lock:
+            finished = [job for job in self._jobs.values() if job.finished_at is not None]
+            forgotten = finished[:max(0, len(finished) - self.max_finished)]
+            for job in forgotten:
+                del self._jobs[job.id]
+
+        for job in forgotten:
+            if self._on_forget:
+                self._on_forget(job)
+            if self.state_dir:
+                try:
+                    os.unlink(self._state_path(job.id))
+                except FileNotFoundError:
+                    pass
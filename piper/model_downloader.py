@@ -2,106 +2,259 @@
 Model downloader for Piper TTS models from Hugging Face.
 
 This module provides functionality to download Piper TTS model files
-from the Hugging Face repository.
+from the Hugging Face repository into a shared local model cache.
+
+Downloads are written to a `.part` file and resumed with an HTTP Range
+request if interrupted. Once complete, a file is optionally checked against
+a SHA-256 manifest and atomically renamed into place, so the cache never
+contains a truncated model. Models that are already cached are not
+downloaded again.
+
+Each download holds an exclusive lock on a `.lock` file next to it, so
+several processes (or containers) sharing the cache don't write to the
+same `.part` file; the others wait and then use the finished file.
 """
 
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import time
 import urllib.request
 import urllib.error
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+DEFAULT_CACHE_DIR = os.getenv("PIPER_MODELS_DIR", ".")
+DEFAULT_BASE_URL = os.getenv("PIPER_MODEL_BASE_URL", "https://huggingface.co/rhasspy/piper-voices/resolve")
+DEFAULT_VERSION = "v1.0.0"
+
+CHUNK_SIZE = 1024 * 1024
+
+logger = logging.getLogger(__name__)
 
-def download_models(model_name="en_GB-alan-medium", version="v1.0.0", download_dir="."):
+
+def load_manifest(manifest_path):
     """
-    Download Piper TTS model files from Hugging Face.
-    
+    Load a SHA-256 manifest.
+
+    The manifest is a JSON object mapping file names
+    (e.g. "en_GB-alan-medium.onnx") to their hex SHA-256 digests.
+
     Args:
-        model_name (str): Name of the model (e.g., "en_GB-alan-medium")
-        version (str): Version of the model (e.g., "v1.0.0")
-        download_dir (str): Directory to download files to (default: current directory)
-    
+        manifest_path (str): Path to the manifest file
+
     Returns:
-        tuple: (model_file_path, config_file_path) if successful
-        
-    Raises:
-        Exception: If download fails
+        dict: File name to SHA-256 digest
     """
-    # Ensure download directory exists
-    download_path = Path(download_dir)
-    download_path.mkdir(parents=True, exist_ok=True)
-    
-    # Transform model name: replace hyphens with forward slashes
-    # e.g., "en_GB-alan-medium" -> "en_GB/alan/medium"
-    model_path_segment = model_name.replace('-', '/')
-    
-    # Construct URLs
-    base_url = f"https://huggingface.co/rhasspy/piper-voices/resolve/{version}/en"
-    model_url = f"{base_url}/{model_path_segment}/{model_name}.onnx"
-    config_url = f"{base_url}/{model_path_segment}/{model_name}.onnx.json"
-    
-    # Define local file paths
-    model_file = download_path / f"{model_name}.onnx"
-    config_file = download_path / f"{model_name}.onnx.json"
-    
-    print(f"Downloading Piper TTS model files for {model_name}...")
-    
-    try:
-        # Download model file
-        print(f"Downloading {model_name}.onnx...")
-        urllib.request.urlretrieve(model_url, model_file)
-        print(f"✓ Downloaded {model_file}")
-        
-        # Download config file
-        print(f"Downloading {model_name}.onnx.json...")
-        urllib.request.urlretrieve(config_url, config_file)
-        print(f"✓ Downloaded {config_file}")
-        
-        print("Download complete!")
+    with open(manifest_path, "r", encoding="utf-8") as manifest_file:
+        return json.load(manifest_file)
+
+
+def sha256_file(path):
+    """Return the hex SHA-256 digest of a file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ModelCache:
+    """
+    Local cache of Piper TTS model files.
+
+    Args:
+        cache_dir (str): Directory the model files are stored in
+        base_url (str): Base URL of the voices repository
+        version (str): Version of the voices repository (e.g. "v1.0.0")
+        manifest (dict): Optional file name to SHA-256 digest mapping used
+            to verify downloads
+        retries (int): Number of times an interrupted download is resumed
+        timeout (float): Socket timeout in seconds
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, base_url=DEFAULT_BASE_URL, version=DEFAULT_VERSION,
+                 manifest=None, retries=3, timeout=30):
+        self.cache_dir = Path(cache_dir)
+        self.base_url = base_url.rstrip("/")
+        self.version = version
+        self.manifest = manifest or {}
+        self.retries = retries
+        self.timeout = timeout
+
+    def model_urls(self, model_name):
+        """Return the (model_url, config_url) for a model name."""
+        # Transform model name: replace hyphens with forward slashes
+        # e.g., "en_GB-alan-medium" -> "en/en_GB/alan/medium"
+        language = model_name.split("_", 1)[0]
+        model_path_segment = model_name.replace("-", "/")
+        url = f"{self.base_url}/{self.version}/{language}/{model_path_segment}/{model_name}.onnx"
+        return url, f"{url}.json"
+
+    def model_paths(self, model_name):
+        """Return the local (model_path, config_path) for a model name."""
+        model_file = self.cache_dir / f"{model_name}.onnx"
+        return model_file, self.cache_dir / f"{model_name}.onnx.json"
+
+    def is_cached(self, model_name):
+        """Return True if both files for a model are in the cache."""
+        return all(path.exists() for path in self.model_paths(model_name))
+
+    def fetch(self, model_name):
+        """
+        Make sure a model is in the cache, downloading any missing files.
+
+        Args:
+            model_name (str): Name of the model (e.g., "en_GB-alan-medium")
+
+        Returns:
+            tuple: (model_file_path, config_file_path)
+
+        Raises:
+            Exception: If a download fails or does not match the manifest
+        """
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        for url, path in zip(self.model_urls(model_name), self.model_paths(model_name)):
+            if path.exists():
+                logger.info("✓ Using cached %s", path)
+                continue
+            logger.info("Downloading %s...", path.name)
+            self._download(url, path)
+            logger.info("✓ Downloaded %s", path)
+
+        model_file, config_file = self.model_paths(model_name)
         return str(model_file), str(config_file)
-        
-    except urllib.error.URLError as e:
-        error_msg = f"Failed to download model files: {str(e)}"
-        print(f"✗ {error_msg}")
-        
-        # Clean up partial downloads
-        if model_file.exists():
-            model_file.unlink()
-        if config_file.exists():
-            config_file.unlink()
-            
-        raise Exception(error_msg)
-    except Exception as e:
-        error_msg = f"Unexpected error during download: {str(e)}"
-        print(f"✗ {error_msg}")
-        
-        # Clean up partial downloads
-        if model_file.exists():
-            model_file.unlink()
-        if config_file.exists():
-            config_file.unlink()
-            
-        raise Exception(error_msg)
+
+    def fetch_many(self, model_names, workers=4):
+        """
+        Fetch several models in parallel.
+
+        Args:
+            model_names (list): Names of the models to fetch
+            workers (int): Number of models downloaded at the same time
+
+        Returns:
+            dict: Model name to (model_file_path, config_file_path) for the
+                models that were fetched
+
+        Raises:
+            Exception: If any model failed, after all others have finished
+        """
+        model_names = list(dict.fromkeys(model_names))
+        results = {}
+        errors = {}
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {name: executor.submit(self.fetch, name) for name in model_names}
+            for name, future in futures.items():
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    errors[name] = e
+
+        if errors:
+            details = "; ".join(f"{name}: {e}" for name, e in errors.items())
+            raise Exception(f"Failed to download {len(errors)} model(s): {details}")
+        return results
+
+    def _download(self, url, path):
+        """Download url to path unless another process already has, holding the file's lock."""
+        with open(path.with_name(path.name + ".lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                if path.exists():
+                    logger.info("✓ %s was downloaded by another process", path.name)
+                    return
+                self._download_locked(url, path)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _download_locked(self, url, path):
+        """Download url to path, resuming a previous partial download if there is one."""
+        part_path = path.with_name(path.name + ".part")
+
+        for attempt in range(self.retries + 1):
+            try:
+                self._download_part(url, part_path)
+                break
+            except (urllib.error.URLError, ConnectionError, TimeoutError) as e:
+                if isinstance(e, urllib.error.HTTPError) and e.code < 500:
+                    raise Exception(f"Failed to download {url}: {str(e)}")
+                if attempt == self.retries:
+                    raise Exception(f"Failed to download {url} after {attempt + 1} attempts: {str(e)}")
+                logger.warning("Download of %s interrupted (%s), resuming...", path.name, e)
+                time.sleep(2 ** attempt)
+
+        expected = self.manifest.get(path.name)
+        if expected is not None:
+            actual = sha256_file(part_path)
+            if actual != expected.lower():
+                part_path.unlink()
+                raise Exception(f"Checksum mismatch for {path.name}: expected {expected}, got {actual}")
+
+        os.replace(part_path, path)
+
+    def _download_part(self, url, part_path):
+        """Download (the rest of) url into part_path."""
+        offset = part_path.stat().st_size if part_path.exists() else 0
+        request = urllib.request.Request(url)
+        if offset:
+            request.add_header("Range", f"bytes={offset}-")
+
+        try:
+            response = urllib.request.urlopen(request, timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            # The partial file already holds the whole resource
+            if e.code == 416 and offset:
+                return
+            raise
+
+        with response:
+            # A plain 200 means the server ignored the Range header, so start over
+            resumed = response.status == 206
+            length = response.headers.get("Content-Length")
+            expected_size = int(length) + (offset if resumed else 0) if length is not None else None
+
+            with open(part_path, "ab" if resumed else "wb") as part_file:
+                for chunk in iter(lambda: response.read(CHUNK_SIZE), b""):
+                    part_file.write(chunk)
+                part_file.flush()
+                os.fsync(part_file.fileno())
+                size = part_file.tell()
+
+        # A dropped connection can look like a normal end of the body
+        if expected_size is not None and size < expected_size:
+            raise ConnectionError(f"Connection closed after {size} of {expected_size} bytes")
 
 
 if __name__ == "__main__":
-    # Allow the script to be run directly for testing
+    # Prefetch one or more voices into the model cache
+    import argparse
     import sys
-    
-    if len(sys.argv) > 1:
-        model_name = sys.argv[1]
-        version = sys.argv[2] if len(sys.argv) > 2 else "v1.0.0"
-        download_dir = sys.argv[3] if len(sys.argv) > 3 else "."
-        
-        try:
-            model_path, config_path = download_models(model_name, version, download_dir)
-            print(f"Successfully downloaded:\n  Model: {model_path}\n  Config: {config_path}")
-        except Exception as e:
-            print(f"Download failed: {e}")
-            sys.exit(1)
-    else:
-        # Download default model
-        try:
-            model_path, config_path = download_models()
-            print(f"Successfully downloaded:\n  Model: {model_path}\n  Config: {config_path}")
-        except Exception as e:
-            print(f"Download failed: {e}")
-            sys.exit(1) 
\ No newline at end of file
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    parser = argparse.ArgumentParser(description="Download Piper TTS voices into the local model cache")
+    parser.add_argument("voices", nargs="*", default=["en_GB-alan-medium"], help="Voice model names")
+    parser.add_argument("--version", default=DEFAULT_VERSION, help="Voices repository version")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Model cache directory")
+    parser.add_argument("--base-url", default=DEFAULT_BASE_URL, help="Voices repository base URL")
+    parser.add_argument("--manifest", help="JSON file mapping file names to SHA-256 digests")
+    parser.add_argument("--workers", type=int, default=4, help="Voices downloaded in parallel")
+    args = parser.parse_args()
+
+    cache = ModelCache(
+        cache_dir=args.cache_dir,
+        base_url=args.base_url,
+        version=args.version,
+        manifest=load_manifest(args.manifest) if args.manifest else None
+    )
+    try:
+        for name, (model_path, config_path) in cache.fetch_many(args.voices, workers=args.workers).items():
+            print(f"Successfully downloaded {name}:\n  Model: {model_path}\n  Config: {config_path}")
+    except Exception as e:
+        print(f"Download failed: {e}")
+        sys.exit(1)
@@ -0,0 +1,203 @@
+"""
+Multi-process synthesis of long texts with Piper TTS.
+
+The text is cut into segments of whole sentences which are synthesized by a
+pool of worker processes. Each worker holds its own loaded PiperVoice
+instances with a fixed number of ONNX Runtime threads, so several workers
+can run side by side without oversubscribing the CPU. The PCM is returned
+in the original order so it can be stitched into a single WAV.
+
+The workers are started from a fork server, a clean single-threaded process,
+since forking the app itself once its logging and job threads are running
+could leave a worker holding a lock no thread will release.
+"""
+
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+from synthesis import split_sentences
+from voice_registry import VoiceRegistry, load_voice
+
+logger = logging.getLogger(__name__)
+
+# Voices loaded inside a worker process, set up by _init_worker
+_worker_voices = None
+
+
+def _init_worker(models_dir, max_loaded, intra_op_num_threads):
+    global _worker_voices
+    _worker_voices = VoiceRegistry(
+        models_dir=models_dir,
+        max_loaded=max_loaded,
+        loader=partial(load_voice, intra_op_num_threads=intra_op_num_threads, inter_op_num_threads=1)
+    )
+
+
+def _synthesize_segment(voice_name, segment):
+    voice = _worker_voices.get(voice_name)
+    return b''.join(voice.synthesize_stream_raw(segment))
+
+
+def _synthesize_segments(voice_name, segments):
+    return [_synthesize_segment(voice_name, segment) for segment in segments]
+
+
+def _noop():
+    return None
+
+
+def split_segments(text, min_chars=400):
+    """
+    Group sentences into segments of at least min_chars characters.
+
+    Larger segments amortize the per-task overhead of the process pool,
+    while still breaking long documents into many units of work.
+
+    Args:
+        text (str): Text to split
+        min_chars (int): Minimum segment length (the last segment may be shorter)
+
+    Yields:
+        str: Segments of whole sentences
+    """
+    segment = []
+    length = 0
+    for sentence in split_sentences(text):
+        segment.append(sentence)
+        length += len(sentence)
+        if length >= min_chars:
+            yield " ".join(segment)
+            segment = []
+            length = 0
+    if segment:
+        yield " ".join(segment)
+
+
+def _batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class ParallelSynthesizer:
+    """
+    Process pool that synthesizes text segments concurrently.
+
+    Work is submitted a bounded distance ahead of the audio being read, so a
+    slow reader doesn't let a whole document's audio pile up in memory. If a
+    worker dies, the requests using the pool fail and the pool is replaced.
+
+    Args:
+        models_dir (str): Directory containing the voice model files
+        workers (int): Number of worker processes
+        threads_per_worker (int): ONNX Runtime intra-op threads per worker
+        max_loaded (int): Maximum number of voices each worker keeps loaded
+        segment_chars (int): Minimum number of characters per segment
+    """
+
+    def __init__(self, models_dir=".", workers=2, threads_per_worker=1, max_loaded=2, segment_chars=400):
+        self.workers = workers
+        self.segment_chars = segment_chars
+        # Tasks submitted ahead of the one being read
+        self.lookahead = 2 * workers
+        self._initargs = (models_dir, max_loaded, threads_per_worker)
+        self._context = multiprocessing.get_context("forkserver")
+        # The fork server imports only what the workers need, not the app
+        self._context.set_forkserver_preload(["parallel_synthesis"])
+        self._lock = threading.Lock()
+        self._executor = self._create_executor()
+
+    def _create_executor(self):
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=self._context,
+            initializer=_init_worker,
+            initargs=self._initargs
+        )
+
+    def _replace_broken(self, executor):
+        """Swap in a new pool for one whose worker died, unless another thread already has."""
+        with self._lock:
+            if self._executor is executor:
+                logger.error("A parallel synthesis worker died; restarting the pool")
+                self._executor = self._create_executor()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(self, fn, *args):
+        """Submit a task, returning it with the pool it runs on."""
+        executor = self._executor
+        try:
+            return executor, executor.submit(fn, *args)
+        except BrokenProcessPool:
+            self._replace_broken(executor)
+            executor = self._executor
+            return executor, executor.submit(fn, *args)
+
+    def _result(self, task):
+        executor, future = task
+        try:
+            return future.result()
+        except BrokenProcessPool:
+            self._replace_broken(executor)
+            raise
+
+    def _map(self, fn, items):
+        """Like executor.map, but with at most `lookahead` tasks submitted ahead of the result being read."""
+        items = iter(items)
+        pending = []
+        try:
+            for item in items:
+                pending.append(self._submit(fn, item))
+                if len(pending) > self.lookahead:
+                    yield self._result(pending.pop(0))
+            while pending:
+                yield self._result(pending.pop(0))
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+    def start(self):
+        """Start all worker processes up front instead of on the first request."""
+        for future in [self._submit(_noop) for _ in range(self.workers)]:
+            self._result(future)
+
+    def synthesize(self, voice_name, text):
+        """
+        Synthesize text across the worker pool.
+
+        Args:
+            voice_name (str): Name of the voice to use
+            text (str): Text to synthesize
+
+        Yields:
+            bytes: Raw 16-bit mono PCM for each segment, in the original order
+        """
+        segments = split_segments(text, self.segment_chars)
+        yield from self._map(partial(_synthesize_segment, voice_name), segments)
+
+    def synthesize_each(self, voice_name, sentences, chunksize=8):
+        """
+        Synthesize sentences across the worker pool, keeping each one's audio separate.
+
+        Args:
+            voice_name (str): Name of the voice to use
+            sentences (list): Sentences to synthesize
+            chunksize (int): Sentences sent to a worker at a time
+
+        Yields:
+            bytes: Raw 16-bit mono PCM for each sentence, in order
+        """
+        for pcm_chunks in self._map(partial(_synthesize_segments, voice_name), _batches(sentences, chunksize)):
+            yield from pcm_chunks
+
+    def shutdown(self):
+        self._executor.shutdown(cancel_futures=True)
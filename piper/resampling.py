@@ -0,0 +1,157 @@
+"""
+Vectorized resampling of synthesized PCM with NumPy.
+
+Piper produces 16-bit mono PCM at the sample rate given in the voice config.
+This module converts it to other rates (e.g. 8 kHz or 16 kHz for telephony)
+with a polyphase windowed-sinc filter, working directly on the raw PCM
+chunks produced by synthesis.
+"""
+
+from math import gcd
+
+import numpy as np
+
+MIN_SAMPLE_RATE = 8000
+MAX_SAMPLE_RATE = 48000
+
+
+def float_to_int16(samples):
+    """Round, clip and convert float samples to 16-bit PCM bytes."""
+    return np.clip(np.rint(samples), -32768, 32767).astype(np.int16).tobytes()
+
+
+class Resampler:
+    """
+    Polyphase resampler from one sample rate to another.
+
+    The rate change is expressed as the reduced ratio up/down. A Kaiser
+    windowed-sinc low-pass filter (which also prevents aliasing when
+    downsampling) is split into `up` phases, and each output sample is the
+    dot product of one phase with the input samples around it. All output
+    samples of a chunk are computed in a single vectorized step.
+
+    Chunks are treated as parts of one stream: the input samples the next
+    chunk's filter windows reach back to, and the position on the output
+    grid, carry over from one call to the next.
+
+    Args:
+        from_rate (int): Input sample rate in Hz
+        to_rate (int): Output sample rate in Hz
+        taps_per_phase (int): Filter taps per phase when upsampling; more
+            taps give a sharper cutoff at a higher cost. Scaled up by the
+            decimation factor when downsampling.
+    """
+
+    def __init__(self, from_rate, to_rate, taps_per_phase=16):
+        divisor = gcd(from_rate, to_rate)
+        self.up = to_rate // divisor
+        self.down = from_rate // divisor
+        taps_per_phase *= -(-self.down // self.up)
+        self.taps_per_phase = taps_per_phase
+
+        num_taps = taps_per_phase * self.up
+        cutoff = 0.9 / max(self.up, self.down)
+        t = np.arange(num_taps) - (num_taps - 1) / 2
+        taps = cutoff * np.sinc(cutoff * t) * np.kaiser(num_taps, 5.0) * self.up
+
+        # phases[p][k] is tap p + k * up, reversed so it lines up with the input window
+        self._phases = taps.reshape(taps_per_phase, self.up).T[:, ::-1].astype(np.float32)
+        self._delay = (num_taps - 1) // 2
+        self.reset()
+
+    def reset(self):
+        """Forget the input seen so far, to start resampling a new stream."""
+        # Input samples later output samples still need, starting as the
+        # zero padding before the first sample
+        self._buffer = np.zeros(self.taps_per_phase, np.float32)
+        self._buffer_start = -self.taps_per_phase  # input index of _buffer[0]
+        self._received = 0
+        self._produced = 0
+
+    def process(self, pcm_bytes):
+        """
+        Resample the next chunk of a stream of 16-bit mono PCM.
+
+        The filter needs some input past each output sample, so output lags
+        the input slightly; call flush() after the last chunk for the rest.
+        Chunk boundaries don't change the output.
+
+        Args:
+            pcm_bytes (bytes): Raw 16-bit mono PCM at the input rate
+
+        Returns:
+            bytes: Raw 16-bit mono PCM at the output rate
+        """
+        if self.up == self.down:
+            return pcm_bytes
+
+        samples = np.frombuffer(pcm_bytes, dtype=np.int16).astype(np.float32)
+        self._buffer = np.concatenate([self._buffer, samples])
+        self._received += len(samples)
+        return self._emit(self._received)
+
+    def flush(self):
+        """
+        Return the output held back for input that never came, ending the stream.
+
+        The stream is zero-padded past its end, and the output is
+        len(input) * to_rate // from_rate samples long in total.
+        """
+        if self.up == self.down:
+            return b''
+        self._buffer = np.concatenate([self._buffer, np.zeros(self.taps_per_phase, np.float32)])
+        output = self._emit(self._received + self.taps_per_phase)
+        self.reset()
+        return output
+
+    def _emit(self, available):
+        """Compute every output sample whose filter window ends before input index `available`."""
+        k = self.taps_per_phase
+        stop = min(self._received * self.up // self.down,
+                   max(0, (available * self.up - 1 - self._delay) // self.down + 1))
+        if stop <= self._produced:
+            return b''
+
+        # Position of each output sample on the upsampled grid, compensating for the filter delay
+        positions = np.arange(self._produced, stop, dtype=np.int64) * self.down + self._delay
+        base = positions // self.up
+        phase = positions % self.up
+
+        # Window of the k input samples ending at base
+        windows = self._buffer[(base - self._buffer_start - k + 1)[:, None] + np.arange(k)]
+        output = float_to_int16(np.einsum('ij,ij->i', windows, self._phases[phase]))
+        self._produced = stop
+
+        # Drop the input no later output sample reaches back to
+        next_base = (stop * self.down + self._delay) // self.up
+        drop = min(next_base - k + 1 - self._buffer_start, len(self._buffer))
+        if drop > 0:
+            self._buffer = self._buffer[drop:]
+            self._buffer_start += drop
+        return output
+
+
+def resample_chunks(pcm_chunks, from_rate, to_rate):
+    """
+    Resample a stream of PCM chunks.
+
+    Args:
+        pcm_chunks (iterable): Raw 16-bit mono PCM chunks at from_rate
+        from_rate (int): Input sample rate in Hz
+        to_rate (int): Output sample rate in Hz
+
+    Yields:
+        bytes: Raw 16-bit mono PCM chunks at to_rate
+    """
+    if from_rate == to_rate:
+        yield from pcm_chunks
+        return
+
+    resampler = Resampler(from_rate, to_rate)
+    for chunk in pcm_chunks:
+        output = resampler.process(chunk)
+        if output:
+            yield output
+    output = resampler.flush()
+    if output:
+        yield output
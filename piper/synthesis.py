@@ -0,0 +1,132 @@
+"""
+Sentence-level synthesis helpers for Piper TTS.
+
+This module splits text into sentences and feeds them to a PiperVoice one
+at a time, so audio can be produced (and streamed) incrementally instead of
+waiting for the whole document to be synthesized.
+"""
+
+import re
+import struct
+
+# Sentence boundary: terminal punctuation (optionally followed by closing
+# quotes/brackets) and whitespace, or one or more blank lines.
+_SENTENCE_END = re.compile(r'(?<=[.!?;:])["\')\]]*\s+|\n\s*\n')
+
+# Longest run of text without a sentence boundary carried between blocks;
+# longer runs (e.g. a table, or a PDF whose extraction lost its punctuation)
+# are cut at the last whitespace, so memory doesn't grow with the document.
+MAX_SENTENCE_CHARS = 1000
+
+# Placeholder size used in streaming WAV headers when the final length is
+# not known yet. Most players treat this as "read until end of stream".
+STREAMING_WAV_SIZE = 0xFFFFFFFF
+
+
+def split_sentences(text):
+    """
+    Lazily split text into sentences.
+
+    Args:
+        text (str): Text to split
+
+    Yields:
+        str: Non-empty sentences with surrounding whitespace removed
+    """
+    start = 0
+    for match in _SENTENCE_END.finditer(text):
+        sentence = text[start:match.end()].strip()
+        start = match.end()
+        if sentence:
+            yield sentence
+
+    sentence = text[start:].strip()
+    if sentence:
+        yield sentence
+
+
+def split_sentences_from_blocks(blocks, max_chars=MAX_SENTENCE_CHARS):
+    """
+    Lazily split a stream of text blocks (e.g. pages) into sentences.
+
+    A sentence that runs across the end of a block is carried over and
+    joined with the start of the next one instead of being cut in two.
+    Text carried over is cut at the last whitespace once it passes
+    max_chars, so a document without sentence boundaries is still read in
+    bounded pieces.
+
+    Args:
+        blocks (iterable): Blocks of text in order
+        max_chars (int): Longest text carried over between blocks
+
+    Yields:
+        str: Non-empty sentences with surrounding whitespace removed
+    """
+    carry = ""
+    for block in blocks:
+        text = carry + block
+        end = 0
+        for match in _SENTENCE_END.finditer(text):
+            end = match.end()
+        yield from split_sentences(text[:end])
+
+        start = end
+        while len(text) - start > max_chars:
+            window = text[start:start + max_chars]
+            cut = max(window.rfind(' '), window.rfind('\n'), window.rfind('\t'))
+            if cut <= 0:
+                cut = max_chars
+            sentence = window[:cut].strip()
+            if sentence:
+                yield sentence
+            start += cut
+        carry = text[start:]
+
+    yield from split_sentences(carry)
+
+
+def wav_header(sample_rate, num_channels=1, sample_width=2, data_size=STREAMING_WAV_SIZE):
+    """
+    Build a 44-byte PCM WAV header.
+
+    When data_size is left at STREAMING_WAV_SIZE the RIFF and data chunk
+    sizes are set to their maximum value, which lets the header be sent
+    before the amount of audio is known.
+
+    Args:
+        sample_rate (int): Sample rate in Hz
+        num_channels (int): Number of channels
+        sample_width (int): Bytes per sample
+        data_size (int): Size of the PCM data in bytes
+
+    Returns:
+        bytes: The WAV header
+    """
+    byte_rate = sample_rate * num_channels * sample_width
+    block_align = num_channels * sample_width
+    riff_size = STREAMING_WAV_SIZE if data_size == STREAMING_WAV_SIZE else 36 + data_size
+
+    return (
+        b'RIFF' + struct.pack('<I', riff_size) + b'WAVE'
+        + b'fmt ' + struct.pack('<IHHIIHH', 16, 1, num_channels, sample_rate,
+                                byte_rate, block_align, sample_width * 8)
+        + b'data' + struct.pack('<I', data_size)
+    )
+
+
+def synthesize_sentences(voice, sentences, **synthesize_args):
+    """
+    Synthesize sentences one at a time.
+
+    Args:
+        voice (PiperVoice): Loaded Piper voice
+        sentences (iterable): Sentences to synthesize, in order
+        **synthesize_args: Passed through to PiperVoice.synthesize_stream_raw
+
+    Yields:
+        bytes: Raw 16-bit mono PCM for each sentence
+    """
+    for sentence in sentences:
+        for audio_bytes in voice.synthesize_stream_raw(sentence, **synthesize_args):
+            yield audio_bytes
+
@@ -0,0 +1,133 @@
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import model_downloader
+from model_downloader import ModelCache
+
+VOICE = "en_GB-alan-medium"
+MODEL = bytes(range(256)) * 4096
+CONFIG = b'{"audio": {"sample_rate": 22050}}'
+
+
+class VoiceServer(ThreadingHTTPServer):
+    """Serves a voice's files, optionally dropping the first response or ignoring Range."""
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), VoiceHandler)
+        self.files = {".onnx": MODEL, ".onnx.json": CONFIG}
+        self.drop_first = False
+        self.ignore_range = False
+        self.requests = []
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_port}"
+
+
+class VoiceHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        data = next(data for suffix, data in server.files.items() if self.path.endswith(VOICE + suffix))
+        range_header = self.headers.get("Range")
+        server.requests.append((self.path, range_header))
+
+        if range_header and not server.ignore_range:
+            offset = int(range_header.removeprefix("bytes=").rstrip("-"))
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {offset}-{len(data) - 1}/{len(data)}")
+            body = data[offset:]
+        else:
+            self.send_response(200)
+            body = data
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+
+        if server.drop_first and self.path.endswith(".onnx"):
+            # Send half the file, then hang up
+            server.drop_first = False
+            self.wfile.write(body[:len(body) // 2])
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    server = VoiceServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(model_downloader.time, "sleep", lambda seconds: None)
+
+
+def model_requests(server):
+    return [range_header for path, range_header in server.requests if path.endswith(".onnx")]
+
+
+def test_interrupted_download_resumes_with_range(server, tmp_path):
+    server.drop_first = True
+    cache = ModelCache(cache_dir=tmp_path, base_url=server.base_url)
+
+    model_path, config_path = cache.fetch(VOICE)
+
+    assert open(model_path, "rb").read() == MODEL
+    assert open(config_path, "rb").read() == CONFIG
+    assert model_requests(server) == [None, f"bytes={len(MODEL) // 2}-"]
+    assert not list(tmp_path.glob("*.part"))
+
+
+def test_server_ignoring_range_restarts_the_file(server, tmp_path):
+    server.ignore_range = True
+    (tmp_path / f"{VOICE}.onnx.part").write_bytes(b"stale partial download")
+    cache = ModelCache(cache_dir=tmp_path, base_url=server.base_url)
+
+    model_path, _ = cache.fetch(VOICE)
+
+    assert open(model_path, "rb").read() == MODEL
+    assert model_requests(server) == ["bytes=22-"]
+
+
+def test_checksum_mismatch_is_rejected(server, tmp_path):
+    manifest = {
+        f"{VOICE}.onnx": hashlib.sha256(b"some other model").hexdigest(),
+        f"{VOICE}.onnx.json": hashlib.sha256(CONFIG).hexdigest(),
+    }
+    cache = ModelCache(cache_dir=tmp_path, base_url=server.base_url, manifest=manifest)
+
+    with pytest.raises(Exception, match="Checksum mismatch"):
+        cache.fetch(VOICE)
+
+    assert not cache.is_cached(VOICE)
+    assert not list(tmp_path.glob("*.part"))
+
+
+def test_matching_checksum_is_accepted(server, tmp_path):
+    manifest = {
+        f"{VOICE}.onnx": hashlib.sha256(MODEL).hexdigest(),
+        f"{VOICE}.onnx.json": hashlib.sha256(CONFIG).hexdigest(),
+    }
+    cache = ModelCache(cache_dir=tmp_path, base_url=server.base_url, manifest=manifest)
+
+    cache.fetch(VOICE)
+    assert cache.is_cached(VOICE)
+
+
+def test_cached_model_is_not_downloaded(server, tmp_path):
+    (tmp_path / f"{VOICE}.onnx").write_bytes(MODEL)
+    (tmp_path / f"{VOICE}.onnx.json").write_bytes(CONFIG)
+    cache = ModelCache(cache_dir=tmp_path, base_url=server.base_url)
+
+    assert cache.is_cached(VOICE)
+    cache.fetch(VOICE)
+    assert server.requests == []
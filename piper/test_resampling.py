@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from resampling import Resampler, resample_chunks
+
+FROM_RATE = 22050
+
+
+def sine(num_samples, rate=FROM_RATE, frequency=440, amplitude=10000):
+    t = np.arange(num_samples) / rate
+    return (amplitude * np.sin(2 * np.pi * frequency * t)).astype(np.int16)
+
+
+def chunked(samples, sizes):
+    chunks, start = [], 0
+    for size in sizes:
+        chunks.append(samples[start:start + size].tobytes())
+        start += size
+    chunks.append(samples[start:].tobytes())
+    return chunks
+
+
+@pytest.mark.parametrize("to_rate", [8000, 16000, 44100, 48000])
+def test_chunked_output_matches_whole_signal(to_rate):
+    samples = sine(FROM_RATE)
+    resampler = Resampler(FROM_RATE, to_rate)
+    whole = resampler.process(samples.tobytes()) + resampler.flush()
+
+    sizes = np.random.default_rng(0).integers(1, 3000, size=30)
+    streamed = b''.join(resample_chunks(chunked(samples, sizes), FROM_RATE, to_rate))
+
+    whole = np.frombuffer(whole, dtype=np.int16).astype(np.int32)
+    streamed = np.frombuffer(streamed, dtype=np.int16).astype(np.int32)
+    assert len(whole) == len(streamed) == len(samples) * to_rate // FROM_RATE
+    assert np.abs(whole - streamed).max() <= 1
+
+
+@pytest.mark.parametrize("to_rate", [8000, 48000])
+def test_chunked_output_follows_signal(to_rate):
+    samples = sine(FROM_RATE)
+    chunks = chunked(samples, [FROM_RATE // 10] * 9)
+    streamed = np.frombuffer(b''.join(resample_chunks(chunks, FROM_RATE, to_rate)), dtype=np.int16)
+
+    expected = sine(len(streamed), rate=to_rate)
+    # Away from the zero padding at either end
+    edge = to_rate // 100
+    assert np.abs(streamed[edge:-edge].astype(np.int32) - expected[edge:-edge]).max() < 50
+
+
+def test_same_rate_passes_through():
+    chunks = chunked(sine(1000), [100, 300])
+    assert list(resample_chunks(chunks, FROM_RATE, FROM_RATE)) == chunks
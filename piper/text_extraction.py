@@ -0,0 +1,92 @@
+"""
+Incremental text extraction for uploaded documents.
+
+Text is read straight from a binary file object (e.g. an upload stream) and
+yielded page by page or paragraph by paragraph, so synthesis can start on
+the first page while the rest of the document is still being parsed.
+
+The document parsers are imported on first use to keep process start fast.
+"""
+
+import io
+
+# Allowed file extensions
+ALLOWED_EXTENSIONS = {'txt', 'pdf', 'docx', 'rtf'}
+
+
+def _iter_paragraphs(lines):
+    """Group lines into paragraphs separated by blank lines."""
+    paragraph = []
+    for line in lines:
+        if line.strip():
+            paragraph.append(line)
+        elif paragraph:
+            yield "".join(paragraph) + "\n"
+            paragraph = []
+    if paragraph:
+        yield "".join(paragraph) + "\n"
+
+
+def _iter_txt(stream):
+    text_stream = io.TextIOWrapper(stream, encoding='utf-8')
+    try:
+        yield from _iter_paragraphs(text_stream)
+    finally:
+        # Leave the underlying stream open for the caller
+        text_stream.detach()
+
+
+def _iter_pdf(stream):
+    import PyPDF2
+
+    pdf_reader = PyPDF2.PdfReader(stream)
+    for page in pdf_reader.pages:
+        yield page.extract_text() + "\n"
+
+
+def _iter_docx(stream):
+    from docx import Document
+
+    doc = Document(stream)
+    for paragraph in doc.paragraphs:
+        yield paragraph.text + "\n\n"
+
+
+def _iter_rtf(stream):
+    from striprtf.striprtf import rtf_to_text
+
+    # RTF groups can span the whole document, so it has to be parsed in one go
+    text = rtf_to_text(stream.read().decode('utf-8'))
+    yield from _iter_paragraphs(text.splitlines(keepends=True))
+
+
+_EXTRACTORS = {
+    'txt': _iter_txt,
+    'pdf': _iter_pdf,
+    'docx': _iter_docx,
+    'rtf': _iter_rtf,
+}
+
+
+def iter_text_from_file(stream, file_extension):
+    """
+    Lazily extract text from a document.
+
+    Args:
+        stream: Seekable binary file object containing the document
+        file_extension (str): One of ALLOWED_EXTENSIONS
+
+    Yields:
+        str: Blocks of text (pages or paragraphs) in document order
+
+    Raises:
+        ValueError: If the file format is not supported
+    """
+    extractor = _EXTRACTORS.get(file_extension)
+    if extractor is None:
+        raise ValueError(f"Unsupported file format: {file_extension}")
+
+    try:
+        yield from extractor(stream)
+    except Exception as e:
+        raise Exception(f"Error extracting text from file: {str(e)}")
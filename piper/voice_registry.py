@@ -0,0 +1,173 @@
+"""
+Registry of Piper TTS voices keyed by model name.
+
+Voices are loaded on first use and kept in an LRU cache. Once the number of
+loaded voices or their estimated memory footprint exceeds the configured
+budget, the least recently used voices are evicted.
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import onnxruntime
+from piper import PiperVoice
+from piper.config import PiperConfig
+
+# Model names map directly onto file names, so keep them to a safe charset
+_VOICE_NAME = re.compile(r'^[A-Za-z0-9_-]+$')
+
+logger = logging.getLogger(__name__)
+
+
+# ONNX Runtime graph optimization levels by name
+OPTIMIZATION_LEVELS = {
+    'disable': onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    'basic': onnxruntime.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    'extended': onnxruntime.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    'all': onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+
+
+def load_voice(model_path, config_path, intra_op_num_threads=0, inter_op_num_threads=0, optimization_level='all'):
+    """
+    Load a PiperVoice with explicit ONNX Runtime session settings.
+
+    Args:
+        model_path (str): Path to the .onnx model
+        config_path (str): Path to the .onnx.json config
+        intra_op_num_threads (int): Threads used within an operator (0 lets ONNX Runtime decide)
+        inter_op_num_threads (int): Threads used across operators (0 lets ONNX Runtime decide)
+        optimization_level (str): Graph optimization level, one of OPTIMIZATION_LEVELS
+
+    Returns:
+        PiperVoice: The loaded voice
+    """
+    with open(config_path, "r", encoding="utf-8") as config_file:
+        config = PiperConfig.from_dict(json.load(config_file))
+
+    options = onnxruntime.SessionOptions()
+    options.intra_op_num_threads = intra_op_num_threads
+    options.inter_op_num_threads = inter_op_num_threads
+    options.graph_optimization_level = OPTIMIZATION_LEVELS[optimization_level]
+
+    session = onnxruntime.InferenceSession(
+        str(model_path),
+        sess_options=options,
+        providers=["CPUExecutionProvider"]
+    )
+    return PiperVoice(session=session, config=config)
+
+
+class VoiceNotFoundError(KeyError):
+    """Raised when the model files for a requested voice are not available."""
+
+
+class VoiceRegistry:
+    """
+    Lazily loaded, LRU-evicted collection of PiperVoice instances.
+
+    Args:
+        models_dir (str): Directory containing <name>.onnx and <name>.onnx.json files
+        max_loaded (int): Maximum number of voices kept loaded (None for no limit)
+        max_memory_bytes (int): Maximum estimated memory used by loaded voices
+            (None for no limit). A voice's footprint is estimated from the
+            size of its .onnx file.
+        loader (callable): Function taking (model_path, config_path) and
+            returning a loaded voice (default: PiperVoice.load)
+    """
+
+    def __init__(self, models_dir=".", max_loaded=None, max_memory_bytes=None, loader=PiperVoice.load):
+        self.models_dir = models_dir
+        self.max_loaded = max_loaded
+        self.max_memory_bytes = max_memory_bytes
+        self._loader = loader
+        self._voices = OrderedDict()  # name -> (voice, estimated size in bytes)
+        self._loading = {}  # name -> lock held while that voice is being loaded
+        self._lock = threading.Lock()
+
+    def model_paths(self, name):
+        """Return the (model_path, config_path) for a voice name."""
+        if not _VOICE_NAME.match(name):
+            raise VoiceNotFoundError(f"Invalid voice name: {name}")
+        model_path = os.path.join(self.models_dir, f"{name}.onnx")
+        return model_path, f"{model_path}.json"
+
+    def require(self, name):
+        """
+        Return the (model_path, config_path) for a voice whose model files exist.
+
+        Raises:
+            VoiceNotFoundError: If the name is invalid or the model files do not exist
+        """
+        model_path, config_path = self.model_paths(name)
+        if not (os.path.exists(model_path) and os.path.exists(config_path)):
+            raise VoiceNotFoundError(f"Model files for voice '{name}' not found in {self.models_dir}")
+        return model_path, config_path
+
+    def available(self):
+        """List the names of all voices with model files in the models directory."""
+        try:
+            files = os.listdir(self.models_dir)
+        except FileNotFoundError:
+            return []
+        return sorted(
+            f[:-len('.onnx')] for f in files
+            if f.endswith('.onnx') and os.path.exists(os.path.join(self.models_dir, f + '.json'))
+        )
+
+    def loaded(self):
+        """List the names of the currently loaded voices, least recently used first."""
+        with self._lock:
+            return list(self._voices)
+
+    def get(self, name):
+        """
+        Return the loaded voice for a model name, loading it if necessary.
+
+        Concurrent calls for a voice that is not loaded yet wait for a single
+        load rather than each loading their own copy.
+
+        Raises:
+            VoiceNotFoundError: If the model files for the voice do not exist
+        """
+        with self._lock:
+            if name in self._voices:
+                self._voices.move_to_end(name)
+                return self._voices[name][0]
+            load_lock = self._loading.setdefault(name, threading.Lock())
+
+        with load_lock:
+            # Another thread may have finished loading while we waited
+            with self._lock:
+                if name in self._voices:
+                    self._voices.move_to_end(name)
+                    return self._voices[name][0]
+
+            try:
+                model_path, config_path = self.require(name)
+                voice = self._loader(model_path, config_path)
+                size = os.path.getsize(model_path)
+
+                with self._lock:
+                    self._voices[name] = (voice, size)
+                    self._evict()
+                return voice
+            finally:
+                with self._lock:
+                    self._loading.pop(name, None)
+
+    def _evict(self):
+        """Evict least recently used voices until within budget. Caller holds the lock."""
+        # Always keep the most recently used voice, even if it alone exceeds the budget
+        while len(self._voices) > 1:
+            over_count = self.max_loaded is not None and len(self._voices) > self.max_loaded
+            total_size = sum(size for _, size in self._voices.values())
+            over_memory = self.max_memory_bytes is not None and total_size > self.max_memory_bytes
+            if not (over_count or over_memory):
+                break
+            name, _ = self._voices.popitem(last=False)
+            logger.info("Evicted voice %s", name)
@@ -0,0 +1,14 @@
+"""Instrumentation shared by the TTS services."""
+
+from .logs import configure_logging
+from .metrics import CONTENT_TYPE, MetricsRegistry, TTSMetrics, install_flask, pcm_seconds, wav_file_seconds
+
+__all__ = [
+    "CONTENT_TYPE",
+    "MetricsRegistry",
+    "TTSMetrics",
+    "configure_logging",
+    "install_flask",
+    "pcm_seconds",
+    "wav_file_seconds",
+]
@@ -0,0 +1,72 @@
+"""
+Duration of encoded audio, worked out from the first bytes of a stream and
+its total size, so audio can be measured without buffering or decoding it.
+"""
+
+import struct
+
+# Bitrates in kbit/s by bitrate index for Layer III
+MPEG1_LAYER3_BITRATES = (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320)
+MPEG2_LAYER3_BITRATES = (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160)
+
+
+def _id3_size(data):
+    """Return the size of a leading ID3v2 tag, or 0 if there is none."""
+    if len(data) < 10 or not data.startswith(b"ID3"):
+        return 0
+    size = 0
+    for byte in data[6:10]:
+        size = (size << 7) | (byte & 0x7F)
+    return 10 + size
+
+
+def estimate_mp3_seconds(first_chunk, total_bytes):
+    """
+    Estimate the duration of an MP3 stream from its first frame header and total size.
+
+    Assumes a constant bitrate, which is what the OpenAI speech endpoint returns.
+
+    Returns:
+        float: Duration in seconds, or None if no Layer III frame header is
+            found in the first chunk
+    """
+    offset = _id3_size(first_chunk)
+    while offset + 4 <= len(first_chunk):
+        if first_chunk[offset] == 0xFF and first_chunk[offset + 1] & 0xE0 == 0xE0:
+            version = (first_chunk[offset + 1] >> 3) & 0x03
+            layer = (first_chunk[offset + 1] >> 1) & 0x03
+            bitrate_index = first_chunk[offset + 2] >> 4
+            # layer 0b01 is Layer III; version 0b01 is reserved
+            if layer == 0x01 and version != 0x01 and 0 < bitrate_index < 15:
+                table = MPEG1_LAYER3_BITRATES if version == 0x03 else MPEG2_LAYER3_BITRATES
+                return (total_bytes - offset) * 8 / (table[bitrate_index] * 1000)
+        offset += 1
+    return None
+
+
+def wav_seconds(first_chunk, total_bytes):
+    """
+    Return the duration of a PCM WAV stream from its header and total size.
+
+    Works for streamed WAVs whose header holds placeholder sizes, since only
+    the byte rate and the start of the data chunk are read from it.
+
+    Returns:
+        float: Duration in seconds, or None if the header can't be parsed
+    """
+    if len(first_chunk) < 12 or first_chunk[:4] != b"RIFF" or first_chunk[8:12] != b"WAVE":
+        return None
+
+    byte_rate = None
+    offset = 12
+    while offset + 8 <= len(first_chunk):
+        chunk_id = first_chunk[offset:offset + 4]
+        chunk_size = struct.unpack("<I", first_chunk[offset + 4:offset + 8])[0]
+        if chunk_id == b"fmt " and offset + 16 <= len(first_chunk):
+            byte_rate = struct.unpack("<I", first_chunk[offset + 16:offset + 20])[0]
+        elif chunk_id == b"data":
+            if not byte_rate:
+                return None
+            return (total_bytes - offset - 8) / byte_rate
+        offset += 8 + chunk_size + (chunk_size & 1)
+    return None
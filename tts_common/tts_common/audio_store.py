@@ -0,0 +1,388 @@
+"""
+Bounded storage for generated audio files.
+
+Every file expires after a time to live, and once the files on disk pass a
+total size quota the oldest ones are deleted early. A background janitor
+thread sweeps the directory regularly, so disk usage stays bounded however
+long the service runs. The janitor works from the directory itself rather
+than an in-memory index, so several processes can share one directory,
+and a forked child (such as a preforking server's worker) starts its own.
+
+Short clips can be kept in an in-memory ring instead, so they are never
+written to disk at all. The oldest clips are dropped when it is full. Clips
+in memory are only visible to the process that made them.
+
+Files on disk are served with the WSGI server's file wrapper, which uses
+sendfile(2) where available, or handed to a fronting proxy with an offload
+header such as nginx's X-Accel-Redirect. Both answer conditional and Range
+requests.
+"""
+
+import io
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Names handed out by the store; anything else is rejected before touching the disk
+_NAME = re.compile(r"^[0-9a-f]{32}\.[a-z0-9]{1,8}$")
+# Names the services gave their audio files before the store existed. Such
+# files are never served, but are swept like clips so they expire in turn.
+_LEGACY_NAME = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\.[a-z0-9]{1,8}$")
+
+
+class StoredAudio:
+    """A stored clip: either bytes held in memory or a file on disk."""
+
+    def __init__(self, name, size, modified, data=None, path=None):
+        self.name = name
+        self.size = size
+        self.modified = modified
+        self.data = data
+        self.path = path
+
+    def head(self, size=4096):
+        """Return the first bytes of the clip, e.g. to read its header."""
+        if self.data is not None:
+            return self.data[:size]
+        with open(self.path, "rb") as f:
+            return f.read(size)
+
+
+class AudioWriter:
+    """
+    File-like object that writes a new clip into the store.
+
+    Writes are buffered in memory while the clip is small enough for the
+    memory tier, and spill to a temporary file in the store's directory
+    once it grows past that. The clip is added to the store when the `with`
+    block exits normally, and discarded if it raises.
+    """
+
+    def __init__(self, store, name, spool_bytes):
+        self.store = store
+        self.name = name
+        self._spool_bytes = spool_bytes
+        self._buffer = io.BytesIO()
+        self._file = None
+        self._temp_path = None
+        self._external = False
+
+    def _spill(self):
+        fd, self._temp_path = tempfile.mkstemp(dir=self.store.directory, prefix=".", suffix=".tmp")
+        # mkstemp makes the file private; a fronting proxy must be able to read it
+        os.fchmod(fd, 0o644)
+        self._file = os.fdopen(fd, "w+b")
+        self._file.write(self._buffer.getvalue())
+        self._file.seek(self._buffer.tell())
+        self._buffer = None
+
+    def write(self, data):
+        if self._file is None and self._buffer.tell() + len(data) > self._spool_bytes:
+            self._spill()
+        return (self._file or self._buffer).write(data)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return (self._file or self._buffer).seek(offset, whence)
+
+    def tell(self):
+        return (self._file or self._buffer).tell()
+
+    def flush(self):
+        if self._file is not None:
+            self._file.flush()
+
+    def path(self):
+        """
+        Return a path for another program (such as an encoder) to write the clip to instead.
+
+        Anything written through this object so far is discarded, and the clip
+        always goes to disk.
+        """
+        if self._file is None:
+            self._spill()
+        self._file.close()
+        self._external = True
+        return self._temp_path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.discard()
+
+    def commit(self):
+        if self._temp_path is None:
+            self.store._add_to_memory(self.name, self._buffer.getvalue())
+            return
+        if not self._external:
+            self._file.close()
+        self.store._add_to_disk(self.name, self._temp_path)
+
+    def discard(self):
+        if self._temp_path is None:
+            return
+        if not self._external:
+            self._file.close()
+        try:
+            os.unlink(self._temp_path)
+        except FileNotFoundError:
+            pass
+
+
+class AudioStore:
+    """
+    Directory of generated audio with expiry, a size quota and an optional memory tier.
+
+    Args:
+        directory (str): Where clips are written
+        ttl_seconds (float): How long clips are kept
+        max_bytes (int): Largest total size of the clips on disk
+        memory_max_bytes (int): Size of the in-memory ring (0 disables it)
+        memory_max_clip_bytes (int): Largest clip kept in memory
+        janitor_interval (float): Seconds between sweeps of the directory
+            (0 disables the janitor thread)
+        offload_prefix (str): If set, files are not sent by the app; instead
+            the response carries `offload_header` set to this prefix plus the
+            file name, for a fronting proxy to serve
+        offload_header (str): Header used with offload_prefix
+    """
+
+    def __init__(self, directory, ttl_seconds=24 * 3600, max_bytes=1024 * 1024 * 1024,
+                 memory_max_bytes=0, memory_max_clip_bytes=1024 * 1024, janitor_interval=60,
+                 offload_prefix=None, offload_header="X-Accel-Redirect"):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.memory_max_bytes = memory_max_bytes
+        self.memory_max_clip_bytes = min(memory_max_clip_bytes, memory_max_bytes)
+        self.offload_prefix = offload_prefix
+        self.offload_header = offload_header
+
+        self._memory = OrderedDict()  # name -> StoredAudio, oldest first
+        self._memory_bytes = 0
+        self._disk_bytes = 0  # estimate, corrected on every sweep
+        self._lock = threading.Lock()
+        self._sweep_lock = threading.Lock()
+        self.stats = {"expired": 0, "evicted": 0}
+
+        os.makedirs(directory, exist_ok=True)
+        self.sweep()
+
+        self.janitor_interval = janitor_interval
+        self._stopped = threading.Event()
+        self._janitor = None
+        self._start_janitor()
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    @classmethod
+    def from_env(cls, directory):
+        """Create a store configured by the AUDIO_* environment variables."""
+        return cls(
+            directory,
+            ttl_seconds=float(os.getenv("AUDIO_TTL_SECONDS", str(24 * 3600))),
+            max_bytes=int(float(os.getenv("AUDIO_MAX_MB", "1024")) * 1024 * 1024),
+            memory_max_bytes=int(float(os.getenv("AUDIO_MEMORY_MB", "0")) * 1024 * 1024),
+            memory_max_clip_bytes=int(float(os.getenv("AUDIO_MEMORY_MAX_CLIP_KB", "1024")) * 1024),
+            janitor_interval=float(os.getenv("AUDIO_JANITOR_INTERVAL", "60")),
+            offload_prefix=os.getenv("AUDIO_OFFLOAD_PREFIX") or None,
+            offload_header=os.getenv("AUDIO_OFFLOAD_HEADER", "X-Accel-Redirect"),
+        )
+
+    def create(self, extension):
+        """Return an AudioWriter for a new clip; its `name` identifies the clip once written."""
+        return AudioWriter(self, f"{uuid.uuid4().hex}.{extension}", self.memory_max_clip_bytes)
+
+    def _add_to_memory(self, name, data):
+        with self._lock:
+            self._memory[name] = StoredAudio(name, len(data), time.time(), data=data)
+            self._memory_bytes += len(data)
+            while self._memory_bytes > self.memory_max_bytes:
+                _, dropped = self._memory.popitem(last=False)
+                self._memory_bytes -= dropped.size
+                self.stats["evicted"] += 1
+
+    def _add_to_disk(self, name, temp_path):
+        size = os.path.getsize(temp_path)
+        os.replace(temp_path, os.path.join(self.directory, name))
+        with self._lock:
+            self._disk_bytes += size
+            over_quota = self._disk_bytes > self.max_bytes
+        if over_quota:
+            self.sweep()
+
+    def get(self, name):
+        """Return a stored clip, or None if it doesn't exist or has expired."""
+        if not _NAME.match(name):
+            return None
+        now = time.time()
+        with self._lock:
+            audio = self._memory.get(name)
+        if audio is not None:
+            return audio if now - audio.modified < self.ttl_seconds else None
+
+        path = os.path.join(self.directory, name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        if now - stat.st_mtime >= self.ttl_seconds:
+            return None
+        return StoredAudio(name, stat.st_size, stat.st_mtime, path=path)
+
+    def delete(self, name):
+        """Delete a clip before it expires."""
+        if not _NAME.match(name):
+            return
+        with self._lock:
+            audio = self._memory.pop(name, None)
+            if audio is not None:
+                self._memory_bytes -= audio.size
+                return
+        try:
+            os.unlink(os.path.join(self.directory, name))
+        except FileNotFoundError:
+            pass
+
+    def sweep(self):
+        """
+        Delete expired clips, then the oldest clips on disk until within the quota.
+
+        Temporary files are only deleted once they have expired too, since
+        another process sharing the directory may still be writing them.
+        """
+        with self._sweep_lock:
+            now = time.time()
+            with self._lock:
+                for name in [n for n, a in self._memory.items() if now - a.modified >= self.ttl_seconds]:
+                    self._memory_bytes -= self._memory.pop(name).size
+                    self.stats["expired"] += 1
+
+            files = []
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    if _NAME.match(entry.name) or _LEGACY_NAME.match(entry.name):
+                        files.append((stat.st_mtime, stat.st_size, entry.path))
+                    elif entry.name.endswith(".tmp") and now - stat.st_mtime >= self.ttl_seconds:
+                        # Left behind by a writer that never finished
+                        self._remove(entry.path)
+
+            files.sort()
+            total = sum(size for _, size, _ in files)
+            for index, (modified, size, path) in enumerate(files):
+                expired = now - modified >= self.ttl_seconds
+                # The newest clip is kept even if it alone exceeds the quota
+                if not expired and (total <= self.max_bytes or index == len(files) - 1):
+                    break
+                if self._remove(path):
+                    self.stats["expired" if expired else "evicted"] += 1
+                total -= size
+
+            with self._lock:
+                self._disk_bytes = total
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.unlink(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _start_janitor(self):
+        if self.janitor_interval and not self._stopped.is_set():
+            self._janitor = threading.Thread(target=self._run_janitor, name="audio-janitor", daemon=True)
+            self._janitor.start()
+
+    def _after_fork(self):
+        # The janitor may have held a lock when the parent forked
+        self._lock = threading.Lock()
+        self._sweep_lock = threading.Lock()
+        self._start_janitor()
+
+    def _run_janitor(self):
+        while not self._stopped.wait(self.janitor_interval):
+            try:
+                self.sweep()
+            except Exception:
+                logger.exception("Audio store sweep failed")
+
+    def stop(self):
+        self._stopped.set()
+
+    def info(self):
+        """Return the size of each tier and how many clips were removed."""
+        with self._lock:
+            return {
+                **self.stats,
+                "memory_clips": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "disk_bytes": self._disk_bytes,
+            }
+
+    def register_metrics(self, registry):
+        """Report the size of each tier on a MetricsRegistry."""
+        registry.gauge(
+            "tts_audio_store_disk_bytes", "Size of the stored audio files on disk"
+        ).set_function(lambda: self._disk_bytes)
+        registry.gauge(
+            "tts_audio_store_memory_bytes", "Size of the audio clips held in memory"
+        ).set_function(lambda: self._memory_bytes)
+        registry.counter(
+            "tts_audio_store_removed_total", "Stored clips removed because they expired or the store was full"
+        ).set_function(lambda: self.stats["expired"] + self.stats["evicted"])
+
+    def send(self, name, mimetype, download_name=None, max_age=3600):
+        """
+        Return a Flask response serving a clip, or None if it doesn't exist.
+
+        Must be called while handling a request.
+        """
+        from flask import Response, request, send_file
+
+        audio = self.get(name)
+        if audio is None:
+            return None
+        etag = f"{audio.name}-{audio.size}"
+
+        if audio.data is not None:
+            response = Response(audio.data, mimetype=mimetype)
+        elif self.offload_prefix:
+            # The proxy sends the file and answers conditional and Range requests itself
+            response = Response(mimetype=mimetype)
+            response.headers[self.offload_header] = self.offload_prefix.rstrip("/") + "/" + audio.name
+            if download_name:
+                response.headers["Content-Disposition"] = f'inline; filename="{download_name}"'
+            response.cache_control.max_age = max_age
+            return response
+        else:
+            return send_file(
+                audio.path,
+                mimetype=mimetype,
+                download_name=download_name,
+                conditional=True,
+                etag=etag,
+                last_modified=audio.modified,
+                max_age=max_age,
+            )
+
+        if download_name:
+            response.headers["Content-Disposition"] = f'inline; filename="{download_name}"'
+        response.set_etag(etag)
+        response.last_modified = audio.modified
+        response.cache_control.max_age = max_age
+        response.cache_control.public = True
+        return response.make_conditional(request.environ, accept_ranges=True, complete_length=audio.size)
@@ -0,0 +1,86 @@
+"""
+Non-blocking logging setup.
+
+Request handlers only put log records on an in-memory queue; a background
+listener thread formats them and writes them out. A slow terminal or log
+collector therefore never stalls a request.
+
+The listener thread doesn't survive a fork, so a forked child (such as a
+preforking server's worker) starts its own on a fresh queue.
+"""
+
+import atexit
+import logging
+import os
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+
+DEFAULT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+_listener = None
+_queue_handler = None
+
+
+def configure_logging(level=None, fmt=DEFAULT_FORMAT, stream=None, capture=()):
+    """
+    Route all log records through a queue to a background writer thread.
+
+    Args:
+        level (str or int): Root log level; defaults to the LOG_LEVEL
+            environment variable, or INFO
+        fmt (str): Log record format
+        stream: Stream the records are written to (default: stderr)
+        capture (iterable): Names of loggers that have their own handlers and
+            don't propagate (e.g. "uvicorn.access"); their handlers are
+            replaced so they also log through the queue
+
+    Returns:
+        QueueListener: The running listener, stopped automatically at exit
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        _listener.stop()
+
+    level = level or os.getenv("LOG_LEVEL", "INFO").upper()
+    log_queue = queue.SimpleQueue()
+    queue_handler = _queue_handler = QueueHandler(log_queue)
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(logging.Formatter(fmt))
+
+    root_logger = logging.getLogger()
+    for handler in root_logger.handlers[:]:
+        root_logger.removeHandler(handler)
+    root_logger.addHandler(queue_handler)
+    root_logger.setLevel(level)
+
+    for name in capture:
+        logger = logging.getLogger(name)
+        for handler in logger.handlers[:]:
+            logger.removeHandler(handler)
+        logger.addHandler(queue_handler)
+
+    if _listener is None:
+        atexit.register(_stop_listener)
+        os.register_at_fork(after_in_child=_restart_listener)
+    _listener = QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def _stop_listener():
+    # Flushes any records still on the queue
+    if _listener is not None:
+        _listener.stop()
+
+
+def _restart_listener():
+    # Records queued before the fork are left for the parent to write
+    global _listener
+    if _listener is None:
+        return
+    log_queue = queue.SimpleQueue()
+    _queue_handler.queue = log_queue
+    _listener = QueueListener(log_queue, *_listener.handlers, respect_handler_level=True)
+    _listener.start()
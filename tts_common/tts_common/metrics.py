@@ -0,0 +1,366 @@
+"""
+Low-overhead request metrics in the Prometheus text exposition format.
+
+Metrics are plain in-process counters guarded by a lock. Recording a value
+costs a dict lookup, a bisect and a couple of additions, and nothing is
+formatted until /metrics is scraped, so instrumentation can stay on in
+production.
+
+Values are per process: when a service runs several worker processes, each
+one reports its own numbers.
+"""
+
+import bisect
+import os
+import threading
+import time
+import wave
+from contextlib import contextmanager
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+AUDIO_SECONDS_BUCKETS = (1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0)
+REAL_TIME_FACTOR_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 5.0)
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        self._function = None
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        try:
+            return tuple(str(labels[name]) for name in self.labelnames)
+        except KeyError as e:
+            raise ValueError(f"{self.name} is missing label {e}")
+
+    def set_function(self, function):
+        """Report the return value of `function` at scrape time (unlabelled metrics only)."""
+        if self.labelnames:
+            raise ValueError(f"{self.name} has labels and cannot be computed by a function")
+        self._function = function
+
+    def _samples(self):
+        if self._function is not None:
+            value = self._function()
+            return [] if value is None else [(self.name, (), value)]
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for name, key, value in self._samples():
+            lines.append(f"{name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """A value that only goes up."""
+
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """A value that can go up and down."""
+
+    type = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """Distribution of observed values over fixed buckets."""
+
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket counts (the last one is +Inf), sum, count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall-clock duration of a block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def set_function(self, function):
+        raise TypeError("Histograms cannot be computed by a function")
+
+    def _samples(self):
+        with self._lock:
+            snapshot = [(key, list(counts), total, count) for key, (counts, total, count) in self._values.items()]
+
+        samples = []
+        for key, counts, total, count in snapshot:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                samples.append((f"{self.name}_bucket", key, cumulative, (("le", _format_value(bound)),)))
+            samples.append((f"{self.name}_sum", key, total, ()))
+            samples.append((f"{self.name}_count", key, count, ()))
+        return samples
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for name, key, value, extra in self._samples():
+            lines.append(f"{name}{_format_labels(self.labelnames, key, extra)} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class MetricsRegistry:
+    """A set of metrics rendered together on one /metrics page."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """Return all metrics in the Prometheus text format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+def _resident_memory_bytes():
+    try:
+        with open("/proc/self/statm", "rb") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class TTSMetrics:
+    """
+    The standard set of metrics reported by every TTS service.
+
+    Args:
+        registry (MetricsRegistry): Registry to add the metrics to; a new one
+            is created if omitted. Services can register their own extra
+            metrics on `metrics.registry`.
+    """
+
+    def __init__(self, registry=None):
+        self.registry = registry or MetricsRegistry()
+        registry = self.registry
+
+        self.requests = registry.histogram(
+            "tts_request_duration_seconds",
+            "Time taken to handle a request (for streamed responses, until the body starts)",
+            ("endpoint", "method", "status")
+        )
+        self.extraction = registry.histogram(
+            "tts_extraction_duration_seconds",
+            "Time taken to extract text from an uploaded document",
+            ("format",)
+        )
+        self.model_latency = registry.histogram(
+            "tts_model_latency_seconds",
+            "Time taken by the model or upstream service to return audio for one synthesis call",
+            ("backend",)
+        )
+        self.time_to_first_byte = registry.histogram(
+            "tts_time_to_first_byte_seconds",
+            "Time from receiving a request to the first byte of audio",
+            ("endpoint",)
+        )
+        self.audio_seconds = registry.histogram(
+            "tts_audio_duration_seconds",
+            "Seconds of audio produced per request",
+            ("endpoint",),
+            buckets=AUDIO_SECONDS_BUCKETS
+        )
+        self.real_time_factor = registry.histogram(
+            "tts_real_time_factor",
+            "Synthesis wall-clock time divided by the duration of the audio produced",
+            ("endpoint",),
+            buckets=REAL_TIME_FACTOR_BUCKETS
+        )
+
+        registry.counter("process_cpu_seconds_total", "Total user and system CPU time spent in seconds").set_function(
+            time.process_time
+        )
+        registry.gauge("process_resident_memory_bytes", "Resident memory size in bytes").set_function(
+            _resident_memory_bytes
+        )
+
+    def observe_request(self, endpoint, method, status, seconds):
+        self.requests.observe(seconds, endpoint=endpoint, method=method, status=status)
+
+    def time_extraction(self, file_format):
+        """Context manager timing text extraction from a document."""
+        return self.extraction.time(format=file_format)
+
+    def time_model(self, backend):
+        """Context manager timing one call to a model or upstream service."""
+        return self.model_latency.time(backend=backend)
+
+    def observe_audio(self, endpoint, elapsed, audio_seconds):
+        """Record the audio produced by a request and its real-time factor."""
+        if not audio_seconds:
+            return
+        self.audio_seconds.observe(audio_seconds, endpoint=endpoint)
+        self.real_time_factor.observe(elapsed / audio_seconds, endpoint=endpoint)
+
+    def instrument_stream(self, endpoint, chunks, started, audio_seconds, first_byte=True):
+        """
+        Wrap an iterator of audio chunks to record time to first byte, audio
+        duration and real-time factor as it is consumed.
+
+        Args:
+            endpoint (str): Endpoint label
+            chunks (iterable): Audio chunks
+            started (float): time.perf_counter() when the request arrived
+            audio_seconds (callable): Called with the first chunk and the
+                total number of bytes once the stream is complete; returns
+                the duration of the audio in seconds, or None if unknown
+            first_byte (bool): Record time to first byte; turn off when the
+                chunks are not sent to the client as they arrive
+
+        Yields:
+            bytes: The chunks, unchanged
+        """
+        first_chunk = None
+        size = 0
+        for chunk in chunks:
+            if first_chunk is None:
+                first_chunk = chunk
+                if first_byte:
+                    self.time_to_first_byte.observe(time.perf_counter() - started, endpoint=endpoint)
+            size += len(chunk)
+            yield chunk
+        if first_chunk is not None:
+            self.observe_audio(endpoint, time.perf_counter() - started, audio_seconds(first_chunk, size))
+
+    async def instrument_async_stream(self, endpoint, chunks, started, audio_seconds):
+        """Asynchronous version of instrument_stream."""
+        first_chunk = None
+        size = 0
+        async for chunk in chunks:
+            if first_chunk is None:
+                first_chunk = chunk
+                self.time_to_first_byte.observe(time.perf_counter() - started, endpoint=endpoint)
+            size += len(chunk)
+            yield chunk
+        if first_chunk is not None:
+            self.observe_audio(endpoint, time.perf_counter() - started, audio_seconds(first_chunk, size))
+
+    def render(self):
+        return self.registry.render()
+
+
+def pcm_seconds(sample_rate, sample_width=2, num_channels=1):
+    """Return an `audio_seconds` function for raw PCM streams."""
+    bytes_per_second = sample_rate * sample_width * num_channels
+    return lambda first_chunk, size: size / bytes_per_second
+
+
+def wav_file_seconds(path):
+    """Return the duration of a PCM WAV file in seconds, or None if it can't be read."""
+    try:
+        with wave.open(str(path), "rb") as wav_file:
+            return wav_file.getnframes() / wav_file.getframerate()
+    except (OSError, EOFError, wave.Error):
+        return None
+
+
+def install_flask(app, metrics, path="/metrics"):
+    """
+    Record request durations for a Flask app and serve its metrics.
+
+    Args:
+        app (Flask): The application
+        metrics (TTSMetrics): Metrics to record into and serve
+        path (str): URL the metrics are served on
+    """
+    from flask import Response, g, request
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request_duration(response):
+        started = g.get("request_started")
+        if started is not None:
+            endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+            metrics.observe_request(endpoint, request.method, response.status_code, time.perf_counter() - started)
+        return response
+
+    @app.route(path)
+    def prometheus_metrics():
+        return Response(metrics.render(), content_type=CONTENT_TYPE)
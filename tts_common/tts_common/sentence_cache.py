@@ -0,0 +1,220 @@
+"""
+On-disk cache of synthesized audio, one entry per sentence.
+
+Entries are keyed by the normalized sentence, the voice and the synthesis
+parameters, so when an edited text is submitted again only the sentences
+that changed are synthesized and the rest are read back from the cache.
+
+Audio is stored as raw samples, compressed with zlib at its fastest level
+(pauses between words compress well). Once the cache grows past its size
+limit the least recently used entries are deleted. The cache directory can
+be shared by several processes, such as the workers of a preforking server.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import unicodedata
+import zlib
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_sentence(sentence):
+    """Normalize Unicode and whitespace, which don't change how a sentence is spoken."""
+    return " ".join(unicodedata.normalize("NFC", sentence).split())
+
+
+def sentence_key(sentence, voice, params=None):
+    """Return the cache key for a sentence synthesized with a voice and parameters."""
+    digest = hashlib.sha256()
+    for part in (voice, json.dumps(params or {}, sort_keys=True), normalize_sentence(sentence)):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class SentenceCache:
+    """
+    Size-bounded LRU cache of per-sentence audio on disk.
+
+    The files on disk are the only index, so several processes can share one
+    cache directory: a sentence written by one is read by the others, and the
+    size limit applies to the directory as a whole. A file's modification
+    time is its last use.
+
+    Safe to share between threads and processes.
+
+    Args:
+        cache_dir (str): Directory holding the cache
+        max_bytes (int): Largest total size of the cached files
+        compress_level (int): zlib compression level (0 stores audio uncompressed)
+    """
+
+    def __init__(self, cache_dir, max_bytes=1024 * 1024 * 1024, compress_level=1):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.compress_level = compress_level
+        # Other processes write to the directory too, so it is scanned again
+        # after each 1/16 of the limit this process writes, which keeps the
+        # cache within the limit plus that much per process
+        self.scan_every = max(max_bytes // 16, 1)
+        self._entries = 0
+        self._size = 0
+        self._written = 0
+        self._lock = threading.Lock()
+        self._sweep_lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.sweep()
+        logger.info("Loaded %d cached sentences (%d bytes)", self._entries, self._size)
+
+    def _path(self, key):
+        return self.cache_dir / key[:2] / f"{key}.pcm"
+
+    def get(self, key):
+        """Return the cached audio for a key, or None."""
+        path = self._path(key)
+        try:
+            data = zlib.decompress(path.read_bytes())
+            # Mark the entry as recently used for eviction
+            os.utime(path)
+        except (OSError, zlib.error):
+            with self._lock:
+                self.stats["misses"] += 1
+            return None
+
+        with self._lock:
+            self.stats["hits"] += 1
+        return data
+
+    def put(self, key, data):
+        """Store audio for a key, evicting least recently used entries if the cache is full."""
+        path = self._path(key)
+        path.parent.mkdir(exist_ok=True)
+        compressed = zlib.compress(data, self.compress_level)
+        # Write to a temporary file first so readers never see a partial entry
+        fd, temp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(compressed)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+        with self._lock:
+            self._entries += 1
+            self._size += len(compressed)
+            self._written += len(compressed)
+            due = self._size > self.max_bytes or self._written >= self.scan_every
+        if due:
+            self.sweep()
+
+    def sweep(self):
+        """Scan the cache directory and delete the least recently used files until within the limit."""
+        with self._sweep_lock:
+            files = []
+            for path in self.cache_dir.glob("*/*.pcm"):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+
+            files.sort()
+            total = sum(size for _, size, _ in files)
+            count = len(files)
+            # The newest entry is kept even if it alone exceeds the limit
+            for _, size, path in files[:-1]:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+                total -= size
+                count -= 1
+
+            with self._lock:
+                self._entries = count
+                self._size = total
+                self._written = 0
+
+    def synthesize(self, sentences, voice, synthesize, params=None):
+        """
+        Yield the audio of each sentence, synthesizing only the ones not cached.
+
+        Args:
+            sentences (iterable): Sentences in order; consumed lazily
+            voice (str): Name of the voice
+            synthesize (callable): Takes a sentence and returns its audio as bytes
+            params (dict): Other settings that change the audio
+
+        Yields:
+            bytes: Audio for each sentence
+        """
+        for sentence in sentences:
+            key = sentence_key(sentence, voice, params)
+            data = self.get(key)
+            if data is None:
+                data = synthesize(sentence)
+                self.put(key, data)
+            yield data
+
+    def synthesize_all(self, sentences, voice, synthesize_many, params=None):
+        """
+        Return the audio of each sentence, synthesizing the ones not cached in one call.
+
+        Suits backends that synthesize several sentences faster together than
+        one after another (in parallel or in batches).
+
+        Args:
+            sentences (list): Sentences in order
+            voice (str): Name of the voice
+            synthesize_many (callable): Takes a list of sentences and returns
+                an iterable of their audio as bytes, in order
+            params (dict): Other settings that change the audio
+
+        Returns:
+            list: Audio for each sentence
+        """
+        keys = [sentence_key(sentence, voice, params) for sentence in sentences]
+        audio = {}
+        missing = {}  # key -> sentence, each repeated sentence synthesized once
+        for key, sentence in zip(keys, sentences):
+            if key in audio or key in missing:
+                continue
+            data = self.get(key)
+            if data is None:
+                missing[key] = sentence
+            else:
+                audio[key] = data
+
+        if missing:
+            for key, data in zip(missing, synthesize_many(list(missing.values()))):
+                self.put(key, data)
+                audio[key] = data
+        return [audio[key] for key in keys]
+
+    def info(self):
+        """Return hit and miss counts and the size of the cache."""
+        with self._lock:
+            return {**self.stats, "entries": self._entries, "bytes": self._size, "max_bytes": self.max_bytes}
+
+    def register_metrics(self, registry):
+        """Report hits, misses and size on a MetricsRegistry."""
+        registry.counter(
+            "tts_sentence_cache_hits_total", "Sentences served from the sentence cache"
+        ).set_function(lambda: self.stats["hits"])
+        registry.counter(
+            "tts_sentence_cache_misses_total", "Sentences synthesized because they were not cached"
+        ).set_function(lambda: self.stats["misses"])
+        registry.gauge(
+            "tts_sentence_cache_bytes", "Size of the sentence cache on disk"
+        ).set_function(lambda: self._size)
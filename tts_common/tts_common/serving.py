@@ -0,0 +1,56 @@
+"""
+Sizing for preforking production servers.
+
+The services run under gunicorn with the app preloaded: models are loaded
+once in the master process and the workers forked from it share their
+weights copy-on-write. Throughput comes from running one worker per core,
+each with a share of the cores for its inference threads, rather than one
+process whose threads contend for the interpreter lock.
+"""
+
+import math
+import os
+
+
+def _cgroup_cpu_limit():
+    """Return the cores allowed by a cgroup CPU quota (e.g. `docker run --cpus`), or None without one."""
+    try:
+        # cgroup v2: "<quota> <period>", or "max <period>" without a quota
+        with open("/sys/fs/cgroup/cpu.max", encoding="utf-8") as f:
+            quota, period = f.read().split()[:2]
+    except (OSError, ValueError):
+        try:
+            # cgroup v1: a quota of -1 means no quota
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us", encoding="utf-8") as f:
+                quota = f.read().strip()
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us", encoding="utf-8") as f:
+                period = f.read().strip()
+        except OSError:
+            return None
+    try:
+        quota, period = int(quota), int(period)
+    except ValueError:
+        return None
+    if quota <= 0 or period <= 0:
+        return None
+    return max(1, math.ceil(quota / period))
+
+
+def cpu_count():
+    """Return the number of cores this process may run on, respecting CPU affinity and cgroup quotas (e.g. in a container)."""
+    try:
+        count = len(os.sched_getaffinity(0))
+    except AttributeError:
+        count = os.cpu_count() or 1
+    limit = _cgroup_cpu_limit()
+    return min(count, limit) if limit else count
+
+
+def default_workers():
+    """Return the worker count from WEB_CONCURRENCY, or one worker per core."""
+    return int(os.getenv("WEB_CONCURRENCY", "0")) or cpu_count()
+
+
+def threads_per_worker(workers):
+    """Return the inference threads each of `workers` processes may use without oversubscribing the cores."""
+    return max(1, cpu_count() // max(1, workers))